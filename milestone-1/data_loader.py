@@ -0,0 +1,181 @@
+# ============================================================
+# SHARED DATASET LOADER (typed schema + binary snapshot)
+# ============================================================
+#
+# Every milestone reads combined_dataset.csv. Instead of each script
+# parsing the CSV, converting dates and renaming columns its own way,
+# they all call load_dataset(), which returns the table with an explicit
+# schema:
+#
+#   Product ID, Store ID, Warehouse/Store ID   -> category (sorted)
+#   Date                                       -> datetime64 (ISO)
+#   Restock_Date                               -> datetime64 (day-first)
+#   Units Sold, Stock Level                    -> int32
+#   Price, Revenue, AvgPrice, Cost             -> float32 (or float64)
+#
+# The first load of a file writes a binary snapshot of the typed table to
+# .snapshots/ next to it, named after the SHA-256 of the file's contents.
+# Later loads hash the file, find the snapshot and skip CSV parsing and
+# date inference entirely; any edit to the CSV changes the hash, so a
+# stale snapshot is never used.
+#
+# Usage:
+#   from data_loader import load_dataset, SHORT_NAMES
+#   df = load_dataset()                                  # dataset column names
+#   df = load_dataset(names=SHORT_NAMES)                 # date, product_id, ...
+#   df = load_dataset(columns=["Date", "Price"], measure_dtype="float64")
+
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "combined_dataset.csv")
+SNAPSHOT_DIR_NAME = ".snapshots"
+
+# Bump whenever SCHEMA or the parsing below changes, so old snapshots are ignored
+SCHEMA_VERSION = 1
+
+SCHEMA = {
+    "Date": "date",
+    "Product ID": "category",
+    "Units Sold": "int",
+    "Price": "measure",
+    "Revenue": "measure",
+    "Store ID": "category",
+    "Stock Level": "int",
+    "Restock_Date": "date_dayfirst",
+    "Warehouse/Store ID": "category",
+    "AvgPrice": "measure",
+    "Cost": "measure"
+}
+
+# How Restock_Date is written in the source CSV (for turning it back into text)
+RESTOCK_DATE_FORMAT = "%d-%m-%Y"
+
+# Lower-case names used by the KPI scripts
+SHORT_NAMES = {
+    "Date": "date",
+    "Product ID": "product_id",
+    "Units Sold": "units_sold",
+    "Price": "price",
+    "Revenue": "revenue",
+    "Store ID": "store_id",
+    "Stock Level": "stock",
+    "Restock_Date": "restock_date",
+    "Cost": "cost_price",
+    "AvgPrice": "avg_price"
+}
+
+
+# ------------------------------------------------------------
+# Parsing
+# ------------------------------------------------------------
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_csv(path):
+    """
+    Read the CSV and apply SCHEMA. Measures are kept as float64 here (the
+    snapshot stores them exactly); load_dataset narrows them on the way out.
+    Integer columns with missing values stay float, as pandas reads them.
+    Columns not in SCHEMA keep pandas' inferred dtype.
+    """
+    df = pd.read_csv(path)
+    for name, kind in SCHEMA.items():
+        if name not in df.columns:
+            continue
+        if kind == "category":
+            df[name] = df[name].astype("category")
+        elif kind == "date":
+            df[name] = pd.to_datetime(df[name], errors="coerce")
+        elif kind == "date_dayfirst":
+            df[name] = pd.to_datetime(df[name], dayfirst=True, errors="coerce")
+        elif kind == "int":
+            values = pd.to_numeric(df[name], errors="coerce")
+            df[name] = values.astype(np.int32) if values.notna().all() else values.astype(np.float64)
+        else:
+            df[name] = pd.to_numeric(df[name], errors="coerce").astype(np.float64)
+    return df
+
+
+# ------------------------------------------------------------
+# Snapshots
+# ------------------------------------------------------------
+def snapshot_path(path, digest, snapshot_dir=None):
+    snapshot_dir = snapshot_dir or os.path.join(os.path.dirname(os.path.abspath(path)), SNAPSHOT_DIR_NAME)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(snapshot_dir, f"{stem}.v{SCHEMA_VERSION}.{digest[:16]}.pkl")
+
+
+def write_snapshot(df, target):
+    """Atomic write; older snapshots of the same file are removed."""
+    snapshot_dir = os.path.dirname(target)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    tmp_path = target + ".tmp"
+    with open(tmp_path, "wb") as handle:
+        pickle.dump(df, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, target)
+
+    stem = os.path.basename(target).split(".v")[0]
+    for name in os.listdir(snapshot_dir):
+        if name.startswith(stem + ".v") and name.endswith(".pkl") and name != os.path.basename(target):
+            os.remove(os.path.join(snapshot_dir, name))
+
+
+def read_typed(path=DATASET_PATH, snapshot=True, snapshot_dir=None):
+    """The typed table for ``path``, from its snapshot when one matches."""
+    if not snapshot:
+        return parse_csv(path)
+
+    target = snapshot_path(path, file_hash(path), snapshot_dir)
+    if os.path.exists(target):
+        try:
+            with open(target, "rb") as handle:
+                return pickle.load(handle)
+        except Exception:
+            # Truncated file, or pickled by another pandas version: the
+            # snapshot is only a cache, so parse again and replace it
+            pass
+
+    df = parse_csv(path)
+    try:
+        write_snapshot(df, target)
+    except OSError:
+        # Read-only location: still return the data, just without caching
+        pass
+    return df
+
+
+# ------------------------------------------------------------
+# Public entry point
+# ------------------------------------------------------------
+def load_dataset(path=DATASET_PATH, columns=None, names=None, measure_dtype="float32",
+                 snapshot=True, snapshot_dir=None):
+    """
+    Load the dataset with the shared schema.
+
+    columns        – subset of (dataset) column names to return
+    names          – rename map applied last, e.g. SHORT_NAMES
+    measure_dtype  – dtype of the money columns; float64 reproduces the
+                     exact values of a plain pd.read_csv
+    snapshot       – use / write the binary snapshot (False always parses)
+    """
+    df = read_typed(path, snapshot=snapshot, snapshot_dir=snapshot_dir)
+    if columns is not None:
+        df = df[list(columns)]
+
+    measures = [name for name, kind in SCHEMA.items() if kind == "measure" and name in df.columns]
+    if measures:
+        df = df.astype({name: measure_dtype for name in measures})
+
+    if names:
+        df = df.rename(columns=names)
+    return df
@@ -1,36 +1,38 @@
+import argparse
+import sys
+
 import pandas as pd
 import numpy as np
 
+from data_loader import load_dataset, SHORT_NAMES
+
+sys.path.insert(0, "../milestone-4")
+from elasticity import fit_elasticities, row_elasticities
+
+# Usage:
+#   python kpi.py                  # one draw of the dynamic prices (seed 42)
+#   python kpi.py --draws 10000    # + Monte Carlo mean and percentile bands
+parser = argparse.ArgumentParser(description="PriceOptima KPIs")
+parser.add_argument("--draws", type=int, default=0,
+                    help="Monte Carlo draws of the dynamic prices (0 = the single draw only)")
+parser.add_argument("--seed", type=int, default=42)
+parser.add_argument("--percentiles", type=float, nargs=2, default=[5.0, 95.0],
+                    help="Lower / upper percentile of the reported bands")
+parser.add_argument("--memory-mb", type=float, default=256,
+                    help="Approximate working memory per chunk of draws")
+args = parser.parse_args()
+
 # =========================================================
 # 1. LOAD DATASET
 # =========================================================
-df = pd.read_csv("combined_dataset.csv")
+# Typed load (categorical IDs, parsed Date / day-first Restock_Date) with
+# the standardized column names; repeat runs read the binary snapshot
+df = load_dataset(names=SHORT_NAMES)
 print("✅ Dataset Loaded:", df.shape)
-
-# =========================================================
-# 2. STANDARDIZE COLUMN NAMES
-# =========================================================
-df = df.rename(columns={
-    "Date": "date",
-    "Product ID": "product_id",
-    "Units Sold": "units_sold",
-    "Price": "price",
-    "Revenue": "revenue",
-    "Store ID": "store_id",
-    "Stock Level": "stock",
-    "Restock_Date": "restock_date",
-    "Cost": "cost_price",
-    "AvgPrice": "avg_price"
-})
-
-# Convert dates (warning-free)
-df["date"] = pd.to_datetime(df["date"], errors="coerce")
-df["restock_date"] = pd.to_datetime(df["restock_date"], dayfirst=True, errors="coerce")
-
 print("✅ Columns standardized")
 
 # =========================================================
-# 3. DATA VALIDATION
+# 2. DATA VALIDATION
 # =========================================================
 required_columns = [
     "date", "product_id", "units_sold", "price",
@@ -44,7 +46,7 @@ if missing_cols:
 print("✅ Required columns present")
 
 # =========================================================
-# 4. DATA QUALITY CHECKS
+# 3. DATA QUALITY CHECKS
 # =========================================================
 df = df.drop_duplicates()
 
@@ -62,7 +64,7 @@ df[required_columns] = df[required_columns].ffill()
 print("✅ Data quality checks completed")
 
 # =========================================================
-# 5. BASELINE METRICS
+# 4. BASELINE METRICS
 # =========================================================
 df["baseline_profit"] = (df["price"] - df["cost_price"]) * df["units_sold"]
 
@@ -72,14 +74,14 @@ baseline_profit = df["baseline_profit"].sum()
 df["baseline_conversion"] = df["units_sold"] / (df["stock"] + 1)
 
 baseline_inventory_turnover = (
-    df.groupby("product_id")["units_sold"].sum()
-    / df.groupby("product_id")["stock"].mean()
+    df.groupby("product_id", observed=True)["units_sold"].sum()
+    / df.groupby("product_id", observed=True)["stock"].mean()
 ).mean()
 
 # =========================================================
-# 6. SMART DYNAMIC PRICING SIMULATION
+# 5. SMART DYNAMIC PRICING SIMULATION
 # =========================================================
-np.random.seed(42)
+np.random.seed(args.seed)
 
 df["demand_ratio"] = df["units_sold"] / (df["stock"] + 1)
 
@@ -89,11 +91,16 @@ df["dynamic_price"] = np.where(
     df["avg_price"] * np.random.uniform(0.97, 1.01, len(df))
 )
 
-elasticity = np.where(
+# Per-product elasticities from log-log demand fits on this data; a
+# product without a significant fit (see elasticity.significant) keeps
+# the demand-ratio rule of thumb
+rule_elasticity = np.where(
     df["demand_ratio"] >= df["demand_ratio"].median(),
     -0.3,
     -0.9
 )
+elasticity_table = fit_elasticities(df, "product", names=SHORT_NAMES)
+elasticity = row_elasticities(elasticity_table, df, rule_elasticity)
 
 price_change_pct = (df["dynamic_price"] - df["avg_price"]) / df["avg_price"]
 
@@ -108,7 +115,7 @@ df["dynamic_profit"] = (
 )
 
 # =========================================================
-# 7. KPI CALCULATIONS
+# 6. KPI CALCULATIONS
 # =========================================================
 revenue_lift = ((df["dynamic_revenue"].sum() - baseline_revenue) / baseline_revenue) * 100
 profit_margin_improvement = ((df["dynamic_profit"].sum() - baseline_profit) / baseline_profit) * 100
@@ -119,32 +126,107 @@ conversion_baseline = df["baseline_conversion"].mean()
 conversion_dynamic = df["dynamic_conversion"].mean()
 
 dynamic_inventory_turnover = (
-    df.groupby("product_id")["dynamic_units_sold"].sum()
-    / df.groupby("product_id")["stock"].mean()
+    df.groupby("product_id", observed=True)["dynamic_units_sold"].sum()
+    / df.groupby("product_id", observed=True)["stock"].mean()
 ).mean()
 
+# =========================================================
+# 7. MONTE CARLO SIMULATION (--draws N)
+# =========================================================
+# Section 5 prices every row with one uniform draw. Here N draws are
+# simulated at once as (draws x rows) arrays, a memory-bounded chunk of
+# draws at a time, and every KPI is computed per draw. Rows are sorted by
+# product once, so the per-product turnover sums are one np.add.reduceat
+# per chunk instead of a groupby per draw.
+def simulate_kpis(n_draws, seed, memory_mb):
+    """Dynamic-pricing KPIs of every draw, as {KPI: array of n_draws} in kpi_summary units."""
+    rng = np.random.default_rng(seed)
+    product_codes = pd.factorize(df["product_id"])[0]
+    order = np.argsort(product_codes, kind="stable")
+    group_starts = np.flatnonzero(np.r_[True, np.diff(product_codes[order]) != 0])
+
+    avg_price = df["avg_price"].to_numpy(dtype=np.float64)[order]
+    cost_price = df["cost_price"].to_numpy(dtype=np.float64)[order]
+    units = df["units_sold"].to_numpy(dtype=np.float64)[order]
+    stock = df["stock"].to_numpy(dtype=np.float64)[order]
+    row_elasticity = np.asarray(elasticity, dtype=np.float64)[order]
+    high_demand = (df["demand_ratio"] >= df["demand_ratio"].median()).to_numpy()[order]
+    low = np.where(high_demand, 1.05, 0.97)
+    high = np.where(high_demand, 1.09, 1.01)
+
+    group_rows = np.diff(np.r_[group_starts, len(units)])
+    mean_stock = np.add.reduceat(stock, group_starts) / group_rows
+    # Like groupby, leave out rows without a product (code -1)
+    has_product = product_codes[order][group_starts] >= 0
+
+    n_rows = len(units)
+    # About six (draws x rows) float64 arrays are alive within a chunk
+    chunk = max(int(memory_mb * 2 ** 20 // (6 * 8 * n_rows)), 1)
+    results = {name: np.empty(n_draws) for name in (
+        "Revenue Lift", "Profit Margin Improvement", "Conversion Rate (Dynamic)",
+        "Inventory Turnover (Dynamic)"
+    )}
+    for start in range(0, n_draws, chunk):
+        draws = slice(start, min(start + chunk, n_draws))
+        n = draws.stop - draws.start
+        dynamic_price = avg_price * rng.uniform(low, high, size=(n, n_rows))
+
+        price_change = (dynamic_price - avg_price) / avg_price
+        dynamic_units = np.maximum(units * (1 + row_elasticity * price_change), units * 0.95)
+        # pandas means / sums skip missing values
+        results["Conversion Rate (Dynamic)"][draws] = np.nanmean(dynamic_units / (stock + 1), axis=1) * 100
+        np.nan_to_num(dynamic_units, copy=False, nan=0.0)
+
+        dynamic_revenue = np.einsum("ij,ij->i", dynamic_price, dynamic_units)
+        dynamic_profit = dynamic_revenue - dynamic_units @ cost_price
+        results["Revenue Lift"][draws] = (dynamic_revenue - baseline_revenue) / baseline_revenue * 100
+        results["Profit Margin Improvement"][draws] = (
+            (dynamic_profit - baseline_profit) / baseline_profit * 100
+        )
+        product_units = np.add.reduceat(dynamic_units, group_starts, axis=1)
+        results["Inventory Turnover (Dynamic)"][draws] = (
+            product_units[:, has_product] / mean_stock[has_product]
+        ).mean(axis=1)
+    return results
+
+
+if args.draws > 0:
+    simulated = simulate_kpis(args.draws, args.seed, args.memory_mb)
+    print(f"✅ Monte Carlo simulation: {args.draws} draws")
+
 # =========================================================
 # 8. KPI SUMMARY (FORMATTED % OUTPUT)
 # =========================================================
+kpi_values = {
+    "Revenue Lift": revenue_lift,
+    "Profit Margin Improvement": profit_margin_improvement,
+    "Conversion Rate (Baseline)": conversion_baseline * 100,
+    "Conversion Rate (Dynamic)": conversion_dynamic * 100,
+    "Inventory Turnover (Baseline)": baseline_inventory_turnover,
+    "Inventory Turnover (Dynamic)": dynamic_inventory_turnover
+}
+
+
+def format_kpi(name, value):
+    # Rates and lifts are shown as percentages, turnovers as ratios
+    return round(value, 2) if name.startswith("Inventory Turnover") else f"{round(value, 2)}%"
+
+
 kpi_summary = pd.DataFrame({
-    "KPI": [
-        "Revenue Lift",
-        "Profit Margin Improvement",
-        "Conversion Rate (Baseline)",
-        "Conversion Rate (Dynamic)",
-        "Inventory Turnover (Baseline)",
-        "Inventory Turnover (Dynamic)"
-    ],
-    "Value": [
-        f"{round(revenue_lift, 2)}%",
-        f"{round(profit_margin_improvement, 2)}%",
-        f"{round(conversion_baseline * 100, 2)}%",
-        f"{round(conversion_dynamic * 100, 2)}%",
-        round(baseline_inventory_turnover, 2),
-        round(dynamic_inventory_turnover, 2)
-    ]
+    "KPI": list(kpi_values),
+    "Value": [format_kpi(name, value) for name, value in kpi_values.items()]
 })
 
+if args.draws > 0:
+    # Baseline KPIs do not depend on the draw: their band is the value itself
+    samples = [simulated.get(name, np.array([value])) for name, value in kpi_values.items()]
+    lower, upper = args.percentiles
+    kpi_summary["Mean"] = [format_kpi(name, float(np.mean(sample)))
+                           for name, sample in zip(kpi_values, samples)]
+    for label, q in ((f"P{lower:g}", lower), ("Median", 50), (f"P{upper:g}", upper)):
+        kpi_summary[label] = [format_kpi(name, float(np.percentile(sample, q)))
+                              for name, sample in zip(kpi_values, samples)]
+
 kpi_summary.to_csv("kpi_summary.csv", index=False)
 
 # =========================================================
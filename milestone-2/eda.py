@@ -2,14 +2,20 @@
 # Milestone 2 – Exploratory Data Analysis (EDA)
 # ============================================================
 
+import sys
+
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+sys.path.insert(0, "../milestone-1")
+from data_loader import load_dataset
+
 # ------------------------------------------------------------
 # 1. Load Dataset
 # ------------------------------------------------------------
-df = pd.read_csv("../milestone-1/combined_dataset.csv")
+# Shared typed loader (float32 measures, cached binary snapshot)
+df = load_dataset("../milestone-1/combined_dataset.csv")
 
 print("Dataset Loaded Successfully")
 print("Shape:", df.shape)
@@ -0,0 +1,327 @@
+# ============================================================
+# COLUMNAR FEATURE ARTIFACT (one .npy per column + schema.json)
+# ============================================================
+#
+# cleaned_features.csv stores every value as text; reading it back means
+# parsing ~40 float64 columns and re-inferring dtypes. The same table is
+# also written here as one binary file per column with the narrowest
+# dtype that holds it:
+#
+#   integers        -> int8 / int16 / int32 (by value range)
+#   floats          -> float32, except FLOAT64_COLUMNS
+#   text            -> int8 / int16 / int32 codes + labels in schema.json
+#   dates           -> datetime64[D]
+#
+# Readers open the files with np.load(mmap_mode="r"), so loading is
+# near-instant and only the columns actually touched are paged in.
+# load_frame keeps that property for numeric columns only (category and
+# date columns are decoded into memory), and only until something
+# copies them: select_dtypes, frame-wide fillna / astype, get_dummies and
+# to_numpy all build in-memory blocks of every column they cover.
+#
+# Layout:
+#   cleaned_features_columns/
+#     schema.json     row count, column order, dtypes, category labels
+#     c000.npy ...    one array per column (in schema order)
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+SCHEMA_NAME = "schema.json"
+
+INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+# Money columns keep float64: prices and revenue totals computed from them
+# must not change with the storage format (float32 turns 46.95 into 46.950001)
+FLOAT64_COLUMNS = ("Price", "Revenue", "AvgPrice", "Cost", "cost_price", "profit_per_unit")
+
+
+def columns_dir_for(csv_path):
+    """Artifact directory that sits next to a feature CSV."""
+    return os.path.splitext(csv_path)[0] + "_columns"
+
+
+def categories_path_for(csv_path):
+    """Labels of the columns feauture.py replaced by codes, next to a feature CSV."""
+    return os.path.splitext(csv_path)[0] + ".categories.json"
+
+
+# ------------------------------------------------------------
+# Encoding
+# ------------------------------------------------------------
+def _smallest_int(low, high):
+    for int_type in INT_TYPES:
+        info = np.iinfo(int_type)
+        if info.min <= low and high <= info.max:
+            return np.dtype(int_type)
+    raise ValueError(f"Integer range {low}..{high} does not fit in int64")
+
+
+def _encode(series, column=None):
+    """
+    (array, schema entry) for one column.
+
+    ``column`` is the existing schema entry when appending; its dtype is
+    kept when the new values fit, otherwise it is widened.
+    """
+    kind = column["kind"] if column else None
+
+    if kind == "category" or (kind is None and (series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype))):
+        labels = list(column["labels"]) if column else []
+        index = {label: i for i, label in enumerate(labels)}
+        values = series.astype(object).where(series.notna(), None).tolist()
+        codes = np.empty(len(values), dtype=np.int64)
+        for row, value in enumerate(values):
+            if value is None:
+                codes[row] = -1
+                continue
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(labels)
+                labels.append(value)
+            codes[row] = code
+        dtype = _smallest_int(-1, max(len(labels) - 1, 0))
+        if column and np.dtype(column["dtype"]).itemsize > dtype.itemsize:
+            dtype = np.dtype(column["dtype"])
+        return codes.astype(dtype), {"kind": "category", "dtype": dtype.str, "labels": labels}
+
+    if kind == "datetime" or (kind is None and pd.api.types.is_datetime64_any_dtype(series.dtype)):
+        values = series.to_numpy(dtype="datetime64[ns]")
+        unit = column["dtype"] if column else (
+            "<M8[D]" if (values[~np.isnat(values)].astype("datetime64[D]") == values[~np.isnat(values)]).all()
+            else "<M8[s]"
+        )
+        return values.astype(unit), {"kind": "datetime", "dtype": unit}
+
+    if kind == "bool" or (kind is None and series.dtype == bool):
+        return series.to_numpy(dtype=bool), {"kind": "bool", "dtype": "|b1"}
+
+    values = series.to_numpy()
+    stored = np.dtype(column["dtype"]) if column else None
+    if values.dtype.kind in "iu" and (stored is None or stored.kind == "i"):
+        dtype = _smallest_int(int(values.min()), int(values.max())) if len(values) else np.dtype(np.int8)
+        if stored is not None and stored.itemsize > dtype.itemsize:
+            dtype = stored
+        return values.astype(dtype), {"kind": "numeric", "dtype": dtype.str}
+    keep_float64 = series.name in FLOAT64_COLUMNS or (stored is not None and stored == np.float64)
+    dtype = np.dtype(np.float64 if keep_float64 else np.float32)
+    return values.astype(dtype), {"kind": "numeric", "dtype": dtype.str}
+
+
+# ------------------------------------------------------------
+# Writing
+# ------------------------------------------------------------
+def _write_schema(out_dir, schema):
+    tmp_path = os.path.join(out_dir, SCHEMA_NAME + ".tmp")
+    with open(tmp_path, "w") as handle:
+        json.dump(schema, handle, indent=2)
+    os.replace(tmp_path, os.path.join(out_dir, SCHEMA_NAME))
+
+
+def write_columns(df, out_dir, source=None):
+    """Write ``df`` as a new artifact (replacing any previous one)."""
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        values, entry = _encode(df[name])
+        entry = {"name": name, "file": f"c{i:03d}.npy", **entry}
+        np.save(os.path.join(tmp_dir, entry["file"]), values)
+        columns.append(entry)
+    _write_schema(tmp_dir, {"rows": len(df), "source": source, "columns": columns})
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+
+
+def _append_npy(path, values):
+    """Append to a 1-D .npy in place; the header is rewritten with the new length."""
+    with open(path, "r+b") as handle:
+        version = np.lib.format.read_magic(handle)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(handle)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(handle)
+        data_start = handle.tell()
+
+        # numpy leaves spare room in the header for exactly this
+        handle.seek(0)
+        header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False,
+                  "shape": (shape[0] + len(values),)}
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(handle, header)
+        else:
+            np.lib.format.write_array_header_2_0(handle, header)
+        if handle.tell() != data_start:
+            raise ValueError(f"Header of {path} cannot grow in place")
+
+        handle.seek(0, os.SEEK_END)
+        handle.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+
+def append_columns(df, out_dir):
+    """Append rows with the same columns; dtypes are widened where needed."""
+    schema = read_schema(out_dir)
+    if [column["name"] for column in schema["columns"]] != list(df.columns):
+        raise ValueError("Appended rows have different columns than the artifact")
+
+    for column in schema["columns"]:
+        values, entry = _encode(df[column["name"]], column)
+        path = os.path.join(out_dir, column["file"])
+        if entry["dtype"] != column["dtype"]:
+            # Rare: a code or integer range outgrew its type; rewrite the column
+            existing = np.load(path)[:schema["rows"]].astype(entry["dtype"])
+            np.save(path, np.concatenate([existing, values]))
+        else:
+            _append_npy(path, values)
+        column.update(entry)
+
+    schema["rows"] += len(df)
+    _write_schema(out_dir, schema)
+
+
+def write_categories(categories, csv_path):
+    """Save {column: labels}; code i of a column stands for labels[i]."""
+    tmp_path = categories_path_for(csv_path) + ".tmp"
+    with open(tmp_path, "w") as handle:
+        json.dump(categories, handle, indent=2)
+    os.replace(tmp_path, categories_path_for(csv_path))
+
+
+def _concat_entry(name, entries):
+    """Schema entry that holds the values of every part's entry (like _encode on the joined rows)."""
+    kinds = {entry["kind"] for entry in entries}
+    if kinds == {"category"}:
+        labels = []
+        seen = set()
+        for entry in entries:
+            for label in entry["labels"]:
+                if label not in seen:
+                    seen.add(label)
+                    labels.append(label)
+        dtype = _smallest_int(-1, max(len(labels) - 1, 0))
+        return {"kind": "category", "dtype": dtype.str, "labels": labels}
+    if kinds == {"datetime"}:
+        units = {entry["dtype"] for entry in entries}
+        return {"kind": "datetime", "dtype": units.pop() if len(units) == 1 else "<M8[s]"}
+    if kinds == {"bool"}:
+        return {"kind": "bool", "dtype": "|b1"}
+    if kinds != {"numeric"}:
+        raise ValueError(f"Column {name!r} has incompatible kinds in the parts: {sorted(kinds)}")
+
+    dtypes = [np.dtype(entry["dtype"]) for entry in entries]
+    if all(dtype.kind == "i" for dtype in dtypes):
+        # Each part has the smallest type of its range, so the widest holds them all
+        dtype = max(dtypes, key=lambda dtype: dtype.itemsize)
+    elif name in FLOAT64_COLUMNS or np.dtype(np.float64) in dtypes:
+        dtype = np.dtype(np.float64)
+    else:
+        dtype = np.dtype(np.float32)
+    return {"kind": "numeric", "dtype": dtype.str}
+
+
+def concat_columns(part_dirs, out_dir, source=None):
+    """
+    Write the rows of the artifacts ``part_dirs`` (same columns), in order,
+    as a new artifact (replacing any previous one). Every output column is
+    preallocated on disk and filled one part at a time, so only one part's
+    column is in memory at once; text codes are remapped onto the joined
+    labels.
+    """
+    schemas = [read_schema(part_dir) for part_dir in part_dirs]
+    names = [column["name"] for column in schemas[0]["columns"]]
+    if any([column["name"] for column in schema["columns"]] != names for schema in schemas):
+        raise ValueError("Parts have different columns")
+    n_rows = sum(schema["rows"] for schema in schemas)
+
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = []
+    for i, name in enumerate(names):
+        parts = [schema["columns"][i] for schema in schemas]
+        entry = {"name": name, "file": f"c{i:03d}.npy", **_concat_entry(name, parts)}
+        out = np.lib.format.open_memmap(os.path.join(tmp_dir, entry["file"]), mode="w+",
+                                        dtype=np.dtype(entry["dtype"]), shape=(n_rows,))
+        start = 0
+        for part_dir, schema, part in zip(part_dirs, schemas, parts):
+            values = np.load(os.path.join(part_dir, part["file"]), mmap_mode="r")[:schema["rows"]]
+            if entry["kind"] == "category":
+                index = {label: code for code, label in enumerate(entry["labels"])}
+                # Code -1 (missing) indexes the trailing -1
+                lookup = np.array([index[label] for label in part["labels"]] + [-1], dtype=np.int64)
+                values = lookup[values]
+            out[start:start + schema["rows"]] = values
+            start += schema["rows"]
+        out.flush()
+        del out
+        columns.append(entry)
+    _write_schema(tmp_dir, {"rows": n_rows, "source": source, "columns": columns})
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+
+
+# ------------------------------------------------------------
+# Reading
+# ------------------------------------------------------------
+def read_schema(out_dir):
+    with open(os.path.join(out_dir, SCHEMA_NAME)) as handle:
+        return json.load(handle)
+
+
+def read_categories(csv_path):
+    """{column: labels} written with a feature CSV ({} for older outputs)."""
+    path = categories_path_for(csv_path)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def open_columns(out_dir, columns=None, mmap_mode="r"):
+    """Dict of column name -> memory-mapped array (codes for text columns)."""
+    schema = read_schema(out_dir)
+    wanted = set(columns) if columns is not None else None
+    arrays = {}
+    for column in schema["columns"]:
+        if wanted is None or column["name"] in wanted:
+            arrays[column["name"]] = np.load(
+                os.path.join(out_dir, column["file"]), mmap_mode=mmap_mode
+            )[:schema["rows"]]
+    return arrays
+
+
+def load_frame(out_dir, columns=None):
+    """
+    DataFrame view of the artifact: text columns come back as pandas
+    categoricals (sorted categories, as get_dummies would order them) and
+    dates as datetime64[ns], both decoded into memory. Numeric columns keep
+    their compact dtypes and stay memory-mapped, one block per column;
+    work on them column by column to keep it that way.
+    """
+    schema = read_schema(out_dir)
+    arrays = open_columns(out_dir, columns)
+    data = {}
+    for column in schema["columns"]:
+        name = column["name"]
+        if name not in arrays:
+            continue
+        values = arrays[name]
+        if column["kind"] == "category":
+            labels = column["labels"]
+            data[name] = pd.Categorical.from_codes(
+                np.asarray(values), categories=labels
+            ).set_categories(sorted(labels))
+        elif column["kind"] == "datetime":
+            data[name] = values.astype("datetime64[ns]")
+        else:
+            data[name] = values
+    return pd.DataFrame(data, copy=False)
@@ -1,170 +1,832 @@
 # ============================================================
 # FEATURE ENGINEERING FOR DYNAMIC PRICING & DEMAND PREDICTION
 # ============================================================
+#
+# Usage:
+#   python feauture.py                  # full recompute (also writes a checkpoint)
+#   python feauture.py --incremental    # only rows appended to the input since
+#                                       # the last run; falls back to a full
+#                                       # recompute when that would differ
+#   python feauture.py --chunk-rows 100000
+#                                       # out-of-core: memory bounded by the
+#                                       # chunk size, same output as in memory
+#   python feauture.py --per-sku --workers 8
+#                                       # lags / rolling windows per
+#                                       # (Product ID, Store ID), SKUs spread
+#                                       # over a process pool
+#
+# The incremental run appends to cleaned_features.csv and produces exactly
+# the rows a full recompute would.
+
+import argparse
+import concurrent.futures
+import hashlib
+import io
+import os
+import pickle
+import shutil
+import sys
+import tempfile
 
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
-# ------------------------------------------------------------
-# STEP 0: LOAD DATA & BASIC CLEANING
-# ------------------------------------------------------------
+import columnar
 
-# Load dataset
-df = pd.read_csv("../milestone-1/combined_dataset.csv")
+sys.path.insert(0, "../milestone-1")
+from data_loader import load_dataset, RESTOCK_DATE_FORMAT
 
-# Convert Date column to datetime format
-df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+INPUT_PATH = "../milestone-1/combined_dataset.csv"
+OUTPUT_PATH = "../milestone-3/cleaned_features.csv"
+CHECKPOINT_PATH = "../milestone-3/feature_checkpoint.pkl"
 
-# Sort data by date (important for lag features)
-df = df.sort_values('Date')
+# Rows of history every new row needs (longest lag / rolling window)
+CONTEXT_ROWS = 30
 
-# Remove duplicate rows
-df = df.drop_duplicates()
+# One time series per (product, store) in the per-SKU mode
+SKU_COLUMNS = ['Product ID', 'Store ID']
 
-# ------------------------------------------------------------
-# STEP 1: TIME-BASED FEATURES
-# ------------------------------------------------------------
+categorical_cols = ['Product ID', 'Category', 'Brand', 'Store ID']
 
-df['day'] = df['Date'].dt.day
-df['month'] = df['Date'].dt.month
-df['year'] = df['Date'].dt.year
-df['day_of_week'] = df['Date'].dt.dayofweek
+# Assume cost is 70% of selling price
+COST_FACTOR = 0.7
 
-# Weekend indicator (Saturday=5, Sunday=6)
-df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
 
-# Season feature (India-relevant)
-df['season'] = df['month'].map({
-    12: 'Winter', 1: 'Winter', 2: 'Winter',
-    3: 'Summer', 4: 'Summer', 5: 'Summer',
-    6: 'Monsoon', 7: 'Monsoon', 8: 'Monsoon',
-    9: 'Post-Monsoon', 10: 'Post-Monsoon', 11: 'Post-Monsoon'
-})
+class FullRecomputeNeeded(Exception):
+    """The new rows cannot simply be appended to the existing output."""
 
-# Festival / holiday indicator (assumed for Oct–Dec)
-df['is_festival'] = df['month'].isin([10, 11, 12]).astype(int)
 
 # ------------------------------------------------------------
-# STEP 2: PRICE-BASED FEATURES
+# STEP 0: LOAD DATA & BASIC CLEANING
 # ------------------------------------------------------------
+def load_raw(source):
+    if isinstance(source, str):
+        # Shared typed loader: Date already parsed, IDs categorical, and a
+        # cached snapshot on repeat runs. Prices stay float64, and
+        # Restock_Date goes back to its source text because the model's
+        # one-hot column names are built from it
+        df = load_dataset(source, measure_dtype="float64")
+        if 'Restock_Date' in df.columns:
+            df['Restock_Date'] = df['Restock_Date'].dt.strftime(RESTOCK_DATE_FORMAT)
+        return df
+
+    # Appended bytes (incremental mode)
+    df = pd.read_csv(source)
+
+    # Convert Date column to datetime format
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    return df
+
+
+def order_rows(df):
+    # Sort data by date (important for lag features). The sort is stable:
+    # rows of the same day keep their file order, so appending later days
+    # never reorders the earlier ones
+    df = df.sort_values('Date', kind='mergesort')
+
+    # Remove duplicate rows
+    return df.drop_duplicates()
+
+
+def rolling_std(values, window, groups=None):
+    # Each window is computed on its own (pandas updates a running variance,
+    # whose rounding depends on everything before it), so a row's value is
+    # the same whether the series starts at the first day or a checkpoint
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = sliding_window_view(values, window).std(axis=1, ddof=1)
+        if groups is not None:
+            # Windows that start in an earlier (contiguous) group
+            out[window - 1:][groups[:len(groups) - window + 1] != groups[window - 1:]] = np.nan
+    return out
+
+
+# ``groups`` (per-SKU mode) holds one id per row, with each group's rows
+# contiguous and in date order; lags and windows then stop at group edges.
+# groupby().rolling() restarts its running sums at every group, so a
+# group's values do not depend on which groups are computed alongside it.
+def shift(series, periods, groups=None):
+    if groups is None:
+        return series.shift(periods)
+    return series.groupby(groups).shift(periods)
+
+
+def rolling_mean(series, window, groups=None):
+    if groups is None:
+        return series.rolling(window=window).mean()
+    return series.groupby(groups).rolling(window=window).mean().droplevel(0)
+
+
+def pct_change(series, groups=None):
+    if groups is None:
+        return series.pct_change()
+    # Same as pct_change(): gaps are forward-filled first, within the group
+    filled = series.groupby(groups).ffill()
+    return filled / shift(filled, 1, groups) - 1
+
+
+def add_features(df, groups=None):
+    # ------------------------------------------------------------
+    # STEP 1: TIME-BASED FEATURES
+    # ------------------------------------------------------------
+
+    df['day'] = df['Date'].dt.day
+    df['month'] = df['Date'].dt.month
+    df['year'] = df['Date'].dt.year
+    df['day_of_week'] = df['Date'].dt.dayofweek
+
+    # Weekend indicator (Saturday=5, Sunday=6)
+    df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
+
+    # Season feature (India-relevant)
+    df['season'] = df['month'].map({
+        12: 'Winter', 1: 'Winter', 2: 'Winter',
+        3: 'Summer', 4: 'Summer', 5: 'Summer',
+        6: 'Monsoon', 7: 'Monsoon', 8: 'Monsoon',
+        9: 'Post-Monsoon', 10: 'Post-Monsoon', 11: 'Post-Monsoon'
+    })
+
+    # Festival / holiday indicator (assumed for Oct–Dec)
+    df['is_festival'] = df['month'].isin([10, 11, 12]).astype(int)
+
+    # ------------------------------------------------------------
+    # STEP 2: PRICE-BASED FEATURES
+    # ------------------------------------------------------------
+
+    # Lag prices
+    df['price_lag_1'] = shift(df['Price'], 1, groups)
+    df['price_lag_7'] = shift(df['Price'], 7, groups)
+
+    # Percentage price change
+    df['price_change_pct'] = (df['Price'] - df['price_lag_1']) / df['price_lag_1']
+
+    # Discount percentage (bounded)
+    df['discount_pct'] = df['price_change_pct'].clip(lower=-1, upper=1)
 
-# Lag prices
-df['price_lag_1'] = df['Price'].shift(1)
-df['price_lag_7'] = df['Price'].shift(7)
+    # ------------------------------------------------------------
+    # STEP 3: DEMAND FEATURES (LAG & ROLLING)
+    # ------------------------------------------------------------
 
-# Percentage price change
-df['price_change_pct'] = (df['Price'] - df['price_lag_1']) / df['price_lag_1']
+    # Lag demand (Units Sold)
+    df['sales_lag_1'] = shift(df['Units Sold'], 1, groups)
+    df['sales_lag_7'] = shift(df['Units Sold'], 7, groups)
+    df['sales_lag_30'] = shift(df['Units Sold'], 30, groups)
 
-# Discount percentage (bounded)
-df['discount_pct'] = df['price_change_pct'].clip(lower=-1, upper=1)
+    # Rolling averages
+    df['rolling_sales_7'] = rolling_mean(df['Units Sold'], 7, groups)
+    df['rolling_sales_30'] = rolling_mean(df['Units Sold'], 30, groups)
 
-# ------------------------------------------------------------
-# STEP 3: DEMAND FEATURES (LAG & ROLLING)
-# ------------------------------------------------------------
+    # Demand volatility (standard deviation)
+    df['demand_volatility'] = rolling_std(df['Units Sold'].to_numpy(dtype=np.float64), 7, groups)
 
-# Lag demand (Units Sold)
-df['sales_lag_1'] = df['Units Sold'].shift(1)
-df['sales_lag_7'] = df['Units Sold'].shift(7)
-df['sales_lag_30'] = df['Units Sold'].shift(30)
+    # ------------------------------------------------------------
+    # STEP 4: PRICE ELASTICITY FEATURES
+    # ------------------------------------------------------------
 
-# Rolling averages
-df['rolling_sales_7'] = df['Units Sold'].rolling(window=7).mean()
-df['rolling_sales_30'] = df['Units Sold'].rolling(window=30).mean()
+    # Percentage changes
+    df['price_pct_change'] = pct_change(df['Price'], groups)
+    df['demand_pct_change'] = pct_change(df['Units Sold'], groups)
 
-# Demand volatility (standard deviation)
-df['demand_volatility'] = df['Units Sold'].rolling(window=7).std()
+    # Price elasticity calculation
+    df['price_elasticity'] = df['demand_pct_change'] / df['price_pct_change']
+
+    # Elasticity classification
+    df['elasticity_class'] = pd.cut(
+        df['price_elasticity'],
+        bins=[-np.inf, -1, -0.3, np.inf],
+        labels=['High Elastic', 'Medium Elastic', 'Low Elastic']
+    )
 
-# ------------------------------------------------------------
-# STEP 4: PRICE ELASTICITY FEATURES
-# ------------------------------------------------------------
+    # ------------------------------------------------------------
+    # STEP 5: INVENTORY FEATURES
+    # ------------------------------------------------------------
 
-# Percentage changes
-df['price_pct_change'] = df['Price'].pct_change()
-df['demand_pct_change'] = df['Units Sold'].pct_change()
+    # Inventory to demand ratio
+    df['inventory_ratio'] = df['Stock Level'] / (df['Units Sold'] + 1)
 
-# Price elasticity calculation
-df['price_elasticity'] = df['demand_pct_change'] / df['price_pct_change']
+    # Days until stock-out (using rolling demand)
+    df['days_to_stockout'] = df['Stock Level'] / (df['rolling_sales_7'] + 1)
 
-# Elasticity classification
-df['elasticity_class'] = pd.cut(
-    df['price_elasticity'],
-    bins=[-np.inf, -1, -0.3, np.inf],
-    labels=['High Elastic', 'Medium Elastic', 'Low Elastic']
-)
+    # Inventory condition flags
+    df['low_stock_flag'] = (df['Stock Level'] <= 10).astype(int)
+    df['overstock_flag'] = (df['Stock Level'] > 4000).astype(int)
 
-# ------------------------------------------------------------
-# STEP 5: INVENTORY FEATURES
-# ------------------------------------------------------------
+    # ------------------------------------------------------------
+    # STEP 6: PROFIT FEATURES
+    # ------------------------------------------------------------
 
-# Inventory to demand ratio
-df['inventory_ratio'] = df['Stock Level'] / (df['Units Sold'] + 1)
+    df['cost_price'] = df['Price'] * COST_FACTOR
+    df['profit_per_unit'] = df['Price'] - df['cost_price']
+    df['profit_margin'] = df['profit_per_unit'] / df['Price']
 
-# Days until stock-out (using rolling demand)
-df['days_to_stockout'] = df['Stock Level'] / (df['rolling_sales_7'] + 1)
+    # ------------------------------------------------------------
+    # STEP 7: INTERACTION FEATURES
+    # ------------------------------------------------------------
+
+    df['weekend_price_interaction'] = df['is_weekend'] * df['Price']
+    df['season_discount_interaction'] = df['is_festival'] * df['discount_pct']
+    df['inventory_price_interaction'] = df['inventory_ratio'] * df['Price']
+    return df
 
-# Inventory condition flags
-df['low_stock_flag'] = (df['Stock Level'] <= 10).astype(int)
-df['overstock_flag'] = (df['Stock Level'] > 4000).astype(int)
 
 # ------------------------------------------------------------
-# STEP 6: PROFIT FEATURES
+# STEP 8: CATEGORICAL ENCODING (IF COLUMNS EXIST)
 # ------------------------------------------------------------
+def encode_categoricals(df, categories=None):
+    """
+    Replace categorical columns by their codes.
+
+    ``categories`` maps column -> sorted category list from an earlier run;
+    it is extended in place. A new value that would sort before an
+    existing one shifts existing codes, so only a full recompute is right.
+    """
+    if categories is None:
+        categories = {}
+
+    # Season is encoded the same way
+    for col in categorical_cols + ['season']:
+        if col not in df.columns:
+            continue
+        seen = df[col].astype('category').cat.categories.tolist()
+        known = categories.get(col)
+        if known is None:
+            known = categories[col] = seen
+        else:
+            new = sorted(set(seen) - set(known))
+            if new and known and new[0] < known[-1]:
+                raise FullRecomputeNeeded(f"New {col} values {new[:5]} change existing codes")
+            known.extend(new)
+        df[col] = pd.Categorical(df[col], categories=known).codes
+    return categories
 
-# Assume cost is 70% of selling price
-COST_FACTOR = 0.7
 
-df['cost_price'] = df['Price'] * COST_FACTOR
-df['profit_per_unit'] = df['Price'] - df['cost_price']
-df['profit_margin'] = df['profit_per_unit'] / df['Price']
+# ------------------------------------------------------------
+# STEP 9: FINAL CLEANING (SAFE VERSION)
+# ------------------------------------------------------------
+def final_clean(df, previous_row=None, groups=None):
+    """
+    Fill missing values; ``previous_row`` is the last forward-filled row of
+    the existing output, so gaps in new rows are filled as in one big frame.
+    With ``groups`` the forward fill stays inside each group.
+
+    Returns (cleaned frame, its last forward-filled row).
+    """
+    # Replace infinite values with NaN
+    df.replace([np.inf, -np.inf], np.nan, inplace=True)
+
+    # Forward fill first
+    if previous_row is not None:
+        df = pd.concat([previous_row, df]).ffill().iloc[1:]
+    elif groups is not None:
+        df = df.groupby(groups).ffill()
+    else:
+        df.ffill(inplace=True)
+    last_row = df.iloc[[-1]].copy()
+
+    # Fill remaining NaNs ONLY for numeric columns
+    numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns
+    df[numeric_cols] = df[numeric_cols].fillna(0)
+    return df, last_row
+
 
 # ------------------------------------------------------------
-# STEP 7: INTERACTION FEATURES
+# CHECKPOINT (state needed to extend the output later)
 # ------------------------------------------------------------
+def source_marker(path, offset, n_bytes=4096):
+    """Hash of the bytes just before ``offset``: detects a rewritten input file."""
+    with open(path, "rb") as handle:
+        handle.seek(max(offset - n_bytes, 0))
+        return hashlib.sha256(handle.read(min(offset, n_bytes))).hexdigest()
+
+
+def write_checkpoint(path, context, last_row, categories, source_path, offset, rows, has_undated):
+    state = {
+        "context": context.tail(CONTEXT_ROWS).copy(),
+        "last_row": last_row,
+        "categories": categories,
+        "last_date": context['Date'].max(),
+        "source_path": os.path.abspath(source_path),
+        "source_offset": offset,
+        "source_marker": source_marker(source_path, offset),
+        "rows": rows,
+        "has_undated": has_undated
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as handle:
+        pickle.dump(state, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def read_checkpoint(path):
+    with open(path, "rb") as handle:
+        return pickle.load(handle)
 
-df['weekend_price_interaction'] = df['is_weekend'] * df['Price']
-df['season_discount_interaction'] = df['is_festival'] * df['discount_pct']
-df['inventory_price_interaction'] = df['inventory_ratio'] * df['Price']
 
 # ------------------------------------------------------------
-# STEP 8: CATEGORICAL ENCODING (IF COLUMNS EXIST)
+# FULL RECOMPUTE
 # ------------------------------------------------------------
+def run_full(input_path, output_path, checkpoint_path, columns=True):
+    offset = os.path.getsize(input_path)
 
-categorical_cols = ['Product ID', 'Category', 'Brand', 'Store ID']
+    # Load dataset
+    df = order_rows(load_raw(input_path))
+    raw = df.copy()
+
+    df = add_features(df)
+    categories = encode_categoricals(df)
+    df, last_row = final_clean(df)
 
-for col in categorical_cols:
-    if col in df.columns:
-        df[col] = df[col].astype('category').cat.codes
+    df.to_csv(output_path, index=False)
+    columnar.write_categories(categories, output_path)
+    if columns:
+        columnar.write_columns(df, columnar.columns_dir_for(output_path), source=output_path)
+    print(f"Cleaned feature dataset saved successfully at: {output_path}")
+
+    if checkpoint_path:
+        write_checkpoint(
+            checkpoint_path, raw, last_row, categories, input_path, offset,
+            len(df), bool(raw['Date'].isna().any())
+        )
+    return df
 
-# Encode season separately
-df['season'] = df['season'].astype('category').cat.codes
 
 # ------------------------------------------------------------
-# STEP 9: FINAL CLEANING (SAFE VERSION)
+# INCREMENTAL UPDATE (rows appended since the checkpoint)
 # ------------------------------------------------------------
+def extend_features(context, new, categories, previous_row):
+    """
+    Feature rows for ``new`` (date-sorted raw rows) as if computed in one
+    frame with everything before it.
+
+    ``context`` holds the preceding raw rows (at least CONTEXT_ROWS, or all
+    of them), ``previous_row`` the last forward-filled output row.
+    Returns (feature rows, their last forward-filled row, categories).
+    """
+    # Lags and rolling windows of the new rows reach back into the context
+    frame = add_features(pd.concat([context, new], ignore_index=True))
+    frame = frame.iloc[len(context):].copy()
+
+    categories = encode_categoricals(frame, categories)
+    frame, last_row = final_clean(frame, previous_row)
+    return frame, last_row, categories
+
+
+def read_appended_rows(input_path, state):
+    size = os.path.getsize(input_path)
+    if (os.path.abspath(input_path) != state["source_path"]
+            or size < state["source_offset"]
+            or source_marker(input_path, state["source_offset"]) != state["source_marker"]):
+        raise FullRecomputeNeeded("Input file was replaced or rewritten")
+
+    with open(input_path, "rb") as handle:
+        header = handle.readline()
+        handle.seek(state["source_offset"])
+        appended = handle.read(size - state["source_offset"])
+    if not appended.strip():
+        return None, size
+    return load_raw(io.BytesIO(header + appended)), size
+
+
+def run_incremental(input_path, output_path, checkpoint_path, columns=True):
+    state = read_checkpoint(checkpoint_path)
+    columns_dir = columnar.columns_dir_for(output_path)
+    if columns and not os.path.exists(columns_dir):
+        raise FullRecomputeNeeded("Columnar artifact is missing")
+    new, offset = read_appended_rows(input_path, state)
+    if new is None:
+        print("No new rows since the last checkpoint")
+        return None
+
+    # Appending is only correct if the new rows sort after everything written
+    if state["has_undated"] or new['Date'].isna().any():
+        raise FullRecomputeNeeded("Rows without a valid date sort to the end of the output")
+    if new['Date'].min() <= state["last_date"]:
+        raise FullRecomputeNeeded("New rows are not later than the last processed day")
+    new = order_rows(new)
+
+    context = state["context"]
+    frame, last_row, categories = extend_features(
+        context, new, state["categories"], state["last_row"]
+    )
+
+    frame.to_csv(output_path, mode="a", header=False, index=False)
+    columnar.write_categories(categories, output_path)
+    if columns:
+        columnar.append_columns(frame, columns_dir)
+    print(f"Appended {len(frame)} rows to: {output_path}")
+
+    write_checkpoint(
+        checkpoint_path, pd.concat([context, new]), last_row, categories,
+        input_path, offset, state["rows"] + len(frame), False
+    )
+    return frame
 
-# Replace infinite values with NaN
-df.replace([np.inf, -np.inf], np.nan, inplace=True)
 
-# Forward fill first
-df.ffill(inplace=True)
-
-# Fill remaining NaNs ONLY for numeric columns
-numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns
-df[numeric_cols] = df[numeric_cols].fillna(0)
 # ------------------------------------------------------------
-# STEP 10: SAVE CLEANED FEATURE DATASET
+# OUT-OF-CORE MODE (inputs larger than memory)
 # ------------------------------------------------------------
+# Pass 1 reads the input in chunks, sorts each chunk by (date, row number)
+# and spills it to a temporary "run" file; it also collects every category
+# value, so codes come out as in the in-memory path. Pass 2 merges the runs
+# back in date order and pushes chunk_rows rows at a time through
+# extend_features(), carrying the last CONTEXT_ROWS raw rows and the last
+# forward-filled row from chunk to chunk. Peak memory is a few chunks,
+# whatever the size of the input.
+
+# Sort keys kept next to the data in run files
+DATE_KEY, ROW_KEY = "__date_key", "__row"
+
+# Undated rows sort last, like sort_values(na_position='last')
+NAT_KEY = np.iinfo(np.int64).max
+
+# Integer columns that hold NaN (so float) when any date is missing
+DATE_PARTS = ['day', 'month', 'year', 'day_of_week']
+
+
+def _date_key(dates):
+    keys = dates.to_numpy(dtype="datetime64[ns]").view(np.int64).copy()
+    keys[dates.isna().to_numpy()] = NAT_KEY
+    return keys
+
+
+def spill_sorted_runs(input_path, chunk_rows, tmp_dir):
+    """Pass 1: sorted run files, category values, column dtypes, row and undated counts."""
+    run_paths, categories, dtypes = [], {}, {}
+    first_row = n_undated = 0
+    block_rows = max(chunk_rows // 8, 1000)
+
+    for chunk in pd.read_csv(input_path, chunksize=chunk_rows):
+        chunk['Date'] = pd.to_datetime(chunk['Date'], errors='coerce')
+        chunk[DATE_KEY] = _date_key(chunk['Date'])
+        chunk[ROW_KEY] = np.arange(first_row, first_row + len(chunk))
+        first_row += len(chunk)
+
+        for col in categorical_cols:
+            if col in chunk.columns:
+                categories.setdefault(col, set()).update(chunk[col].dropna().unique().tolist())
+        months = chunk['Date'].dt.month.dropna().unique().tolist()
+        categories.setdefault('month', set()).update(months)
+        n_undated += int(chunk['Date'].isna().sum())
+
+        # A column that is float in any chunk is float in the whole file
+        for col, dtype in chunk.dtypes.items():
+            previous = dtypes.get(col)
+            if previous is not None and previous != dtype:
+                numeric = previous.kind in "iuf" and dtype.kind in "iuf"
+                dtype = np.result_type(previous, dtype) if numeric else previous
+            dtypes[col] = dtype
+
+        chunk = chunk.sort_values([DATE_KEY, ROW_KEY], kind='mergesort')
+        run_path = os.path.join(tmp_dir, f"run_{len(run_paths):05d}.pkl")
+        with open(run_path, "wb") as handle:
+            for start in range(0, len(chunk), block_rows):
+                pickle.dump(chunk.iloc[start:start + block_rows], handle, protocol=pickle.HIGHEST_PROTOCOL)
+        run_paths.append(run_path)
+
+    return run_paths, categories, dtypes, first_row, n_undated
+
+
+def _run_blocks(path):
+    with open(path, "rb") as handle:
+        while True:
+            try:
+                yield pickle.load(handle)
+            except EOFError:
+                return
+
+
+def merge_runs(run_paths):
+    """Pass 2: yield date-ordered (stable) pieces from the sorted runs."""
+    readers = [_run_blocks(path) for path in run_paths]
+    heads = {}
+    for i, reader in enumerate(readers):
+        block = next(reader, None)
+        if block is not None:
+            heads[i] = block
+
+    while heads:
+        # Everything up to the smallest block end is final in every run
+        cutoff = min(
+            (block[DATE_KEY].iat[-1], block[ROW_KEY].iat[-1]) for block in heads.values()
+        )
+        pieces = []
+        for i in list(heads):
+            block = heads[i]
+            date_key = block[DATE_KEY].to_numpy()
+            row_key = block[ROW_KEY].to_numpy()
+            take = (date_key < cutoff[0]) | ((date_key == cutoff[0]) & (row_key <= cutoff[1]))
+            n_take = int(take.sum())      # blocks are sorted, so this is a prefix
+            if n_take:
+                pieces.append(block.iloc[:n_take])
+            if n_take == len(block):
+                block = next(readers[i], None)
+                if block is None:
+                    del heads[i]
+                    continue
+            else:
+                block = block.iloc[n_take:]
+            heads[i] = block
+
+        merged = pd.concat(pieces)
+        order = np.lexsort((merged[ROW_KEY].to_numpy(), merged[DATE_KEY].to_numpy()))
+        yield merged.iloc[order]
+
+
+def rechunk(pieces, chunk_rows):
+    """Regroup merged pieces into frames of about ``chunk_rows`` rows."""
+    buffered, n_buffered = [], 0
+    for piece in pieces:
+        buffered.append(piece)
+        n_buffered += len(piece)
+        if n_buffered >= chunk_rows:
+            yield pd.concat(buffered)
+            buffered, n_buffered = [], 0
+    if buffered:
+        yield pd.concat(buffered)
+
+
+def season_categories(months):
+    """Sorted season labels that the given months produce."""
+    probe = add_features(pd.DataFrame({
+        'Date': pd.to_datetime([f"2000-{int(m):02d}-01" for m in sorted(months)]),
+        'Price': 1.0, 'Units Sold': 1, 'Stock Level': 1
+    }))
+    return sorted(probe['season'].unique().tolist())
+
+
+def run_chunked(input_path, output_path, checkpoint_path, chunk_rows, tmp_dir=None, columns=True):
+    """Same output as run_full() with memory bounded by ``chunk_rows``."""
+    offset = os.path.getsize(input_path)
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as spill_dir:
+        run_paths, seen, dtypes, n_input, n_undated = spill_sorted_runs(input_path, chunk_rows, spill_dir)
+
+        # Codes from every value in the file, as astype('category') would give
+        categories = {col: sorted(values) for col, values in seen.items() if col != 'month'}
+        categories['season'] = season_categories(seen.get('month', []))
+
+        has_undated = n_undated > 0
+        context, previous_row = None, None
+        seen_today, today = set(), None
+        rows_written = 0
+        for chunk in rechunk(merge_runs(run_paths), chunk_rows):
+            date_key = chunk[DATE_KEY].to_numpy()
+            chunk = chunk.drop(columns=[DATE_KEY, ROW_KEY])
+            chunk = chunk.astype({col: dtype for col, dtype in dtypes.items() if col in chunk.columns})
+
+            # drop_duplicates(): duplicates share a date, so only rows of the
+            # day that straddles the chunk boundary need remembering
+            hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+            duplicate = pd.Series(hashes).duplicated().to_numpy()
+            if today is not None:
+                duplicate |= (date_key == today) & np.isin(hashes, list(seen_today))
+            chunk, hashes, date_key = chunk[~duplicate], hashes[~duplicate], date_key[~duplicate]
+            if not len(chunk):
+                continue
+            last_day = date_key[-1]
+            if last_day != today:
+                seen_today = set()
+            seen_today.update(hashes[date_key == last_day].tolist())
+            today = last_day
+
+            if context is None:
+                context = chunk.iloc[:0]
+            frame, previous_row, categories = extend_features(context, chunk, categories, previous_row)
+            if has_undated:
+                # One missing date makes these float columns in the whole file
+                frame[DATE_PARTS] = frame[DATE_PARTS].astype(np.float64)
+            frame.to_csv(output_path, mode="w" if rows_written == 0 else "a",
+                         header=rows_written == 0, index=False)
+            if columns and rows_written == 0:
+                columnar.write_columns(frame, columnar.columns_dir_for(output_path), source=output_path)
+            elif columns:
+                columnar.append_columns(frame, columnar.columns_dir_for(output_path))
+            rows_written += len(frame)
+            context = pd.concat([context, chunk]).tail(CONTEXT_ROWS)
+
+    columnar.write_categories(categories, output_path)
+    print(f"Cleaned feature dataset saved successfully at: {output_path} "
+          f"({n_input} input rows, {rows_written} written, {len(run_paths)} sorted runs)")
+
+    if checkpoint_path and context is not None:
+        write_checkpoint(
+            checkpoint_path, context, previous_row, categories, input_path, offset,
+            rows_written, has_undated
+        )
+    return rows_written
 
-output_path = "../milestone-3/cleaned_features.csv"
 
-df.to_csv(output_path, index=False)
+# ------------------------------------------------------------
+# PER-SKU MODE (lags and windows within each product/store, in parallel)
+# ------------------------------------------------------------
+# The modes above shift one date-sorted frame, so a row's "previous day"
+# is whichever product happened to come before it. Here every
+# (Product ID, Store ID) series gets its own lags, rolling windows and
+# forward fill. The raw columns are written once to .npy files that the
+# worker processes memory-map; a task only names a range of SKUs, and
+# each worker writes its rows as one CSV part (and one columnar part).
+# No frame is sent back: the parent only joins the part files.
+
+# Filled by _init_sku_worker in every worker process
+_shared = {}
+
+
+def share_columns(df, share_dir):
+    """Write every column of ``df`` to ``share_dir``; returns (name, path, kind, labels) specs."""
+    specs = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        path = os.path.join(share_dir, f"c{i:03d}.npy")
+        labels = None
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            kind, values = "datetime", series.to_numpy(dtype="datetime64[ns]")
+        elif series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype):
+            codes, uniques = pd.factorize(series.astype(object))
+            kind, values, labels = "text", codes, list(uniques)
+        else:
+            kind, values = "numeric", series.to_numpy()
+        np.save(path, values)
+        specs.append((name, path, kind, labels))
+    return specs
+
+
+def shared_frame(specs, rows):
+    """Rebuild the rows ``rows`` of a shared frame from the memory-mapped columns."""
+    data = {}
+    for name, path, kind, labels in specs:
+        values = np.load(path, mmap_mode="r")[rows]
+        if kind == "text":
+            decoded = np.full(len(values), np.nan, dtype=object)
+            present = values >= 0
+            decoded[present] = np.asarray(labels, dtype=object)[values[present]]
+            values = decoded
+        data[name] = values
+    return pd.DataFrame(data)
+
+
+def _init_sku_worker(share_dir, specs, categories, has_undated, columns):
+    _shared.update(
+        share_dir=share_dir, specs=specs, categories=categories,
+        has_undated=has_undated, columns=columns,
+        order=np.load(os.path.join(share_dir, "order.npy"), mmap_mode="r"),
+        bounds=np.load(os.path.join(share_dir, "bounds.npy"))
+    )
+
+
+def part_path(share_dir, index):
+    return os.path.join(share_dir, f"part_{index:05d}.csv")
+
+
+def part_columns_dir(share_dir, index):
+    return os.path.join(share_dir, f"part_{index:05d}_columns")
+
+
+def sku_features(task):
+    """
+    Features of SKUs ``first``..``last - 1``, written to the task's own CSV
+    part (the first part carries the header) and, unless disabled, its own
+    columnar part. Returns the row count.
+    """
+    index, first, last = task
+    bounds = _shared["bounds"]
+    frame = shared_frame(_shared["specs"], np.asarray(_shared["order"][bounds[first]:bounds[last]]))
+    groups = np.repeat(np.arange(first, last), np.diff(bounds[first:last + 1]))
+
+    # One vectorized pass over all SKUs of the task
+    frame = add_features(frame, groups)
+    encode_categoricals(frame, _shared["categories"])
+    frame, _ = final_clean(frame, groups=groups)
+    if _shared["has_undated"]:
+        # Same column types in every part, as in one big frame
+        frame[DATE_PARTS] = frame[DATE_PARTS].astype(np.float64)
+
+    frame.to_csv(part_path(_shared["share_dir"], index), header=index == 0, index=False)
+    if _shared["columns"]:
+        columnar.write_columns(frame, part_columns_dir(_shared["share_dir"], index))
+    return len(frame)
+
+
+def sku_tasks(bounds, n_tasks):
+    """Split SKUs into about ``n_tasks`` (index, first, last) ranges of similar row counts."""
+    target = max(bounds[-1] // max(n_tasks, 1), 1)
+    tasks, first = [], 0
+    for sku in range(1, len(bounds)):
+        if bounds[sku] - bounds[first] >= target or sku == len(bounds) - 1:
+            tasks.append((len(tasks), first, sku))
+            first = sku
+    return tasks
+
+
+def run_per_sku(input_path, output_path, checkpoint_path, workers=None, tmp_dir=None, columns=True):
+    """
+    Per-(product, store) features computed by ``workers`` processes.
+
+    Rows come out grouped by SKU (sorted Product ID, Store ID), each SKU in
+    date order; model.py sorts by date before its split.
+    """
+    workers = workers or os.cpu_count() or 1
+    df = order_rows(load_raw(input_path)).reset_index(drop=True)
+
+    # Codes from every value in the file, as in the other modes
+    categories = {
+        col: sorted(df[col].dropna().unique().tolist()) for col in categorical_cols if col in df.columns
+    }
+    categories['season'] = season_categories(df['Date'].dt.month.dropna().unique().tolist())
+    has_undated = bool(df['Date'].isna().any())
+
+    # Rows grouped by SKU, date order kept inside each SKU
+    keys = [col for col in SKU_COLUMNS if col in df.columns]
+    sku = df.groupby(keys, sort=True, dropna=False, observed=True).ngroup().to_numpy()
+    order = np.argsort(sku, kind='stable')
+    bounds = np.searchsorted(sku[order], np.arange(sku.max() + 2))
+    tasks = sku_tasks(bounds, workers * 4)
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as share_dir:
+        specs = share_columns(df, share_dir)
+        np.save(os.path.join(share_dir, "order.npy"), order)
+        np.save(os.path.join(share_dir, "bounds.npy"), bounds)
+        n_input = len(df)
+        del df
+
+        init_args = (share_dir, specs, categories, has_undated, columns)
+        if workers == 1:
+            _init_sku_worker(*init_args)
+            results = [sku_features(task) for task in tasks]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(
+                    workers, initializer=_init_sku_worker, initargs=init_args) as pool:
+                # map() returns results in task order, so the output does
+                # not depend on which worker finishes first
+                results = list(pool.map(sku_features, tasks))
+
+        # Parts are joined in task order
+        with open(output_path, "wb") as out:
+            for index, _, _ in tasks:
+                with open(part_path(share_dir, index), "rb") as part:
+                    shutil.copyfileobj(part, out)
+        if columns:
+            columnar.concat_columns([part_columns_dir(share_dir, index) for index, _, _ in tasks],
+                                    columnar.columns_dir_for(output_path), source=output_path)
+
+    columnar.write_categories(categories, output_path)
+    # A checkpoint of the global mode cannot extend this output
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    rows_written = sum(results)
+    print(f"Cleaned feature dataset saved successfully at: {output_path} "
+          f"({n_input} rows, {rows_written} written, {len(bounds) - 1} SKUs, "
+          f"{len(tasks)} tasks, {workers} workers)")
+    return rows_written
 
-print(f"Cleaned feature dataset saved successfully at: {output_path}")
 
 # ------------------------------------------------------------
-# FINAL CHECK
+# STEP 10: SAVE CLEANED FEATURE DATASET
 # ------------------------------------------------------------
-
-print("Feature Engineering Completed Successfully ✅")
-print("Final Dataset Shape:", df.shape)
-print(df.head())
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build cleaned_features.csv")
+    parser.add_argument("--input", default=INPUT_PATH)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only process rows appended to the input since the last run")
+    parser.add_argument("--chunk-rows", type=int, default=0,
+                        help="Stream the input in chunks of this many rows (for inputs larger than memory)")
+    parser.add_argument("--tmp-dir", help="Where the chunked mode spills sorted runs")
+    parser.add_argument("--no-columnar", action="store_true",
+                        help="Skip the binary per-column copy of the output (see columnar.py)")
+    parser.add_argument("--per-sku", action="store_true",
+                        help="Lags / rolling windows per (Product ID, Store ID) instead of across all rows")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Processes for --per-sku (default: one per CPU core)")
+    args = parser.parse_args()
+
+    def recompute():
+        if args.per_sku:
+            run_per_sku(args.input, args.output, args.checkpoint, args.workers,
+                        args.tmp_dir, not args.no_columnar)
+            return None
+        if args.chunk_rows > 0:
+            run_chunked(args.input, args.output, args.checkpoint, args.chunk_rows,
+                        args.tmp_dir, not args.no_columnar)
+            return None
+        return run_full(args.input, args.output, args.checkpoint, not args.no_columnar)
+
+    df = None
+    if args.incremental and not args.per_sku and os.path.exists(args.checkpoint) and os.path.exists(args.output):
+        try:
+            df = run_incremental(args.input, args.output, args.checkpoint, not args.no_columnar)
+        except FullRecomputeNeeded as exc:
+            print(f"Incremental update not possible ({exc}); recomputing everything")
+            df = recompute()
+    else:
+        df = recompute()
+
+    # ------------------------------------------------------------
+    # FINAL CHECK
+    # ------------------------------------------------------------
+
+    print("Feature Engineering Completed Successfully ✅")
+    if df is not None:
+        print("Final Dataset Shape:", df.shape)
+        print(df.head())
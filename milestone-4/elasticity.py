@@ -0,0 +1,255 @@
+# ============================================================
+# PRICE ELASTICITY ENGINE (batched log-log demand regressions)
+# ============================================================
+#
+# Fits   log(units) = intercept + elasticity * log(price)
+# for every product (or product x store) at once. Each group's fit only
+# needs a handful of sums (n, Σx, Σy, Σxx, Σxy, Σyy), which np.bincount
+# computes for all groups in one pass over the stacked arrays; the
+# closed-form least-squares solution is then evaluated elementwise. No
+# Python loop runs per SKU, so tens of thousands of SKUs refit in seconds.
+#
+# Rolling mode fits each group on a trailing window of days ending at
+# every date it was observed, using prefix sums over the rows sorted by
+# (group, date).
+#
+# Rows with zero units or a non-positive price have no logarithm and are
+# left out of the fits.
+#
+# Usage (from milestone-4):
+#   python elasticity.py                          # per product
+#   python elasticity.py --level product_store    # per product x store
+#   python elasticity.py --window 90 --out rolling_elasticity.csv
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, "../milestone-1")
+from data_loader import load_dataset
+
+OUTPUT_PATH = "elasticity_table.csv"
+
+LEVELS = {
+    "product": ["Product ID"],
+    "product_store": ["Product ID", "Store ID"]
+}
+
+# Fewer observations than this (or no price variation) give no estimate
+MIN_OBS = 10
+
+# An estimate is only used when its slope is this many standard errors
+# away from 0 and the fit explains at least this share of the variance
+MIN_T_STAT = 2.0
+MIN_R2 = 0.01
+
+RESULT_COLUMNS = ["elasticity", "intercept", "r2", "std_err", "n_obs"]
+
+
+# ------------------------------------------------------------
+# Closed-form least squares from per-group sums
+# ------------------------------------------------------------
+def ols_from_sums(n, sx, sy, sxx, sxy, syy, min_obs=MIN_OBS):
+    """
+    Slope / intercept / R² / slope standard error for every group at once.
+
+    All arguments are arrays with one entry per group; x and y may be
+    shifted by any constant (the slope does not change, the intercept is
+    in the shifted units). Groups without a valid fit get NaN.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_x, mean_y = sx / n, sy / n
+        cxx = sxx - sx * mean_x
+        cxy = sxy - sx * mean_y
+        cyy = syy - sy * mean_y
+
+        slope = cxy / cxx
+        intercept = mean_y - slope * mean_x
+        sse = np.maximum(cyy - slope * cxy, 0.0)
+        r2 = np.where(cyy > 0, 1.0 - sse / cyy, np.nan)
+        std_err = np.sqrt(sse / (n - 2) / cxx)
+
+    # A price that (numerically) never changes identifies no slope
+    valid = (n >= max(min_obs, 3)) & (cxx > 1e-12 * np.maximum(sxx, 1.0))
+    nan = np.full(len(n), np.nan)
+    return {
+        "elasticity": np.where(valid, slope, nan),
+        "intercept": np.where(valid, intercept, nan),
+        "r2": np.where(valid, r2, nan),
+        "std_err": np.where(valid, std_err, nan),
+        "n_obs": n.astype(np.int64)
+    }
+
+
+def column_names(names):
+    """Dataset column name -> name in the caller's frame (e.g. data_loader.SHORT_NAMES)."""
+    names = names or {}
+    return lambda column: names.get(column, column)
+
+
+def log_inputs(df, col):
+    """(usable row mask, log price, log units) for the rows with a logarithm."""
+    price = df[col("Price")].to_numpy(dtype=np.float64)
+    units = df[col("Units Sold")].to_numpy(dtype=np.float64)
+    usable = (price > 0) & (units > 0)
+    return usable, np.log(price[usable]), np.log(units[usable])
+
+
+def group_codes(df, keys):
+    """Group number of every row (-1 for missing keys) and the key table, sorted by key."""
+    grouper = df.groupby(keys, sort=True, observed=True)
+    codes = grouper.ngroup().to_numpy()
+    return codes, grouper.size().index.to_frame(index=False)
+
+
+# ------------------------------------------------------------
+# Fits
+# ------------------------------------------------------------
+def fit_elasticities(df, level="product", min_obs=MIN_OBS, names=None):
+    """
+    One row per group: keys, elasticity, intercept, r2, std_err, n_obs.
+    ``names`` renames the dataset columns the fit reads (keys keep the
+    caller's names in the table).
+    """
+    col = column_names(names)
+    codes, table = group_codes(df, [col(key) for key in LEVELS[level]])
+    usable, x, y = log_inputs(df, col)
+    codes = codes[usable]
+    x, y = x[codes >= 0], y[codes >= 0]
+    codes = codes[codes >= 0]
+
+    # Centre each group on its own means first: the sums of squares are
+    # then taken around the mean, without cancellation
+    n_groups = len(table)
+    n = np.bincount(codes, minlength=n_groups).astype(np.float64)
+    with np.errstate(invalid="ignore"):
+        mean_x = np.bincount(codes, x, n_groups) / n
+        mean_y = np.bincount(codes, y, n_groups) / n
+    xc = x - mean_x[codes]
+    yc = y - mean_y[codes]
+    zeros = np.zeros(n_groups)
+    fit = ols_from_sums(
+        n, zeros, zeros,
+        np.bincount(codes, xc * xc, n_groups),
+        np.bincount(codes, xc * yc, n_groups),
+        np.bincount(codes, yc * yc, n_groups),
+        min_obs
+    )
+    fit["intercept"] = mean_y - fit["elasticity"] * mean_x
+
+    for column in RESULT_COLUMNS:
+        table[column] = fit[column]
+    return table
+
+
+def fit_rolling(df, level="product", window_days=90, min_obs=MIN_OBS, names=None):
+    """
+    One row per (group, date): the fit on that group's rows dated within
+    the ``window_days`` days ending at the date (inclusive).
+    """
+    col = column_names(names)
+    codes, table = group_codes(df, [col(key) for key in LEVELS[level]])
+    usable, x, y = log_inputs(df, col)
+    date_col = col("Date")
+    days = df[date_col].to_numpy(dtype="datetime64[D]")[usable]
+    codes = codes[usable]
+    keep = (codes >= 0) & ~np.isnat(days)
+    codes, x, y = codes[keep], x[keep], y[keep]
+    days = days[keep].astype(np.int64)
+
+    # Rows sorted by (group, day); a window is a contiguous slice
+    span = int(days.max() - days.min()) + window_days + 1 if len(days) else 1
+    row_key = codes.astype(np.int64) * span + (days - (days.min() if len(days) else 0))
+    order = np.argsort(row_key, kind="stable")
+    row_key, codes, days = row_key[order], codes[order], days[order]
+
+    # Shifting by the overall means keeps the prefix sums well conditioned
+    shift_x, shift_y = (x.mean(), y.mean()) if len(x) else (0.0, 0.0)
+    x, y = x[order] - shift_x, y[order] - shift_y
+    prefix = np.zeros((6, len(x) + 1))
+    for i, values in enumerate((np.ones_like(x), x, y, x * x, x * y, y * y)):
+        np.cumsum(values, out=prefix[i, 1:])
+
+    # One window per (group, day): it ends after the last row of that day
+    ends = np.flatnonzero(np.append(row_key[1:] != row_key[:-1], True)) + 1
+    starts = np.searchsorted(row_key, row_key[ends - 1] - window_days + 1, side="left")
+    sums = prefix[:, ends] - prefix[:, starts]
+    fit = ols_from_sums(*sums, min_obs)
+    # Intercept back in unshifted log units
+    fit["intercept"] = fit["intercept"] + shift_y - fit["elasticity"] * shift_x
+
+    out = table.iloc[codes[ends - 1]].reset_index(drop=True)
+    out[date_col] = days[ends - 1].astype("datetime64[D]").astype("datetime64[ns]")
+    for column in RESULT_COLUMNS:
+        out[column] = fit[column]
+    return out
+
+
+def key_columns(table):
+    return [col for col in table.columns
+            if col not in RESULT_COLUMNS and not pd.api.types.is_datetime64_any_dtype(table[col])]
+
+
+def latest(rolling):
+    """The most recent window of every group in a fit_rolling() table."""
+    keys = key_columns(rolling)
+    date_col = [col for col in rolling.columns if col not in keys + RESULT_COLUMNS][0]
+    return rolling.sort_values(date_col, kind="mergesort").groupby(keys, observed=True).tail(1) \
+        .sort_values(keys, kind="mergesort").drop(columns=date_col).reset_index(drop=True)
+
+
+# ------------------------------------------------------------
+# Consumers
+# ------------------------------------------------------------
+def significant(table, min_t=MIN_T_STAT, min_r2=MIN_R2, upper=0.0):
+    """
+    True for the estimates worth using: |elasticity| / std_err >= min_t,
+    r2 >= min_r2 and elasticity <= upper (a positive own-price elasticity
+    in this data is estimation noise, not demand rising with price).
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_stat = np.abs(table["elasticity"]) / table["std_err"]
+    return ((t_stat >= min_t) & (table["r2"] >= min_r2) & (table["elasticity"] <= upper)).to_numpy()
+
+
+def row_elasticities(table, df, fallback, min_t=MIN_T_STAT, min_r2=MIN_R2, upper=0.0):
+    """
+    Elasticity for every row of ``df`` from a fitted (or latest()) table
+    whose key columns are named as in ``df``.
+
+    Groups without a significant() estimate take ``fallback`` (a scalar
+    or an array per row).
+    """
+    keys = key_columns(table)
+    usable = table[keys].assign(
+        elasticity=np.where(significant(table, min_t, min_r2, upper), table["elasticity"], np.nan)
+    )
+    matched = df[keys].merge(usable, how="left", on=keys)["elasticity"].to_numpy(dtype=np.float64)
+    fallback = np.broadcast_to(np.asarray(fallback, dtype=np.float64), matched.shape)
+    return np.where(np.isnan(matched), fallback, matched)
+
+
+# ------------------------------------------------------------
+# Main
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit per-product price elasticities")
+    parser.add_argument("--input", default="../milestone-1/combined_dataset.csv")
+    parser.add_argument("--level", choices=sorted(LEVELS), default="product")
+    parser.add_argument("--window", type=int, default=0,
+                        help="Trailing window in days (0: one fit on all rows)")
+    parser.add_argument("--min-obs", type=int, default=MIN_OBS)
+    parser.add_argument("--out", default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    df = load_dataset(args.input, measure_dtype="float64")
+    if args.window > 0:
+        table = fit_rolling(df, args.level, args.window, args.min_obs)
+    else:
+        table = fit_elasticities(df, args.level, args.min_obs)
+
+    table.to_csv(args.out, index=False)
+    print(f"Elasticity table saved at: {args.out} ({len(table)} rows)")
+    print(table.head(20))
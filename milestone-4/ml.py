@@ -1,12 +1,19 @@
+import sys
+
 import pandas as pd
 
-# Load dataset
-df = pd.read_csv("../milestone-1/combined_dataset.csv")
+sys.path.insert(0, "../milestone-1")
+from data_loader import load_dataset
+from elasticity import fit_elasticities, row_elasticities, significant
+from pricing_rules import CALENDAR_RULES, STOCK_TIER_RULES, TIME_INVENTORY_RULES, compile_rules
+
+# Load dataset (Date arrives parsed; prices stay float64 so the printed
+# price tables show the CSV values exactly)
+df = load_dataset("../milestone-1/combined_dataset.csv", measure_dtype="float64")
 
 #------------------------------------------------------------
-# STEP 0: Convert Date Columns & Extract Features
+# STEP 0: Extract Date Features
 #------------------------------------------------------------
-df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
 
 df['day_of_week'] = df['Date'].dt.dayofweek
 df['month'] = df['Date'].dt.month
@@ -20,17 +27,11 @@ print(df[['Date', 'day_of_week', 'is_weekend', 'month', 'day']].head(15))
 #------------------------------------------------------------
 # STEP 1: TIME-BASED PRICING FACTORS
 #------------------------------------------------------------
-df['weekend_factor'] = df['is_weekend'].apply(lambda x: 1.10 if x == 1 else 1.0)
-df['season_factor'] = df['month'].apply(lambda x: 1.15 if x == 12 else 1.0)
-df['monthend_factor'] = df['day'].apply(lambda x: 1.05 if x >= 25 else 1.0)
-df['lowdemand_factor'] = df['month'].apply(lambda x: 0.95 if x in [2, 4] else 1.0)
-df['time_based_price'] = (
-    df['Price'] *
-    df['weekend_factor'] *
-    df['season_factor'] *
-    df['monthend_factor'] *
-    df['lowdemand_factor']
-)
+# Rule tables live in pricing_rules.py; each compiles to vectorized NumPy
+calendar_rules = compile_rules(CALENDAR_RULES)
+for name, factor in calendar_rules.factors(df).items():
+    df[f'{name}_factor'] = factor
+df['time_based_price'] = calendar_rules.apply(df['Price'], df)
 
 print("\n========== STEP 1: Time-Based Pricing Factors ==========")
 print(df[['Date', 'Price', 'weekend_factor', 'season_factor', 'monthend_factor', 'lowdemand_factor', 'time_based_price']].head(15))
@@ -39,19 +40,13 @@ print(df[['Date', 'Price', 'weekend_factor', 'season_factor', 'monthend_factor',
 #------------------------------------------------------------
 # STEP 2: INVENTORY-BASED PRICING FACTORS (Adjusted)
 #------------------------------------------------------------
-df['inventory_factor'] = 1.0
-
-# LOW STOCK (≤2000) → +10%
-df.loc[df['Stock Level'] <= 2000, 'inventory_factor'] *= 1.10
-
-# HIGH STOCK (3500–4500) → -10%
-df.loc[(df['Stock Level'] > 3500) & (df['Stock Level'] <= 4500), 'inventory_factor'] *= 0.90
-
+# LOW STOCK (≤2000) → +10%, HIGH STOCK (3500–4500) → -10%,
 # OVERSTOCK (>4500) → -20%
-df.loc[df['Stock Level'] > 4500, 'inventory_factor'] *= 0.80
+stock_rules = compile_rules(STOCK_TIER_RULES)
+df['inventory_factor'] = stock_rules.factors(df)['inventory']
 
 # 🔹 Price after inventory adjustment
-df['inventory_based_price'] = df['Price'] * df['inventory_factor']
+df['inventory_based_price'] = stock_rules.apply(df['Price'], df)
 
 print("\n========== STEP 2: Inventory-Based Pricing (Price Impact) ==========")
 
@@ -79,14 +74,7 @@ print(df[df['Stock Level'] > 4500][
 #------------------------------------------------------------
 # STEP 3: FINAL RULE-BASED PRICE
 #------------------------------------------------------------
-df['rule_price'] = (
-    df['Price'] *
-    df['weekend_factor'] *
-    df['season_factor'] *
-    df['monthend_factor'] *
-    df['lowdemand_factor'] *
-    df['inventory_factor']
-)
+df['rule_price'] = compile_rules(TIME_INVENTORY_RULES).apply(df['Price'], df)
 
 print("\n========== STEP 3: FINAL RULE-BASED PRICE (Time + Inventory Effects) ==========")
 print(df[['Date', 'Price', 'Stock Level', 'rule_price']].head(20))
@@ -133,3 +121,28 @@ if total_lift > 0:
     print("\n🎉 Positive Revenue Lift → Rule-based engine IMPROVED revenue!")
 else:
     print("\n⚠️ Negative Revenue Lift → Rule-based engine REDUCED revenue.")
+
+
+#-------------------------------------------------------
+# STEP 6: ELASTICITY-ADJUSTED REVENUE
+#-------------------------------------------------------
+# Step 4 keeps units sold fixed at the new price. With per-product
+# elasticities from elasticity.py, demand responds to the price change:
+#   units_at_rule_price = units * (rule_price / price) ** elasticity
+
+print("\n========== STEP 6: Elasticity-Adjusted Revenue ==========")
+
+elasticity_table = fit_elasticities(df, "product")
+elasticity_table['used'] = significant(elasticity_table)
+print(elasticity_table[['Product ID', 'elasticity', 'r2', 'std_err', 'n_obs', 'used']].to_string(index=False))
+elasticity_table = elasticity_table.drop(columns='used')
+
+# Products without a significant fit (see elasticity.significant) keep
+# their units unchanged
+df['elasticity'] = row_elasticities(elasticity_table, df, fallback=0.0)
+df['rule_units'] = df['Units Sold'] * (df['rule_price'] / df['Price']) ** df['elasticity']
+df['rule_revenue_adjusted'] = df['rule_price'] * df['rule_units']
+
+total_adjusted = df['rule_revenue_adjusted'].sum()
+print(f"\nTotal Rule-Based Revenue (elasticity-adjusted): {total_adjusted:,.2f}")
+print(f"Revenue Lift (elasticity-adjusted): {total_adjusted - total_static:,.2f}")
@@ -0,0 +1,259 @@
+# ============================================================
+# PRICING RULE ENGINE (declarative rule tables -> vectorized NumPy)
+# ============================================================
+#
+# A rule table is a list of plain dicts (so it can also live in a JSON
+# file), applied in order to a base price:
+#
+#   {"name": "weekend", "when": [["is_weekend", "==", 1]], "factor": 1.10}
+#       multiply the price by factor where every condition holds
+#
+#   {"name": "inventory", "tiers": [{"when": [...], "factor": 1.10}, ...],
+#    "default": 1.0}
+#       first matching tier wins (np.select); other rows get default
+#
+#   {"name": "overstock", "when": [...], "set_factor": 0.85}
+#       override: the price becomes base price * set_factor, discarding
+#       every factor applied before it
+#
+#   {"name": "band", "floor": 0.90, "cap": 1.40}
+#       clip the price to [floor, cap] x base price (either may be omitted)
+#
+# A condition is [feature, op, value] with op one of
+# == != < <= > >= in not_in between (between: low <= x <= high).
+#
+# compile_rules() checks a table once and returns a PricingRules object
+# whose apply() runs it over whole arrays: every rule is one or two NumPy
+# operations, whether the inputs hold millions of backtest rows or the
+# scalars of a single API request.
+#
+# Usage:
+#   rules = compile_rules(INVENTORY_RULES)
+#   rule_price = rules.apply(df['Price'], df)          # any mapping of arrays
+#   rules.factors(df)                                  # per-rule factors, for reports
+
+import json
+
+import numpy as np
+
+OPERATORS = {
+    "==": np.equal,
+    "!=": np.not_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "in": lambda x, values: np.isin(x, values),
+    "not_in": lambda x, values: ~np.isin(x, values),
+    "between": lambda x, bounds: (x >= bounds[0]) & (x <= bounds[1])
+}
+
+
+# ------------------------------------------------------------
+# Rule tables
+# ------------------------------------------------------------
+# Every table is built by a function of its numbers, so a backtest can
+# pass arrays of shape (configurations, 1) instead of scalars; the
+# compiled rules then price every configuration in one broadcast pass.
+
+# milestone-4 rule-based pricing: calendar effects, then stock tiers
+def calendar_rules(weekend=1.10, season=1.15, monthend=1.05, lowdemand=0.95):
+    return [
+        {"name": "weekend", "when": [["is_weekend", "==", 1]], "factor": weekend},
+        {"name": "season", "when": [["month", "==", 12]], "factor": season},
+        {"name": "monthend", "when": [["day", ">=", 25]], "factor": monthend},
+        {"name": "lowdemand", "when": [["month", "in", [2, 4]]], "factor": lowdemand}
+    ]
+
+
+def stock_tier_rules(low_stock=2000, high_stock=3500, overstock=4500,
+                     low_factor=1.10, high_factor=0.90, over_factor=0.80):
+    return [
+        {"name": "inventory", "default": 1.0, "tiers": [
+            {"when": [["Stock Level", "<=", low_stock]], "factor": low_factor},
+            {"when": [["Stock Level", ">", high_stock], ["Stock Level", "<=", overstock]],
+             "factor": high_factor},
+            {"when": [["Stock Level", ">", overstock]], "factor": over_factor}
+        ]}
+    ]
+
+
+def time_inventory_rules(weekend=1.10, season=1.15, monthend=1.05, lowdemand=0.95,
+                         low_stock=2000, high_stock=3500, overstock=4500,
+                         low_factor=1.10, high_factor=0.90, over_factor=0.80):
+    return (calendar_rules(weekend, season, monthend, lowdemand)
+            + stock_tier_rules(low_stock, high_stock, overstock, low_factor, high_factor, over_factor))
+
+
+# milestone-5 inventory rule: stock tiers, weak calendar effects, and
+# high stock may never raise the price
+def inventory_rules(low_stock=250, high_stock=500, low_factor=1.20, high_factor=0.85,
+                    weekend=1.05, season=1.10):
+    return [
+        {"name": "inventory", "default": 1.0, "tiers": [
+            {"when": [["Stock Level", "<", low_stock]], "factor": low_factor},
+            {"when": [["Stock Level", ">=", low_stock], ["Stock Level", "<=", high_stock]],
+             "factor": 1.00},
+            {"when": [["Stock Level", ">", high_stock]], "factor": high_factor}
+        ]},
+        {"name": "weekend", "when": [["day_of_week", "in", [5, 6]]], "factor": weekend},
+        {"name": "season", "when": [["month", "in", [10, 11, 12]]], "factor": season},
+        {"name": "high_stock_safety", "when": [["Stock Level", ">", high_stock]], "set_factor": high_factor}
+    ]
+
+
+# API: nudge the price by the model's predicted demand
+def demand_rules(high_demand=200, low_demand=50, up=1.05, down=0.95):
+    return [
+        {"name": "demand", "default": 1.0, "tiers": [
+            {"when": [["predicted_demand", ">", high_demand]], "factor": up},
+            {"when": [["predicted_demand", "<", low_demand]], "factor": down}
+        ]}
+    ]
+
+
+def demand_quantile_rules(high_q, low_q, up=1.05, down=0.95, floor=0.90, cap=1.40):
+    """milestone-5 ML pricing: ``up`` at or above the high demand quantile, ``down`` at or below the low one."""
+    return [
+        {"name": "high_demand", "when": [["predicted_demand", ">=", high_q]], "factor": up},
+        {"name": "low_demand", "when": [["predicted_demand", "<=", low_q]], "factor": down},
+        {"name": "band", "floor": floor, "cap": cap}
+    ]
+
+
+CALENDAR_RULES = calendar_rules()
+STOCK_TIER_RULES = stock_tier_rules()
+TIME_INVENTORY_RULES = time_inventory_rules()
+INVENTORY_RULES = inventory_rules()
+DEMAND_RULES = demand_rules()
+
+
+def load_rules(path):
+    """A rule table from a JSON file (a list of rules as above)."""
+    with open(path) as handle:
+        return json.load(handle)
+
+
+# ------------------------------------------------------------
+# Compilation
+# ------------------------------------------------------------
+def _rule_kind(rule):
+    if "tiers" in rule:
+        return "tiers"
+    if "set_factor" in rule:
+        return "set_factor"
+    if "factor" in rule:
+        return "factor"
+    if "floor" in rule or "cap" in rule:
+        return "band"
+    raise ValueError(f"Rule {rule.get('name')!r} has none of: factor, tiers, set_factor, floor/cap")
+
+
+def _number(value):
+    """A float, or a float64 array when a table is parameterized with arrays."""
+    return float(value) if np.ndim(value) == 0 else np.asarray(value, dtype=np.float64)
+
+
+def _compile_conditions(conditions, rule_name):
+    """[(feature, numpy op, value)], validated once."""
+    compiled = []
+    for condition in conditions:
+        if len(condition) != 3:
+            raise ValueError(f"Rule {rule_name!r}: condition {condition!r} is not [feature, op, value]")
+        feature, op, value = condition
+        if op not in OPERATORS:
+            raise ValueError(f"Rule {rule_name!r}: unknown operator {op!r}")
+        if op == "between" and len(value) != 2:
+            raise ValueError(f"Rule {rule_name!r}: 'between' needs [low, high]")
+        if op == "between":
+            value = [_number(bound) for bound in value]
+        elif op in ("in", "not_in"):
+            value = np.asarray(value)
+        compiled.append((feature, OPERATORS[op], value))
+    return compiled
+
+
+class PricingRules:
+    """A compiled rule table; see compile_rules()."""
+
+    def __init__(self, steps, features):
+        self.steps = steps
+        self.features = features
+
+    def _mask(self, conditions, inputs):
+        mask = True
+        for feature, op, value in conditions:
+            mask = mask & op(inputs[feature], value)
+        return mask
+
+    def _factor(self, step, inputs):
+        kind, name, spec = step
+        if kind == "factor":
+            conditions, factor = spec
+            return np.where(self._mask(conditions, inputs), factor, 1.0)
+        tiers, factors, default = spec
+        return np.select([self._mask(conditions, inputs) for conditions in tiers], factors, default)
+
+    def _inputs(self, features):
+        missing = [feature for feature in self.features if feature not in features]
+        if missing:
+            raise KeyError(f"Pricing rules need feature(s): {', '.join(missing)}")
+        return {feature: np.asarray(features[feature]) for feature in self.features}
+
+    def apply(self, price, features):
+        """
+        Rule price for every row. ``price`` and the arrays in ``features``
+        (any mapping: dict, DataFrame) broadcast together; scalars give a
+        0-d result.
+        """
+        inputs = self._inputs(features)
+        base = np.asarray(price, dtype=np.float64)
+        out = base
+        for step in self.steps:
+            kind, name, spec = step
+            if kind == "set_factor":
+                conditions, factor = spec
+                out = np.where(self._mask(conditions, inputs), base * factor, out)
+            elif kind == "band":
+                floor, cap = spec
+                out = np.clip(out, None if floor is None else base * floor,
+                              None if cap is None else base * cap)
+            else:
+                out = out * self._factor(step, inputs)
+        return out
+
+    def factors(self, features):
+        """Factor of every factor / tier rule by name (overrides and bands are not factors)."""
+        inputs = self._inputs(features)
+        return {
+            step[1]: self._factor(step, inputs)
+            for step in self.steps if step[0] in ("factor", "tiers")
+        }
+
+
+def compile_rules(rules):
+    """Validate a rule table and turn it into a PricingRules."""
+    steps, features = [], []
+    for i, rule in enumerate(rules):
+        name = rule.get("name", f"rule_{i}")
+        kind = _rule_kind(rule)
+        if kind == "tiers":
+            tiers = [_compile_conditions(tier["when"], name) for tier in rule["tiers"]]
+            spec = (tiers, [_number(tier["factor"]) for tier in rule["tiers"]],
+                    _number(rule.get("default", 1.0)))
+            conditions = [condition for tier in tiers for condition in tier]
+        elif kind == "band":
+            floor, cap = rule.get("floor"), rule.get("cap")
+            floor = None if floor is None else _number(floor)
+            cap = None if cap is None else _number(cap)
+            if floor is not None and cap is not None and np.any(floor > cap):
+                raise ValueError(f"Rule {name!r}: floor is above cap")
+            spec, conditions = (floor, cap), []
+        else:
+            conditions = _compile_conditions(rule.get("when", []), name)
+            spec = (conditions, _number(rule[kind]))
+        for feature, _, _ in conditions:
+            if feature not in features:
+                features.append(feature)
+        steps.append((kind, name, spec))
+    return PricingRules(steps, features)
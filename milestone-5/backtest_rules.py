@@ -0,0 +1,264 @@
+# ============================================================
+# PRICING RULE BACKTEST (scenario grid over the test window)
+# ============================================================
+#
+# Scores a grid of pricing-rule parameters (stock tier thresholds, tier
+# and calendar factors, the ML demand quantiles and multipliers) on the
+# test window of model.py (last 20% of the rows by date), without
+# editing or rerunning the pipeline. For every configuration:
+#
+#   static revenue   Price x Units Sold
+#   rule revenue     rule price (milestone-4/pricing_rules.py) x Units Sold
+#   ML revenue       demand-quantile price from the deployed model's
+#                    predictions x Units Sold
+#
+# and the lifts over static, ranked. As in model.py, units sold do not
+# react to the price.
+#
+# Every rule prices a row as Price x a factor that depends only on the
+# rule's inputs, so rows with the same inputs are collapsed first into one
+# weight (their summed Price x Units Sold). The rule tables are then built
+# with (configurations x 1) parameter arrays, and the compiled rules
+# evaluate a whole chunk of configurations x rows in one broadcast pass;
+# a matrix product with the weights gives the revenues. Chunks are sized
+# to --memory-mb. Rule and ML parameters are evaluated on their own
+# distinct combinations and joined back onto the grid.
+#
+# Usage (from milestone-5; needs best_pricing_model.pkl from model.py):
+#   python backtest_rules.py                           # model.py's inventory rule
+#   python backtest_rules.py --rules time_inventory    # ml.py's 2000/3500/4500 tiers
+#   python backtest_rules.py --grid my_grid.json --rank-by ml_lift
+
+import argparse
+import inspect
+import itertools
+import json
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from training_data import FEATURES_CSV, encode, load_features, read_schema, time_ordered
+
+sys.path.insert(0, "../milestone-4")
+from pricing_rules import compile_rules, demand_quantile_rules, inventory_rules, time_inventory_rules
+
+OUTPUT_PATH = "backtest_results.csv"
+
+# name -> (rule table function, its parameter grid)
+RULE_SETS = {
+    "inventory": (inventory_rules, {
+        "low_stock": [100, 250, 400],
+        "high_stock": [500, 750, 1000, 2000],
+        "low_factor": [1.05, 1.10, 1.20],
+        "high_factor": [0.85, 0.90, 0.95],
+        "weekend": [1.0, 1.05],
+        "season": [1.0, 1.10]
+    }),
+    "time_inventory": (time_inventory_rules, {
+        "low_stock": [1500, 2000, 2500],
+        "high_stock": [3000, 3500, 4000],
+        "overstock": [4500, 5000],
+        "low_factor": [1.05, 1.10],
+        "high_factor": [0.90, 0.95],
+        "over_factor": [0.80, 0.85],
+        "weekend": [1.0, 1.10],
+        "season": [1.0, 1.15]
+    })
+}
+
+# ML pricing of model.py; the quantiles are levels of the predicted demand
+ML_DEFAULTS = {
+    "ml_high_quantile": 0.75,
+    "ml_low_quantile": 0.25,
+    "ml_up": 1.05,
+    "ml_down": 0.95,
+    "ml_floor": 0.90,
+    "ml_cap": 1.40
+}
+
+ML_GRID = {
+    "ml_high_quantile": [0.75, 0.80],
+    "ml_low_quantile": [0.20, 0.25],
+    "ml_up": [1.03, 1.05, 1.08],
+    "ml_down": [0.95, 0.97]
+}
+
+MEMORY_MB = 256
+
+
+# ------------------------------------------------------------
+# Grid
+# ------------------------------------------------------------
+def rule_defaults(rules_fn):
+    return {name: param.default for name, param in inspect.signature(rules_fn).parameters.items()}
+
+
+def grid_configurations(grid, defaults):
+    """
+    Every combination of the grid's values (other parameters keep their
+    defaults) as a frame, with the current configuration as row 0.
+    """
+    unknown = sorted(set(grid) - set(defaults))
+    if unknown:
+        raise ValueError(f"Unknown parameter(s): {', '.join(unknown)}")
+    names = list(defaults)
+    values = [grid.get(name, [defaults[name]]) for name in names]
+    configs = pd.DataFrame(list(itertools.product(*values)), columns=names, dtype=np.float64)
+    current = pd.DataFrame([defaults], columns=names, dtype=np.float64)
+    configs = pd.concat([current, configs], ignore_index=True).drop_duplicates(ignore_index=True)
+    # A lower tier above a higher one would make the later tier unreachable
+    ordered = np.ones(len(configs), dtype=bool)
+    for low, high in (("low_stock", "high_stock"), ("high_stock", "overstock"),
+                      ("ml_low_quantile", "ml_high_quantile"), ("ml_floor", "ml_cap")):
+        if low in configs and high in configs:
+            ordered &= (configs[low] <= configs[high]).to_numpy()
+    return configs[ordered].reset_index(drop=True)
+
+
+# ------------------------------------------------------------
+# Broadcast evaluation
+# ------------------------------------------------------------
+def collapse_rows(features, weights):
+    """Distinct rows of the rule inputs, each with its summed weight."""
+    names = list(features)
+    matrix = np.column_stack([np.asarray(features[name], dtype=np.float64) for name in names])
+    distinct, inverse = np.unique(matrix, axis=0, return_inverse=True)
+    return {name: distinct[:, i] for i, name in enumerate(names)}, np.bincount(inverse.ravel(), weights)
+
+
+def revenue_by_config(rules_fn, params, features, weights, memory_mb=MEMORY_MB):
+    """
+    Σ weight x rule factor for every configuration. ``params`` maps the
+    keyword arguments of ``rules_fn`` to one value per configuration.
+    """
+    n_configs, n_rows = len(next(iter(params.values()))), len(weights)
+    # The compiled rules keep a few (chunk x rows) float arrays alive at once
+    chunk = max(int(memory_mb * 2 ** 20 // (4 * 8 * n_rows)), 1)
+    unit_price = np.ones(n_rows)
+    revenue = np.empty(n_configs)
+    for start in range(0, n_configs, chunk):
+        block = {name: values[start:start + chunk, None] for name, values in params.items()}
+        factors = compile_rules(rules_fn(**block)).apply(unit_price, features)
+        factors = np.broadcast_to(factors, (len(next(iter(block.values()))), n_rows))
+        revenue[start:start + chunk] = factors @ weights
+    return revenue
+
+
+def evaluate(configs, columns, rules_fn, features, weights, memory_mb=MEMORY_MB):
+    """Revenue of every configuration, computed once per distinct combination of ``columns``."""
+    distinct, inverse = np.unique(configs[list(columns)].to_numpy(), axis=0, return_inverse=True)
+    params = {arg: distinct[:, i] for i, arg in enumerate(columns.values())}
+    return revenue_by_config(rules_fn, params, features, weights, memory_mb)[inverse.ravel()]
+
+
+def ml_rules(predicted_demand):
+    """The demand-quantile rule table with quantile levels turned into demand thresholds."""
+    def rules_fn(high_level, low_level, up, down, floor, cap):
+        high_q = np.quantile(predicted_demand, high_level.ravel()).reshape(high_level.shape)
+        low_q = np.quantile(predicted_demand, low_level.ravel()).reshape(low_level.shape)
+        return demand_quantile_rules(high_q, low_q, up, down, floor, cap)
+    return rules_fn
+
+
+# ------------------------------------------------------------
+# Test window
+# ------------------------------------------------------------
+def test_window(features_csv, model_path):
+    """model.py's test rows and the deployed model's predicted demand."""
+    if not os.path.exists(model_path):
+        raise SystemExit(f"No model at {model_path}: train one with model.py first")
+    model = joblib.load(model_path)
+    schema = read_schema(model_path)
+
+    df = load_features(features_csv)
+    native = schema is not None and schema["encoding"] == "native_categorical"
+    df_encoded, _, _ = encode(df, native)
+    X, _ = time_ordered(df_encoded, df['Date'])
+    X_test = X.iloc[int(len(X) * 0.8):]
+    if schema is not None:
+        X_test = X_test.reindex(columns=schema["columns"], fill_value=0)
+
+    df_test = df.loc[X_test.index].copy()
+    df_test['day_of_week'] = df_test['Date'].dt.dayofweek
+    df_test['month'] = df_test['Date'].dt.month
+    df_test['day'] = df_test['Date'].dt.day
+    df_test['is_weekend'] = df_test['day_of_week'].isin([5, 6]).astype(int)
+    df_test['predicted_demand'] = model.booster_.predict(X_test)
+    return df_test
+
+
+def run_backtest(df_test, configs, rules_fn, memory_mb=MEMORY_MB):
+    """Ranked-ready table: the configurations with their revenues and lifts."""
+    weights = (df_test['Price'] * df_test['Units Sold']).to_numpy(dtype=np.float64)
+    static_revenue = weights.sum()
+
+    rule_params = list(rule_defaults(rules_fn))
+    rule_features = compile_rules(rules_fn()).features
+    features, rule_weights = collapse_rows({name: df_test[name] for name in rule_features}, weights)
+    rule_revenue = evaluate(configs, dict(zip(rule_params, rule_params)), rules_fn,
+                            features, rule_weights, memory_mb)
+
+    predicted_demand = df_test['predicted_demand'].to_numpy()
+    features, ml_weights = collapse_rows({"predicted_demand": predicted_demand}, weights)
+    ml_columns = {"ml_high_quantile": "high_level", "ml_low_quantile": "low_level", "ml_up": "up",
+                  "ml_down": "down", "ml_floor": "floor", "ml_cap": "cap"}
+    ml_revenue = evaluate(configs, ml_columns, ml_rules(predicted_demand), features, ml_weights, memory_mb)
+
+    table = configs.copy()
+    table["static_revenue"] = static_revenue
+    table["rule_revenue"] = rule_revenue
+    table["ml_revenue"] = ml_revenue
+    table["rule_lift"] = rule_revenue - static_revenue
+    table["ml_lift"] = ml_revenue - static_revenue
+    table["rule_lift_pct"] = 100 * table["rule_lift"] / static_revenue
+    table["ml_lift_pct"] = 100 * table["ml_lift"] / static_revenue
+    table.insert(0, "current", False)
+    table.loc[0, "current"] = True
+    return table
+
+
+# ------------------------------------------------------------
+# Main
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest a grid of pricing-rule parameters")
+    parser.add_argument("--features", default=FEATURES_CSV)
+    parser.add_argument("--model", default="best_pricing_model.pkl")
+    parser.add_argument("--rules", choices=sorted(RULE_SETS), default="inventory")
+    parser.add_argument("--grid", help="JSON file of {parameter: [values]} (default: the rule set's grid "
+                                       "and ML_GRID); parameters left out keep their current value")
+    parser.add_argument("--rank-by", choices=["rule_lift", "ml_lift"], default="rule_lift")
+    parser.add_argument("--memory-mb", type=float, default=MEMORY_MB,
+                        help="Approximate working memory per evaluation chunk")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--out", default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    rules_fn, rule_grid = RULE_SETS[args.rules]
+    if args.grid:
+        with open(args.grid) as handle:
+            grid = json.load(handle)
+    else:
+        grid = {**rule_grid, **ML_GRID}
+    configs = grid_configurations(grid, {**rule_defaults(rules_fn), **ML_DEFAULTS})
+
+    df_test = test_window(args.features, args.model)
+
+    started = time.perf_counter()
+    table = run_backtest(df_test, configs, rules_fn, args.memory_mb)
+    seconds = time.perf_counter() - started
+
+    current = table.iloc[0]
+    table = table.sort_values(args.rank_by, ascending=False, kind="stable")
+    table.insert(0, "rank", np.arange(1, len(table) + 1))
+    table.to_csv(args.out, index=False)
+
+    print(f"{len(configs)} configurations x {len(df_test)} test rows in {seconds:.2f}s")
+    print(f"Current rules: rule lift {current['rule_lift']:,.2f} ({current['rule_lift_pct']:.2f}%), "
+          f"ML lift {current['ml_lift']:,.2f} ({current['ml_lift_pct']:.2f}%)")
+    print(f"Backtest results saved at: {args.out}")
+    print(table.head(args.top).drop(columns=["static_revenue"]).to_string(index=False))
@@ -0,0 +1,297 @@
+# ============================================================
+# MODEL BENCHMARK (LightGBM vs XGBoost: accuracy, speed, memory)
+# ============================================================
+#
+# Trains every candidate on the same time split as model.py (first 80%
+# of the rows by date) and measures:
+#
+#   accuracy     MAE / RMSE on the last 20%
+#   training     fit wall time, peak RSS of the process, artifact size
+#   serving      single-row predict latency (p50 / p99) and batch
+#                throughput (rows/s) at several batch sizes, through the
+#                predict path serving would use (the booster directly;
+#                for LightGBM also the compiled NumPy trees of milestone-6)
+#
+# Every candidate runs in its own child process, so its peak RSS is its
+# own, and with fixed seeds and --threads the numbers are repeatable.
+# Results go to a JSON report (with the environment) and a flat CSV.
+#
+# Usage (from milestone-5):
+#   python benchmark_models.py
+#   python benchmark_models.py --models lightgbm xgboost --threads 4
+#   python benchmark_models.py --batch-sizes 1 100 10000 --out-prefix bench_big
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from training_data import FEATURES_CSV, MODEL_PARAMS, encode, load_features, time_ordered
+
+OUT_PREFIX = "model_benchmark"
+
+BATCH_SIZES = [1, 10, 100, 1000, 10000]
+
+# name -> (library, encoding)
+CANDIDATES = {
+    "lightgbm": ("lightgbm", "one_hot"),
+    "lightgbm_native": ("lightgbm", "native_categorical"),
+    "xgboost": ("xgboost", "one_hot")
+}
+
+# XGBoost with the settings of the deployed LightGBM model
+XGBOOST_PARAMS = {
+    "n_estimators": MODEL_PARAMS["n_estimators"],
+    "learning_rate": MODEL_PARAMS["learning_rate"],
+    "subsample": MODEL_PARAMS["subsample"],
+    "colsample_bytree": MODEL_PARAMS["colsample_bytree"],
+    "random_state": MODEL_PARAMS["random_state"],
+    "tree_method": "hist"
+}
+
+
+# ------------------------------------------------------------
+# Measurements
+# ------------------------------------------------------------
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux (bytes on macOS)
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+def single_row_latency(predict, X, n_rows=1000):
+    """p50 / p99 / mean latency in microseconds of predicting one row at a time."""
+    rows = X[np.arange(n_rows) % len(X)]
+    for row in rows[:50]:
+        predict(row[None, :])
+    timings = np.empty(n_rows)
+    for i, row in enumerate(rows):
+        started = time.perf_counter()
+        predict(row[None, :])
+        timings[i] = time.perf_counter() - started
+    timings *= 1e6
+    return {
+        "p50_us": round(float(np.percentile(timings, 50)), 2),
+        "p99_us": round(float(np.percentile(timings, 99)), 2),
+        "mean_us": round(float(timings.mean()), 2)
+    }
+
+
+def batch_throughput(predict, X, batch_sizes, min_seconds=0.2):
+    """Rows per second at each batch size (batches are repeated for at least ``min_seconds``)."""
+    throughput = {}
+    for size in batch_sizes:
+        batch = X[np.arange(size) % len(X)]
+        predict(batch)
+        rows, started = 0, time.perf_counter()
+        while True:
+            predict(batch)
+            rows += size
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_seconds:
+                break
+        throughput[str(size)] = round(rows / elapsed, 1)
+    return throughput
+
+
+# ------------------------------------------------------------
+# One candidate (runs in a child process)
+# ------------------------------------------------------------
+def fit_candidate(name, X_train, y_train, categorical, threads):
+    library, _ = CANDIDATES[name]
+    if library == "lightgbm":
+        from lightgbm import LGBMRegressor
+        model = LGBMRegressor(**MODEL_PARAMS, n_jobs=threads, verbose=-1)
+        model.fit(X_train, y_train, categorical_feature=categorical or "auto")
+    else:
+        from xgboost import XGBRegressor
+        model = XGBRegressor(**XGBOOST_PARAMS, n_jobs=threads)
+        model.fit(X_train, y_train)
+    return model
+
+
+def predictors(name, model):
+    """Predict functions on a float matrix, by serving path."""
+    library, _ = CANDIDATES[name]
+    if library == "xgboost":
+        booster = model.get_booster()
+        return {"booster": lambda X: booster.inplace_predict(X)}
+
+    sys.path.insert(0, "../milestone-6")
+    from compiled_forest import CompiledForest
+    compiled = CompiledForest.from_lightgbm(model)
+    booster = model.booster_
+    return {"booster": booster.predict, "compiled": compiled.predict}
+
+
+def run_candidate(name, features_csv, threads, batch_sizes):
+    import joblib
+
+    _, encoding = CANDIDATES[name]
+    df = load_features(features_csv)
+    df_encoded, categorical, _ = encode(df, encoding == "native_categorical")
+    X, y = time_ordered(df_encoded, df['Date'])
+    X = X.astype(np.float32 if encoding == "native_categorical" else np.float64)
+    split_index = int(len(X) * 0.8)
+    X_train, X_test = X.iloc[:split_index], X.iloc[split_index:]
+    y_train, y_test = y.iloc[:split_index], y.iloc[split_index:]
+    rss_before_fit = peak_rss_mb()
+
+    started = time.perf_counter()
+    model = fit_candidate(name, X_train, y_train, categorical, threads)
+    fit_seconds = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        artifact = os.path.join(tmp_dir, "model.pkl")
+        joblib.dump(model, artifact)
+        artifact_bytes = os.path.getsize(artifact)
+
+    X_test_values = X_test.to_numpy()
+    result = {
+        "model": name,
+        "encoding": encoding,
+        "features": X.shape[1],
+        "train_rows": len(X_train),
+        "test_rows": len(X_test),
+        "fit_seconds": round(fit_seconds, 3),
+        "artifact_bytes": artifact_bytes,
+        "serving": {}
+    }
+    for path, predict in predictors(name, model).items():
+        y_pred = predict(X_test_values)
+        error = y_pred - y_test.to_numpy()
+        result["serving"][path] = {
+            "mae": round(float(np.mean(np.abs(error))), 6),
+            "rmse": round(float(np.sqrt(np.mean(error ** 2))), 6),
+            "single_row": single_row_latency(predict, X_test_values),
+            "rows_per_s": batch_throughput(predict, X_test_values, batch_sizes)
+        }
+    result["mae"] = result["serving"]["booster"]["mae"]
+    result["rmse"] = result["serving"]["booster"]["rmse"]
+    result["rss_before_fit_mb"] = round(rss_before_fit, 1)
+    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return result
+
+
+# ------------------------------------------------------------
+# Driver
+# ------------------------------------------------------------
+def benchmark(models, features_csv, threads, batch_sizes):
+    """Run every candidate in a fresh interpreter; returns their results (or errors)."""
+    results = []
+    for name in models:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as handle:
+            result_path = handle.name
+        try:
+            command = [
+                sys.executable, __file__, "--worker", name, "--result", result_path,
+                "--features", features_csv, "--threads", str(threads),
+                "--batch-sizes", *map(str, batch_sizes)
+            ]
+            completed = subprocess.run(command, capture_output=True, text=True)
+            if completed.returncode != 0:
+                error = completed.stderr.strip().splitlines()[-1:] or ["failed"]
+                results.append({"model": name, "error": error[0]})
+                print(f"{name}: {error[0]}")
+                continue
+            with open(result_path) as handle:
+                results.append(json.load(handle))
+            print(f"{name}: MAE {results[-1]['mae']:.4f}, fit {results[-1]['fit_seconds']:.2f}s, "
+                  f"peak RSS {results[-1]['peak_rss_mb']:.0f} MB")
+        finally:
+            os.remove(result_path)
+    return results
+
+
+def flat_rows(results, batch_sizes):
+    """One CSV row per (model, serving path)."""
+    rows = []
+    for result in results:
+        if "error" in result:
+            rows.append({"model": result["model"], "error": result["error"]})
+            continue
+        for path, serving in result["serving"].items():
+            row = {key: result[key] for key in (
+                "model", "encoding", "features", "train_rows", "test_rows",
+                "fit_seconds", "peak_rss_mb", "artifact_bytes"
+            )}
+            row.update(
+                predict_path=path, mae=serving["mae"], rmse=serving["rmse"],
+                single_row_p50_us=serving["single_row"]["p50_us"],
+                single_row_p99_us=serving["single_row"]["p99_us"]
+            )
+            for size in batch_sizes:
+                row[f"rows_per_s_batch_{size}"] = serving["rows_per_s"][str(size)]
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def library_versions():
+    versions = {}
+    for library in ("lightgbm", "xgboost", "numpy", "pandas"):
+        try:
+            versions[library] = __import__(library).__version__
+        except ImportError:
+            versions[library] = None
+    return versions
+
+
+# ------------------------------------------------------------
+# Main
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark candidate demand models")
+    parser.add_argument("--features", default=FEATURES_CSV)
+    parser.add_argument("--models", nargs="+", choices=sorted(CANDIDATES), default=list(CANDIDATES))
+    parser.add_argument("--threads", type=int, default=1,
+                        help="Training / predict threads per model (fixed for repeatable timings)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--out-prefix", default=OUT_PREFIX, help="Writes <prefix>.json and <prefix>.csv")
+    parser.add_argument("--worker", choices=sorted(CANDIDATES), help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.result, "w") as handle:
+            json.dump(run_candidate(args.worker, args.features, args.threads, args.batch_sizes), handle)
+        sys.exit(0)
+
+    results = benchmark(args.models, args.features, args.threads, args.batch_sizes)
+
+    report = {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "threads": args.threads,
+        "libraries": library_versions(),
+        "features": args.features,
+        "split": "first 80% of rows by date / last 20%",
+        "results": results
+    }
+    with open(args.out_prefix + ".json", "w") as handle:
+        json.dump(report, handle, indent=2)
+    table = flat_rows(results, args.batch_sizes)
+    table.to_csv(args.out_prefix + ".csv", index=False)
+
+    print(f"Report written to {args.out_prefix}.json and {args.out_prefix}.csv")
+    print(table.drop(columns=[col for col in ("encoding", "train_rows", "test_rows") if col in table])
+          .to_string(index=False))
@@ -2,44 +2,63 @@
 # ML + RULE-BASED DYNAMIC PRICING (FINAL CORRECT VERSION)
 # ============================================================
 
+import argparse
+import sys
+
 import pandas as pd
 import numpy as np
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 from lightgbm import LGBMRegressor
 import joblib
 
-# ------------------------------------------------------------
-# STEP 1: LOAD CLEANED FEATURE DATASET
-# ------------------------------------------------------------
+from segments import MIN_SEGMENT_ROWS, SEGMENTATIONS, publish_segments, row_keys, train_segments
+from training_data import (
+    MODEL_PARAMS, encode, full_train_state, id_code_labels, load_features, model_schema, time_ordered,
+    write_schema, write_train_state
+)
 
-df = pd.read_csv("../milestone-3/cleaned_features.csv")
-df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+sys.path.insert(0, "../milestone-4")
+from pricing_rules import INVENTORY_RULES, compile_rules, demand_quantile_rules
+
+# Usage:
+#   python model.py                         # one-hot encoded inputs (default)
+#   python model.py --native-categorical    # LightGBM categorical splits on codes
+#   python model.py --segment-by store      # + one model per store (see segments.py)
+parser = argparse.ArgumentParser(description="Train the demand model")
+parser.add_argument("--native-categorical", action="store_true",
+                    help="Integer-coded categoricals, no one-hot columns, float32 inputs")
+parser.add_argument("--features", default="../milestone-3/cleaned_features.csv")
+parser.add_argument("--out", default="best_pricing_model.pkl")
+parser.add_argument("--segment-by", choices=sorted(SEGMENTATIONS),
+                    help="Also train one model per segment, in parallel")
+parser.add_argument("--segments-dir", default="segments")
+parser.add_argument("--buckets", type=int, default=4, help="Size buckets for --segment-by size")
+parser.add_argument("--min-segment-rows", type=int, default=MIN_SEGMENT_ROWS)
+parser.add_argument("--workers", type=int, default=None, help="Segment training processes")
+parser.add_argument("--threads", type=int, default=1, help="LightGBM threads per segment fit")
+args = parser.parse_args()
 
 # ------------------------------------------------------------
-# STEP 1.1: SAFE MISSING VALUE HANDLING
+# STEP 1: LOAD CLEANED FEATURE DATASET
+# (missing numbers are filled with 0; see training_data.py)
 # ------------------------------------------------------------
 
-numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns
-df[numeric_cols] = df[numeric_cols].fillna(0)
+df = load_features(args.features)
 
 # ------------------------------------------------------------
-# STEP 1.2: ONE-HOT ENCODING (Milestone-acceptable)
+# STEP 1.2: ENCODING
 # ------------------------------------------------------------
 
-df_encoded = pd.get_dummies(df, drop_first=True)
+df_encoded, categorical_features, category_labels = encode(df, args.native_categorical)
+category_labels = {**id_code_labels(args.features), **category_labels}
 
 # ------------------------------------------------------------
 # STEP 2: TIME-BASED TRAIN–TEST SPLIT
 # ------------------------------------------------------------
 
-df_encoded['Date'] = df['Date']
-df_encoded = df_encoded.sort_values('Date')
-df_encoded.drop(columns=['Date'], inplace=True)
+X, y = time_ordered(df_encoded, df['Date'])
 
-y = df_encoded['Units Sold']
-X = df_encoded.drop(columns=['Units Sold'])
-
-split_index = int(len(df_encoded) * 0.8)
+split_index = int(len(X) * 0.8)
 
 X_train = X.iloc[:split_index]
 X_test  = X.iloc[split_index:]
@@ -47,22 +66,56 @@ X_test  = X.iloc[split_index:]
 y_train = y.iloc[:split_index]
 y_test  = y.iloc[split_index:]
 
+# ------------------------------------------------------------
+# STEP 2.1: SEGMENT MODELS (optional)
+# Trained before the global model: the workers are forked, and a
+# process that has already run LightGBM's OpenMP threads can't fork safely
+# ------------------------------------------------------------
+
+if args.segment_by:
+    key_columns = SEGMENTATIONS[args.segment_by]
+    keys_train = row_keys(df.loc[X_train.index], key_columns, category_labels)
+    keys_test = row_keys(df.loc[X_test.index], key_columns, category_labels)
+    segment_manifest = train_segments(
+        X_train, y_train, X_test, y_test, keys_train, keys_test, args.segment_by, args.segments_dir,
+        categorical_features, category_labels, args.native_categorical, args.buckets,
+        args.min_segment_rows, args.workers, args.threads
+    )
+
 # ------------------------------------------------------------
 # STEP 3: TRAIN ML MODEL (LightGBM)
 # ------------------------------------------------------------
 
-lgbm = LGBMRegressor(
-    n_estimators=200,
-    learning_rate=0.05,
-    subsample=0.8,
-    colsample_bytree=0.8,
-    random_state=42
-)
+lgbm = LGBMRegressor(**MODEL_PARAMS)
 
-lgbm.fit(X_train, y_train)
+lgbm.fit(X_train, y_train, categorical_feature=categorical_features or 'auto')
 y_pred = lgbm.predict(X_test)
 
-joblib.dump(lgbm, "best_pricing_model.pkl")
+joblib.dump(lgbm, args.out)
+
+write_schema(
+    model_schema(lgbm, X_train.columns, categorical_features, category_labels, args.native_categorical),
+    args.out
+)
+# Where retrain.py continues boosting from
+write_train_state(full_train_state(lgbm, df.loc[X_train.index, 'Date'].max(), len(X_train)), args.out)
+
+if args.segment_by:
+    segment_manifest = publish_segments(segment_manifest, args.segments_dir, keys_test, y_test, y_pred)
+    print(f"\n========== SEGMENT MODELS ({args.segment_by}) ==========")
+    for status, entries in (("routed", segment_manifest["segments"]), ("rejected", segment_manifest["rejected"])):
+        for name, entry in entries.items():
+            if entry["mae"] is None or entry["global_mae"] is None:
+                print(f"{name:<12} train={entry['train_rows']:<7} test={entry['test_rows']:<6} "
+                      f"no test rows, {status}")
+                continue
+            print(f"{name:<12} train={entry['train_rows']:<7} test={entry['test_rows']:<6} "
+                  f"MAE segment={entry['mae']:.3f} global={entry['global_mae']:.3f}  {status}")
+    if segment_manifest["rejected"]:
+        print("Not better than the global model, served by it:", ", ".join(segment_manifest["rejected"]))
+    if segment_manifest["skipped"]:
+        print("Too small, served by the global model:", ", ".join(segment_manifest["skipped"]))
+    print(f"Segment models saved at: {args.segments_dir}")
 
 # ------------------------------------------------------------
 # STEP 4: ML-BASED PRICING
@@ -75,15 +128,10 @@ pricing_df['predicted_demand'] = y_pred
 high_q = pricing_df['predicted_demand'].quantile(0.75)
 low_q  = pricing_df['predicted_demand'].quantile(0.25)
 
-pricing_df['ml_price'] = pricing_df['Price']
-
-pricing_df.loc[pricing_df['predicted_demand'] >= high_q, 'ml_price'] *= 1.05
-pricing_df.loc[pricing_df['predicted_demand'] <= low_q, 'ml_price'] *= 0.95
-
-pricing_df['ml_price'] = pricing_df['ml_price'].clip(
-    lower=pricing_df['Price'] * 0.90,
-    upper=pricing_df['Price'] * 1.40
-)
+# +5% at or above the high quantile, -5% at or below the low one,
+# kept within 90%-140% of the current price
+ml_rules = compile_rules(demand_quantile_rules(high_q, low_q))
+pricing_df['ml_price'] = ml_rules.apply(pricing_df['Price'], pricing_df)
 
 # ------------------------------------------------------------
 # STEP 5: RULE-BASED PRICING (YOUR INVENTORY RULE)
@@ -94,41 +142,10 @@ df_test = df.iloc[X_test.index].copy()
 df_test['day_of_week'] = df_test['Date'].dt.dayofweek
 df_test['month'] = df_test['Date'].dt.month
 
-# Weekend & season (weak effects)
-df_test['weekend_factor'] = df_test['day_of_week'].isin([5, 6]).map({True: 1.05, False: 1.0})
-df_test['season_factor'] = df_test['month'].isin([10, 11, 12]).map({True: 1.10, False: 1.0})
-
-# ---------------- INVENTORY RULE (EXACTLY AS REQUESTED) ----------------
-df_test['inventory_factor'] = 1.0
-
-# Below 250 → Increase
-df_test.loc[df_test['Stock Level'] < 250, 'inventory_factor'] = 1.20
-
-# 250–500 → Same
-df_test.loc[
-    (df_test['Stock Level'] >= 250) & (df_test['Stock Level'] <= 500),
-    'inventory_factor'
-] = 1.00
-
-# Above 500 → Decrease
-df_test.loc[df_test['Stock Level'] > 500, 'inventory_factor'] = 0.85
-
-# ---------------- FINAL RULE PRICE ----------------
-df_test['rule_price'] = (
-    df_test['Price']
-    * df_test['inventory_factor']
-    * df_test['weekend_factor']
-    * df_test['season_factor']
-)
-
-# HARD SAFETY: High stock must NEVER increase price
-df_test.loc[
-    df_test['Stock Level'] > 500,
-    'rule_price'
-] = df_test.loc[
-    df_test['Stock Level'] > 500,
-    'Price'
-] * 0.85
+# ---------------- INVENTORY RULE (see pricing_rules.py) ----------------
+# Below 250 → increase, 250–500 → same, above 500 → decrease; weak
+# weekend & season effects; HARD SAFETY: high stock must NEVER increase price
+df_test['rule_price'] = compile_rules(INVENTORY_RULES).apply(df_test['Price'], df_test)
 
 # ------------------------------------------------------------
 # STEP 6: REVENUE COMPARISON
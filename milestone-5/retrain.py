@@ -0,0 +1,252 @@
+# ============================================================
+# INCREMENTAL RETRAINING (warm start from the deployed booster)
+# ============================================================
+#
+# model.py trains every tree from scratch on the full history. For a
+# daily refresh this script instead continues boosting the deployed model
+# (LightGBM init_model) with --new-trees trees fitted on the rows that
+# arrived since it was last trained, so a run costs time in proportion to
+# the new data, not the history.
+#
+# Each run:
+#   1. The newest --holdout-days days are held out.
+#   2. The candidate is trained on the days after the model's
+#      last_trained_date (from <model>.state.json) and up to the holdout.
+#   3. The candidate and the deployed model are scored (MAE) on the
+#      holdout; the candidate is published only if it is not worse (within
+#      --tolerance). Held-out days are trained on by a later run.
+#
+# A full retrain (MODEL_PARAMS, all rows before the holdout) is done instead
+# when:
+#   - there is no deployed model / training state, or --full is given
+#   - the encoded feature columns or category labels changed (the old
+#     trees cannot use columns they were not trained with)
+#   - --full-every incremental runs have happened since the last full one
+#   - the model has grown past --max-trees trees
+#   - the warm-started candidate regressed on the holdout
+#
+# Usage (from milestone-5):
+#   python retrain.py                          # daily refresh of best_pricing_model.pkl
+#   python retrain.py --full                   # retrain from scratch
+#   python retrain.py --registry ../milestone-6/models   # also publish to the API's registry
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from lightgbm import LGBMRegressor
+
+from training_data import (
+    FEATURES_CSV, MODEL_PARAMS, encode, full_train_state, id_code_labels, load_features, model_schema,
+    read_schema, read_train_state, time_ordered, write_schema, write_train_state
+)
+
+NEW_TREES = 20
+HOLDOUT_DAYS = 7
+FULL_EVERY = 14
+MAX_TREES = 600
+TOLERANCE = 0.0
+
+# Runs kept in the state file's history
+HISTORY_LENGTH = 30
+
+
+# ------------------------------------------------------------
+# Deployed model
+# ------------------------------------------------------------
+def load_deployed(model_path):
+    """(model, schema, state) of the deployed model; None for parts that are missing."""
+    model = joblib.load(model_path) if os.path.exists(model_path) else None
+    return model, read_schema(model_path), read_train_state(model_path)
+
+
+def columns_changed(X, category_labels, schema):
+    """Why the encoded data no longer matches the schema (None when it does)."""
+    added = [col for col in X.columns if col not in set(schema["columns"])]
+    if added:
+        return f"{len(added)} new feature column(s), e.g. {added[0]!r}"
+    # Category codes are only comparable when the labels are the same
+    feature_names = dict(zip(schema["columns"], schema["features"]))
+    for col, labels in category_labels.items():
+        if schema["categories"].get(feature_names.get(col)) != labels:
+            return f"category labels of {col!r} changed"
+    return None
+
+
+def align(X, schema):
+    """``X`` with exactly the schema's columns, in order (columns it lacks are 0)."""
+    return X.reindex(columns=schema["columns"], fill_value=0)
+
+
+def full_retrain_reason(args, model, schema, state, X, category_labels):
+    if args.full:
+        return "requested"
+    if model is None or schema is None or state is None:
+        return "no deployed model with a training state"
+    changed = columns_changed(X, category_labels, schema)
+    if changed:
+        return changed
+    if state["incremental_runs"] >= args.full_every:
+        return f"{state['incremental_runs']} incremental runs since the last full retrain"
+    if model.booster_.num_trees() + args.new_trees > args.max_trees:
+        return f"model would exceed {args.max_trees} trees"
+    return None
+
+
+# ------------------------------------------------------------
+# Training
+# ------------------------------------------------------------
+def warm_start(model, X, y, categorical, n_trees):
+    """The deployed model plus ``n_trees`` trees fitted on ``X`` / ``y``."""
+    params = {**MODEL_PARAMS, "n_estimators": n_trees}
+    candidate = LGBMRegressor(**params)
+    candidate.fit(X, y, init_model=model.booster_, categorical_feature=categorical or "auto")
+    return candidate
+
+
+def train_full(X, y, categorical):
+    candidate = LGBMRegressor(**MODEL_PARAMS)
+    candidate.fit(X, y, categorical_feature=categorical or "auto")
+    return candidate
+
+
+def holdout_mae(model, X, y):
+    if model is None or not len(X):
+        return None
+    return float(np.mean(np.abs(model.booster_.predict(X) - y.to_numpy())))
+
+
+def not_worse(new_mae, old_mae, tolerance):
+    return old_mae is None or new_mae is None or new_mae <= old_mae * (1 + tolerance)
+
+
+# ------------------------------------------------------------
+# Publishing
+# ------------------------------------------------------------
+def publish(model, schema, state, model_path):
+    """Write model, schema and state; the model file is replaced atomically."""
+    tmp_path = model_path + ".tmp"
+    joblib.dump(model, tmp_path)
+    write_schema(schema, model_path)
+    write_train_state(state, model_path)
+    os.replace(tmp_path, model_path)
+
+
+def publish_to_registry(model_path, registry_root, note):
+    sys.path.insert(0, "../milestone-6")
+    from model_registry import ModelRegistry
+    return ModelRegistry(registry_root).publish(model_path, activate=True, note=note)
+
+
+# ------------------------------------------------------------
+# Main
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental (warm-start) retraining of the demand model")
+    parser.add_argument("--features", default=FEATURES_CSV)
+    parser.add_argument("--model", default="best_pricing_model.pkl")
+    parser.add_argument("--native-categorical", action="store_true",
+                        help="Encoding for a full retrain (an existing model keeps its schema's)")
+    parser.add_argument("--new-trees", type=int, default=NEW_TREES)
+    parser.add_argument("--holdout-days", type=int, default=HOLDOUT_DAYS)
+    parser.add_argument("--full-every", type=int, default=FULL_EVERY)
+    parser.add_argument("--max-trees", type=int, default=MAX_TREES)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="Allowed relative holdout MAE increase over the deployed model")
+    parser.add_argument("--full", action="store_true", help="Force a full retrain")
+    parser.add_argument("--registry", help="Also publish (and activate) in this model registry")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    model, schema, state = load_deployed(args.model)
+    native = schema["encoding"] == "native_categorical" if schema else args.native_categorical
+
+    df = load_features(args.features)
+    df_encoded, categorical, category_labels = encode(df, native)
+    category_labels = {**id_code_labels(args.features), **category_labels}
+    X, y = time_ordered(df_encoded, df['Date'])
+    dates = df['Date'].loc[X.index]
+
+    # Newest days are held out; undated rows are never used here
+    holdout_start = dates.max().normalize() - pd.Timedelta(days=args.holdout_days - 1)
+    holdout = (dates >= holdout_start).to_numpy()
+    trainable = (dates < holdout_start).to_numpy()
+
+    reason = full_retrain_reason(args, model, schema, state, X, category_labels)
+    # The deployed model is scored on its own columns, even if they changed
+    old_mae = holdout_mae(model, align(X, schema)[holdout], y[holdout]) if schema else None
+
+    mode, candidate = None, None
+    if reason is None:
+        last_trained = pd.Timestamp(state["last_trained_date"])
+        new_rows = trainable & (dates > last_trained).to_numpy()
+        if not new_rows.any():
+            print(f"No new rows after {state['last_trained_date']} outside the "
+                  f"{args.holdout_days}-day holdout: nothing to do")
+            sys.exit(0)
+
+        X_aligned = align(X, schema)
+        candidate = warm_start(model, X_aligned[new_rows], y[new_rows], categorical, args.new_trees)
+        new_mae = holdout_mae(candidate, X_aligned[holdout], y[holdout])
+        mode, rows = "incremental", int(new_rows.sum())
+        print(f"Warm start: +{args.new_trees} trees on {rows} new rows; "
+              f"holdout MAE {new_mae:.4f} vs deployed {old_mae:.4f}")
+        if not not_worse(new_mae, old_mae, args.tolerance):
+            reason = "warm-started model regressed on the holdout"
+
+    if reason is not None:
+        print(f"Full retrain: {reason}")
+        candidate = train_full(X[trainable], y[trainable], categorical)
+        new_mae = holdout_mae(candidate, X[holdout], y[holdout])
+        mode, rows = "full", int(trainable.sum())
+        print(f"Full retrain on {rows} rows; holdout MAE {new_mae:.4f}"
+              + (f" vs deployed {old_mae:.4f}" if old_mae is not None else ""))
+
+    seconds = time.perf_counter() - started
+    accepted = not_worse(new_mae, old_mae, args.tolerance)
+    last_trained_date = dates[trainable].max()
+
+    if mode == "full":
+        new_state = full_train_state(candidate, last_trained_date, rows)
+        new_state["history"] = (state or {}).get("history", [])
+    else:
+        new_state = dict(
+            state,
+            last_trained_date=str(last_trained_date.date()),
+            rows_trained=state["rows_trained"] + rows,
+            trees=int(candidate.booster_.num_trees()),
+            incremental_runs=state["incremental_runs"] + 1
+        )
+    run = {
+        "at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "mode": mode,
+        "reason": reason,
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "holdout_mae_deployed": old_mae,
+        "holdout_mae_candidate": new_mae,
+        "published": accepted
+    }
+
+    if not accepted:
+        # Keep serving the old model; only the run is recorded
+        state = state or {}
+        state["history"] = (state.get("history", []) + [run])[-HISTORY_LENGTH:]
+        write_train_state(state, args.model)
+        print(f"Not published: holdout MAE {new_mae:.4f} is worse than the deployed {old_mae:.4f}")
+        sys.exit(1)
+
+    new_state["history"] = (new_state["history"] + [run])[-HISTORY_LENGTH:]
+    publish(candidate, model_schema(candidate, X.columns if mode == "full" else schema["columns"],
+                                    categorical, category_labels, native), new_state, args.model)
+    print(f"Published {mode} model ({new_state['trees']} trees, trained through "
+          f"{new_state['last_trained_date']}) at: {args.model} in {seconds:.1f}s")
+
+    if args.registry:
+        version = publish_to_registry(args.model, args.registry, f"{mode} retrain, {rows} rows")
+        print(f"Registry version {version} is now active")
@@ -0,0 +1,216 @@
+# ============================================================
+# SEGMENT MODELS (one LightGBM model per store / product / size bucket)
+# ============================================================
+#
+# Demand levels differ a lot between SKUs, so besides the global model
+# model.py can train a family of segment models (--segment-by):
+#
+#   store     one model per Store ID
+#   product   one model per Product ID (the data has no product category
+#             column, so the product itself is the group)
+#   size      SKUs (Product ID x Store ID) bucketed by their average daily
+#             units into --buckets quantile buckets
+#
+# Segments are trained in parallel by forked worker processes that share
+# the encoded training matrix copy-on-write; each fit is capped at
+# --threads LightGBM threads. Segments with fewer than --min-segment-rows
+# training rows get no model, and a segment model is only routed to when
+# its test MAE beats the global model's on the same rows; every other row
+# is scored by the global model.
+#
+# Layout (read by milestone-6/segment_router.py):
+#   segments/
+#     segments.json           segmentation, key -> segment table, metrics
+#     store_S001.pkl          one model per segment (joblib)
+#     store_S001.schema.json  its input schema (see training_data.py)
+
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+import shutil
+
+import joblib
+import numpy as np
+
+from training_data import MODEL_PARAMS, model_schema, write_schema
+
+MANIFEST_NAME = "segments.json"
+
+# Columns that identify a row's segment (integer codes in the feature table)
+SEGMENTATIONS = {
+    "store": ["Store ID"],
+    "product": ["Product ID"],
+    "size": ["Product ID", "Store ID"]
+}
+
+MIN_SEGMENT_ROWS = 200
+
+
+# ------------------------------------------------------------
+# Segment assignment
+# ------------------------------------------------------------
+def row_keys(df, key_columns, id_labels):
+    """
+    Segment key of every row: the key columns' IDs (their codes mapped
+    back through ``id_labels``) joined by '|', as the API receives them.
+    """
+    keys = None
+    for col in key_columns:
+        if col not in id_labels:
+            raise ValueError(f"No labels for the {col!r} codes; rebuild the features with milestone-3/feauture.py")
+        codes = df[col].to_numpy().astype(np.int64)
+        # Code -1 (missing ID) gets an empty key part
+        labels = np.append(np.asarray(id_labels[col], dtype=object), "")
+        part = labels[np.where(codes >= 0, codes, -1)].astype(str)
+        keys = part if keys is None else np.char.add(np.char.add(keys, "|"), part)
+    return keys
+
+
+def assign_segments(keys, units, segment_by, n_buckets=4):
+    """Key -> segment name, from the training rows' keys (and units for 'size')."""
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    if segment_by != "size":
+        return {key: f"{segment_by}_{key}" for key in unique_keys.tolist()}
+
+    mean_units = np.bincount(inverse, units) / np.bincount(inverse)
+    # Inner quantile edges; bucket 0 holds the slowest sellers
+    edges = np.quantile(mean_units, np.linspace(0, 1, n_buckets + 1)[1:-1])
+    buckets = np.searchsorted(edges, mean_units, side="right")
+    return {key: f"size_{bucket}" for key, bucket in zip(unique_keys.tolist(), buckets.tolist())}
+
+
+# ------------------------------------------------------------
+# Worker side
+# ------------------------------------------------------------
+_shared = {}
+
+
+def fit_segment(task):
+    """Train one segment model, save it with its schema, score it on its test rows."""
+    from lightgbm import LGBMRegressor
+
+    name, train_rows, test_rows = task
+    data = _shared
+    model = LGBMRegressor(**data["params"], n_jobs=data["threads"], verbose=-1)
+    model.fit(
+        data["X_train"].iloc[train_rows], data["y_train"].iloc[train_rows],
+        categorical_feature=data["categorical"] or "auto"
+    )
+
+    model_path = os.path.join(data["out_dir"], f"{name}.pkl")
+    joblib.dump(model, model_path)
+    write_schema(
+        model_schema(model, data["X_train"].columns, data["categorical"],
+                     data["category_labels"], data["native_categorical"]),
+        model_path
+    )
+
+    entry = {
+        "model": f"{name}.pkl",
+        "schema": f"{name}.schema.json",
+        "train_rows": int(len(train_rows)),
+        "test_rows": int(len(test_rows)),
+        "mae": None,
+        "rmse": None
+    }
+    if len(test_rows):
+        error = model.booster_.predict(data["X_test"].iloc[test_rows]) \
+            - data["y_test"].iloc[test_rows].to_numpy()
+        entry["mae"] = float(np.mean(np.abs(error)))
+        entry["rmse"] = float(np.sqrt(np.mean(error ** 2)))
+    return name, entry
+
+
+# ------------------------------------------------------------
+# Training
+# ------------------------------------------------------------
+def train_segments(X_train, y_train, X_test, y_test, keys_train, keys_test, segment_by, out_dir,
+                   categorical=(), category_labels=None, native_categorical=False, n_buckets=4,
+                   min_rows=MIN_SEGMENT_ROWS, workers=None, threads=1, params=MODEL_PARAMS):
+    """
+    Train every segment into a staging directory next to ``out_dir``.
+    Returns the manifest; publish_segments() gates and installs it.
+
+    Workers are forked, so call this before the parent process has run
+    any LightGBM training (OpenMP does not survive a fork); where fork is
+    unavailable the segments are trained one after another in-process.
+    """
+    assignment = assign_segments(keys_train, y_train.to_numpy(dtype=np.float64), segment_by, n_buckets)
+    segment_train = np.array([assignment[key] for key in keys_train.tolist()])
+    segment_test = np.array([assignment.get(key, "") for key in keys_test.tolist()])
+
+    tasks, skipped = [], []
+    for name in sorted(set(assignment.values())):
+        train_rows = np.flatnonzero(segment_train == name)
+        if len(train_rows) < min_rows:
+            skipped.append(name)
+            continue
+        tasks.append((name, train_rows, np.flatnonzero(segment_test == name)))
+    # Biggest segments first, so the pool does not end on one long fit
+    tasks.sort(key=lambda task: -len(task[1]))
+
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    _shared.update(
+        X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test,
+        categorical=list(categorical), category_labels=category_labels or {},
+        native_categorical=native_categorical, params=params, threads=threads, out_dir=tmp_dir
+    )
+
+    workers = workers or max((os.cpu_count() or 1) // threads, 1)
+    if workers == 1 or "fork" not in multiprocessing.get_all_start_methods():
+        results = [fit_segment(task) for task in tasks]
+    else:
+        # Forked workers inherit the frames above; nothing is pickled but the row lists
+        with concurrent.futures.ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("fork")) as pool:
+            results = list(pool.map(fit_segment, tasks))
+    _shared.clear()
+
+    trained = dict(results)
+    return {
+        "segment_by": segment_by,
+        "key_columns": SEGMENTATIONS[segment_by],
+        # Keys of segments without a model are left out: they use the global model
+        "assignment": {key: name for key, name in sorted(assignment.items()) if name in trained},
+        "segments": {name: trained[name] for name in sorted(trained)},
+        "skipped": skipped,
+        "rejected": {},
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
+    }
+
+
+def publish_segments(manifest, out_dir, keys_test, y_test, global_pred):
+    """
+    Keep the segments whose test MAE beats the global model's predictions
+    (``global_pred``) on the same rows, then write ``out_dir`` (replacing
+    an older one). Rejected segments and segments without test rows stay
+    out of the assignment, so the API scores their rows with the global
+    model. Returns the final manifest.
+    """
+    segment_test = np.array([manifest["assignment"].get(key, "") for key in keys_test.tolist()])
+    error = np.abs(np.asarray(global_pred, dtype=np.float64) - np.asarray(y_test, dtype=np.float64))
+
+    tmp_dir = out_dir + ".tmp"
+    accepted = {}
+    for name, entry in manifest["segments"].items():
+        rows = segment_test == name
+        entry["global_mae"] = float(error[rows].mean()) if rows.any() else None
+        if entry["mae"] is not None and entry["global_mae"] is not None and entry["mae"] < entry["global_mae"]:
+            accepted[name] = entry
+            continue
+        # Only the metrics of a rejected segment are kept
+        os.remove(os.path.join(tmp_dir, entry.pop("model")))
+        os.remove(os.path.join(tmp_dir, entry.pop("schema")))
+        manifest["rejected"][name] = entry
+    manifest["segments"] = accepted
+    manifest["assignment"] = {key: name for key, name in manifest["assignment"].items() if name in accepted}
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), "w") as handle:
+        json.dump(manifest, handle, indent=2)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return manifest
@@ -0,0 +1,179 @@
+# ============================================================
+# TRAINING DATA (shared by model.py and the tuning / retraining tools)
+# ============================================================
+#
+# Loads the milestone-3 feature table, fills missing numbers and encodes
+# it either one-hot (pd.get_dummies) or with integer-coded categoricals
+# for LightGBM's native categorical splits. Rows are returned in date
+# order, which every time-based split here relies on.
+
+import datetime
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, "../milestone-3")
+import columnar
+
+FEATURES_CSV = "../milestone-3/cleaned_features.csv"
+
+TARGET = 'Units Sold'
+
+# Parameters of the deployed demand model
+MODEL_PARAMS = {
+    "n_estimators": 200,
+    "learning_rate": 0.05,
+    "subsample": 0.8,
+    "colsample_bytree": 0.8,
+    "random_state": 42
+}
+
+# Native mode: identifier / date-string columns are dropped (a restock
+# date or the warehouse label says nothing a numeric feature doesn't),
+# and these become categorical features on their integer codes
+NATIVE_DROP_COLUMNS = ['Date', 'Restock_Date', 'Warehouse/Store ID']
+NATIVE_CATEGORICAL = ['Product ID', 'Store ID', 'season', 'elasticity_class']
+
+# Coded by milestone-3 from their sorted labels
+ID_COLUMNS = ['Product ID', 'Store ID']
+
+
+def load_features(features_csv=FEATURES_CSV):
+    """The cleaned feature table with parsed dates and missing numbers set to 0."""
+    features_dir = columnar.columns_dir_for(features_csv)
+    if os.path.exists(features_dir):
+        # Memory-mapped binary columns written by feauture.py (no CSV parsing)
+        df = columnar.load_frame(features_dir)
+    else:
+        df = pd.read_csv(features_csv)
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+
+    # Column by column, and only where something is missing: select_dtypes
+    # and a frame-wide fillna copy every numeric column, which would pull the
+    # whole memory-mapped table into RAM (integer columns never hold NaN)
+    for col, dtype in df.dtypes.items():
+        if dtype.kind == 'f' and df[col].isna().any():
+            df[col] = df[col].fillna(0)
+    return df
+
+
+def id_code_labels(features_csv=FEATURES_CSV):
+    """
+    Labels behind the Product / Store ID codes of the feature table (code
+    i stands for labels[i]); serving has to code new rows the same way.
+    """
+    categories = columnar.read_categories(features_csv)
+    return {col: categories[col] for col in ID_COLUMNS if col in categories}
+
+
+def native_frame(df):
+    """
+    Model inputs for the native-categorical mode: text columns become
+    integer codes (labels sorted; missing -> NaN) and everything is float32.
+    Returns (frame with the target, categorical columns, labels per text column).
+    """
+    X = df.drop(columns=[col for col in NATIVE_DROP_COLUMNS + [TARGET] if col in df.columns])
+    categories = {}
+    for col in X.columns:
+        if X[col].dtype == object or isinstance(X[col].dtype, pd.CategoricalDtype):
+            labels = sorted(X[col].dropna().unique().tolist())
+            X[col] = pd.Categorical(X[col], categories=labels).codes
+            categories[col] = labels
+    categorical = [col for col in X.columns if col in NATIVE_CATEGORICAL or col in categories]
+
+    X = X.astype(np.float32)
+    # LightGBM reads negative categorical values as missing; make it explicit
+    X[categorical] = X[categorical].mask(X[categorical] < 0)
+    X[TARGET] = df[TARGET]
+    return X, categorical, categories
+
+
+def encode(df, native_categorical=False):
+    """(encoded frame with the target, categorical columns, labels per text column)."""
+    if native_categorical:
+        return native_frame(df)
+    # One-hot encoding (Milestone-acceptable)
+    return pd.get_dummies(df, drop_first=True), [], {}
+
+
+def time_ordered(df_encoded, dates):
+    """(X, y) sorted by date; the index still points at the rows of the loaded table."""
+    df_encoded = df_encoded.copy()
+    df_encoded['Date'] = dates
+    df_encoded = df_encoded.sort_values('Date')
+    df_encoded.drop(columns=['Date'], inplace=True)
+
+    y = df_encoded[TARGET]
+    X = df_encoded.drop(columns=[TARGET])
+    return X, y
+
+
+def model_schema(model, columns, categorical, category_labels, native_categorical=False):
+    """Ordered input schema of a trained model; serving assembles rows by these names."""
+    feature_names = model.booster_.feature_name()
+    position = {col: i for i, col in enumerate(columns)}
+    return {
+        "encoding": "native_categorical" if native_categorical else "one_hot",
+        "dtype": "float32" if native_categorical else "float64",
+        "target": TARGET,
+        "features": feature_names,
+        "columns": list(columns),
+        "categorical": [feature_names[position[col]] for col in categorical],
+        # Code i of a text (or milestone-3 coded ID) column stands for labels[i]
+        "categories": {
+            feature_names[position[col]]: labels for col, labels in category_labels.items()
+            if col in position
+        }
+    }
+
+
+def schema_path_for(model_path):
+    return os.path.splitext(model_path)[0] + ".schema.json"
+
+
+def read_schema(model_path):
+    path = schema_path_for(model_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def write_schema(schema, model_path):
+    with open(schema_path_for(model_path), "w") as handle:
+        json.dump(schema, handle, indent=2)
+
+
+# ------------------------------------------------------------
+# Training state (what retrain.py continues from)
+# ------------------------------------------------------------
+def state_path_for(model_path):
+    return os.path.splitext(model_path)[0] + ".state.json"
+
+
+def read_train_state(model_path):
+    path = state_path_for(model_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def write_train_state(state, model_path):
+    with open(state_path_for(model_path), "w") as handle:
+        json.dump(state, handle, indent=2)
+
+
+def full_train_state(model, last_trained_date, rows_trained):
+    """State after a training run from scratch."""
+    return {
+        "last_trained_date": str(pd.Timestamp(last_trained_date).date()),
+        "rows_trained": int(rows_trained),
+        "trees": int(model.booster_.num_trees()),
+        "incremental_runs": 0,
+        "last_full_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "history": []
+    }
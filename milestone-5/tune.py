@@ -0,0 +1,289 @@
+# ============================================================
+# HYPERPARAMETER SEARCH (expanding-window time-series CV)
+# ============================================================
+#
+# model.py trains one LGBMRegressor with fixed parameters on a single
+# 80/20 time split. This script scores many parameter sets on several
+# expanding-window folds instead:
+#
+#   fold 1:  train [=======][s]          validate [==]
+#   fold 2:  train [=========][s]          validate [==]
+#   fold 3:  train [===========][s]          validate [==]
+#
+# Folds cut the data at day boundaries, so one day is never split between
+# training and validation. Every fit stops early on the last days of its
+# training window ([s], --stopping-fraction of them; at most --max-rounds
+# trees), so the learning rate and the number of trees are tuned together
+# while the validation block stays unseen until it is scored.
+#
+# Each (parameter set, fold) fit is one task for a pool of processes.
+# Workers memory-map the encoded matrix written once by the parent, and
+# every fit is capped at --threads LightGBM threads, so workers x threads
+# never oversubscribes the cores.
+#
+# Usage (from milestone-5):
+#   python tune.py                              # default grid, 4 folds
+#   python tune.py --random 40 --seed 7         # random search instead
+#   python tune.py --native-categorical --workers 4 --threads 2
+
+import argparse
+import concurrent.futures
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from training_data import FEATURES_CSV, encode, load_features, time_ordered
+
+OUTPUT_PATH = "tuning_results.csv"
+
+# Fixed for every candidate (bagging needs subsample_freq to take effect)
+BASE_PARAMS = {
+    "subsample_freq": 1,
+    "random_state": 42,
+    "verbose": -1
+}
+
+DEFAULT_GRID = {
+    "learning_rate": [0.03, 0.1],
+    "num_leaves": [15, 31, 63],
+    "min_child_samples": [10, 40],
+    "subsample": [0.8],
+    "colsample_bytree": [0.8]
+}
+
+# LightGBM metric that early stopping watches for each --metric
+EVAL_METRICS = {"mae": "l1", "rmse": "rmse"}
+
+# name -> (kind, low, high); "log" / "int_log" sample uniformly in log space
+RANDOM_SPACE = {
+    "learning_rate": ("log", 0.01, 0.2),
+    "num_leaves": ("int_log", 8, 255),
+    "min_child_samples": ("int_log", 5, 200),
+    "subsample": ("uniform", 0.5, 1.0),
+    "colsample_bytree": ("uniform", 0.4, 1.0),
+    "reg_lambda": ("log", 1e-3, 10.0)
+}
+
+
+# ------------------------------------------------------------
+# Candidates
+# ------------------------------------------------------------
+def grid_candidates(grid):
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def random_candidates(space, n, seed=0):
+    rng = np.random.default_rng(seed)
+    candidates = []
+    for _ in range(n):
+        params = {}
+        for name, (kind, low, high) in sorted(space.items()):
+            if kind == "uniform":
+                params[name] = float(rng.uniform(low, high))
+            else:
+                value = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+                params[name] = int(round(value)) if kind == "int_log" else value
+        candidates.append(params)
+    return candidates
+
+
+# ------------------------------------------------------------
+# Folds
+# ------------------------------------------------------------
+def expanding_folds(dates, n_folds=4, min_train_fraction=0.5):
+    """
+    (train_end, valid_end) row positions for every fold over rows sorted by
+    date. The days after the first ``min_train_fraction`` of them are cut
+    into ``n_folds`` validation blocks; each fold trains on all rows before
+    its block.
+    """
+    days = np.asarray(dates, dtype="datetime64[D]")
+    unique_days = np.unique(days[~np.isnat(days)])
+    if len(unique_days) < n_folds + 1:
+        raise ValueError(f"{len(unique_days)} distinct days cannot make {n_folds} folds")
+
+    first_valid = max(int(len(unique_days) * min_train_fraction), 1)
+    block_starts = np.linspace(first_valid, len(unique_days), n_folds + 1).astype(int)
+    # Position of the first row of each cut day (undated rows sort last)
+    cuts = np.searchsorted(days, unique_days[block_starts[:-1]], side="left")
+    ends = np.append(cuts[1:], np.searchsorted(days, unique_days[-1], side="right"))
+    return [(int(start), int(end)) for start, end in zip(cuts, ends) if end > start]
+
+
+def stopping_start(dates, train_end, fraction=0.15):
+    """
+    Row position where the early-stopping block starts: the last
+    ``fraction`` of the days before ``train_end`` (at least one day, and
+    never the only training day).
+    """
+    days = np.asarray(dates[:train_end], dtype="datetime64[D]")
+    unique_days = np.unique(days[~np.isnat(days)])
+    if len(unique_days) < 2:
+        raise ValueError("a training window needs two distinct days to hold one back for early stopping")
+    n_stop = min(max(int(round(len(unique_days) * fraction)), 1), len(unique_days) - 1)
+    return int(np.searchsorted(days, unique_days[-n_stop], side="left"))
+
+
+# ------------------------------------------------------------
+# Worker side
+# ------------------------------------------------------------
+_shared = {}
+
+
+def _init_worker(share_dir, feature_names, categorical, threads):
+    _shared.update(
+        X=np.load(os.path.join(share_dir, "X.npy"), mmap_mode="r"),
+        y=np.load(os.path.join(share_dir, "y.npy"), mmap_mode="r"),
+        feature_names=feature_names, categorical=categorical, threads=threads
+    )
+
+
+def fit_fold(task):
+    """Fit one candidate on one fold; returns its scores."""
+    from lightgbm import LGBMRegressor, early_stopping
+
+    candidate, fold, params, (stop_start, train_end, valid_end), max_rounds, stopping_rounds, metric = task
+    X, y = _shared["X"], _shared["y"]
+
+    model = LGBMRegressor(
+        n_estimators=max_rounds, n_jobs=_shared["threads"], metric=EVAL_METRICS[metric],
+        **BASE_PARAMS, **params
+    )
+    started = time.perf_counter()
+    model.fit(
+        X[:stop_start], y[:stop_start],
+        eval_set=[(X[stop_start:train_end], y[stop_start:train_end])],
+        feature_name=_shared["feature_names"],
+        categorical_feature=_shared["categorical"] or "auto",
+        callbacks=[early_stopping(stopping_rounds, verbose=False)]
+    )
+    fit_seconds = time.perf_counter() - started
+
+    # Scored on the validation block, which early stopping never saw.
+    # The booster skips sklearn's input checks (as serving does)
+    error = model.booster_.predict(X[train_end:valid_end], num_iteration=model.best_iteration_) \
+        - y[train_end:valid_end]
+    return {
+        "candidate": candidate,
+        "fold": fold,
+        "mae": float(np.mean(np.abs(error))),
+        "rmse": float(np.sqrt(np.mean(error ** 2))),
+        "best_iteration": int(model.best_iteration_ or max_rounds),
+        "fit_seconds": fit_seconds
+    }
+
+
+# ------------------------------------------------------------
+# Search
+# ------------------------------------------------------------
+def rank_results(fold_results, candidates, metric="rmse"):
+    """One row per candidate: its parameters and fold-averaged scores, best first."""
+    folds = pd.DataFrame(fold_results)
+    table = folds.groupby("candidate").agg(
+        mean_mae=("mae", "mean"),
+        std_mae=("mae", "std"),
+        mean_rmse=("rmse", "mean"),
+        std_rmse=("rmse", "std"),
+        best_iteration=("best_iteration", "mean"),
+        fit_seconds=("fit_seconds", "sum")
+    )
+    params = pd.DataFrame(candidates)
+    params.index.name = "candidate"
+    table = params.join(table).reset_index()
+    table = table.sort_values([f"mean_{metric}", "candidate"], kind="mergesort").reset_index(drop=True)
+    table.insert(0, "rank", np.arange(1, len(table) + 1))
+    return table
+
+
+def run_search(X, y, dates, candidates, categorical=(), n_folds=4, workers=None, threads=1,
+               max_rounds=2000, stopping_rounds=50, metric="rmse", stopping_fraction=0.15, tmp_dir=None):
+    """Score every candidate on every fold; returns the ranked table."""
+    workers = workers or max((os.cpu_count() or 1) // threads, 1)
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    folds = [
+        (stopping_start(dates, train_end, stopping_fraction), train_end, valid_end)
+        for train_end, valid_end in expanding_folds(dates, n_folds)
+    ]
+    feature_names = [str(name) for name in X.columns]
+    categorical = [feature_names.index(col) for col in categorical]
+
+    # Largest folds first, so the pool does not end on one long fit
+    tasks = [
+        (candidate, fold, params, bounds, max_rounds, stopping_rounds, metric)
+        for fold, bounds in sorted(enumerate(folds), key=lambda item: -item[1][2])
+        for candidate, params in enumerate(candidates)
+    ]
+
+    share_dir = tempfile.mkdtemp(prefix="tune_", dir=tmp_dir)
+    try:
+        dtype = np.float32 if all(dtype == np.float32 for dtype in X.dtypes) else np.float64
+        np.save(os.path.join(share_dir, "X.npy"), X.to_numpy(dtype=dtype))
+        np.save(os.path.join(share_dir, "y.npy"), y.to_numpy(dtype=np.float64))
+
+        init_args = (share_dir, feature_names, categorical, threads)
+        if workers == 1:
+            _init_worker(*init_args)
+            fold_results = [fit_fold(task) for task in tasks]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(
+                    workers, initializer=_init_worker, initargs=init_args) as pool:
+                fold_results = list(pool.map(fit_fold, tasks))
+    finally:
+        shutil.rmtree(share_dir, ignore_errors=True)
+
+    return rank_results(fold_results, candidates, metric)
+
+
+# ------------------------------------------------------------
+# Main
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-series CV hyperparameter search")
+    parser.add_argument("--features", default=FEATURES_CSV)
+    parser.add_argument("--native-categorical", action="store_true")
+    parser.add_argument("--grid", help="JSON file of {parameter: [values]} (default: DEFAULT_GRID)")
+    parser.add_argument("--random", type=int, default=0,
+                        help="Sample this many candidates from RANDOM_SPACE instead of a grid")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--folds", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes (default: cores // threads)")
+    parser.add_argument("--threads", type=int, default=1, help="LightGBM threads per fit")
+    parser.add_argument("--max-rounds", type=int, default=2000)
+    parser.add_argument("--early-stopping", type=int, default=50)
+    parser.add_argument("--stopping-fraction", type=float, default=0.15,
+                        help="Share of each training window's days held back for early stopping")
+    parser.add_argument("--metric", choices=["mae", "rmse"], default="rmse")
+    parser.add_argument("--out", default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    if args.random:
+        candidates = random_candidates(RANDOM_SPACE, args.random, args.seed)
+    elif args.grid:
+        with open(args.grid) as handle:
+            candidates = grid_candidates(json.load(handle))
+    else:
+        candidates = grid_candidates(DEFAULT_GRID)
+
+    df = load_features(args.features)
+    df_encoded, categorical, _ = encode(df, args.native_categorical)
+    X, y = time_ordered(df_encoded, df['Date'])
+    dates = df['Date'].loc[X.index]
+
+    started = time.perf_counter()
+    table = run_search(
+        X, y, dates, candidates, categorical, args.folds, args.workers, args.threads,
+        args.max_rounds, args.early_stopping, args.metric, args.stopping_fraction
+    )
+    table.to_csv(args.out, index=False)
+
+    print(f"{len(candidates)} candidates x {args.folds} folds in {time.perf_counter() - started:.1f}s")
+    print(f"Tuning results saved at: {args.out}")
+    print(table.head(10).to_string(index=False))
@@ -1,13 +1,119 @@
 #uvicorn app:app --reload
-from fastapi import FastAPI
-from pydantic import BaseModel
-import joblib
+import datetime
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, model_validator
 import numpy as np
 
+import catalog_stream
+import metrics
+from feature_store import FeatureStore
+from inference_executor import InferenceExecutor
+from micro_batcher import MicroBatcher, QueueFullError
+from model_registry import ModelHandle, ModelRegistry, load_artifacts, load_schema, schema_path_for
+from prediction_cache import PredictionCache
+from segment_router import GLOBAL, MANIFEST_NAME as SEGMENTS_MANIFEST, SegmentRouter
+
+sys.path.insert(0, "../milestone-4")
+from pricing_rules import DEMAND_RULES, compile_rules, load_rules
+
+# ------------------------------------
+# Startup / Shutdown (background model watcher)
+# ------------------------------------
+@asynccontextmanager
+async def lifespan(app):
+    stop_event = threading.Event()
+    if MODEL_CHECK_INTERVAL > 0:
+        threading.Thread(target=_watch_models, args=(stop_event,), daemon=True).start()
+    yield
+    stop_event.set()
+    await micro_batcher.stop()
+    inference.shutdown()
+    if FEATURE_STORE_PATH:
+        feature_store.snapshot(FEATURE_STORE_PATH)
+
+# ------------------------------------
+# Request Metrics (always on; see /metrics)
+# ------------------------------------
+REQUESTS = metrics.Counter(
+    "priceoptima_http_requests_total", "HTTP requests by route and status code")
+REQUEST_LATENCY = metrics.Histogram(
+    "priceoptima_http_request_duration_seconds", "End-to-end request latency by route",
+    metrics.LATENCY_BUCKETS)
+STAGE_LATENCY = metrics.Histogram(
+    "priceoptima_stage_duration_seconds",
+    "Latency of each step of a pricing request (validate, feature_assembly, predict, "
+    "routed_predict, pricing_rule, serialize)",
+    metrics.LATENCY_BUCKETS)
+ROWS_SCORED = metrics.Counter(
+    "priceoptima_rows_scored_total", "Rows priced, by endpoint and cache result")
+PREDICTED_DEMAND = metrics.Histogram(
+    "priceoptima_predicted_demand", "Distribution of predicted demand (units)",
+    metrics.DEMAND_BUCKETS)
+
+SINGLE_ROW_HITS = ROWS_SCORED.labels(endpoint="predict-price", cache="hit")
+SINGLE_ROW_MISSES = ROWS_SCORED.labels(endpoint="predict-price", cache="miss")
+SINGLE_ROW_DEMAND = PREDICTED_DEMAND.labels()
+
+
+class RequestMetricsMiddleware:
+    """Times every HTTP request and stamps its start time for the stage metrics."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        scope.setdefault("state", {})["request_started"] = started
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Route template, not the raw path, keeps the label set small
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            REQUEST_LATENCY.observe(time.perf_counter() - started, route=path)
+            REQUESTS.inc(route=path, status=status_code)
+
+
+_stage_series = {}
+
+
+def stage_done(endpoint, stage, since):
+    """Record one stage that started at ``since``; returns now for the next stage."""
+    now = time.perf_counter()
+    series = _stage_series.get((endpoint, stage))
+    if series is None:
+        series = _stage_series[(endpoint, stage)] = STAGE_LATENCY.labels(endpoint=endpoint, stage=stage)
+    series.observe(now - since)
+    return now
+
 # ------------------------------------
 # App Setup (Clear for Non-Technical Users)
 # ------------------------------------
 app = FastAPI(
+    lifespan=lifespan,
     title="PriceOptima – Smart Pricing API",
     description="""
 This API recommends an optimal product price based on:
@@ -23,7 +129,230 @@ Simply enter the details and get a smart price suggestion.
 # ------------------------------------
 # Load trained ML model
 # ------------------------------------
-model = joblib.load("best_pricing_model.pkl")
+MODEL_PATH = "best_pricing_model.pkl"
+COMPILED_MODEL_PATH = "best_pricing_model.npz"
+
+# Versioned models (see model_registry.py); without a manifest the
+# files above are served as a single "local" version
+model_registry = ModelRegistry(os.environ.get("PRICEOPTIMA_MODEL_REGISTRY", "models"))
+
+# Requests with at most this many rows use the compiled NumPy evaluator;
+# larger batches go to the LightGBM booster, whose C loop wins on volume
+COMPILED_MAX_ROWS = int(os.environ.get("PRICEOPTIMA_COMPILED_MAX_ROWS", "1"))
+
+# How often (seconds) the background watcher looks for a new model; 0 = off
+MODEL_CHECK_INTERVAL = float(os.environ.get("PRICEOPTIMA_MODEL_CHECK_S", "2"))
+
+
+def local_model_version():
+    """Version tag for the un-registered files; changes whenever one is rewritten."""
+    fingerprint = []
+    for path in (MODEL_PATH, COMPILED_MODEL_PATH, schema_path_for(MODEL_PATH)):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            fingerprint.append(f"{path}:{stat.st_mtime_ns}:{stat.st_size}")
+    return "local-" + hashlib.sha1("|".join(fingerprint).encode()).hexdigest()[:10]
+
+
+def wanted_model_version():
+    """The version that should be serving right now."""
+    if model_registry.exists():
+        return model_registry.active_version()
+    return local_model_version()
+
+
+def load_model(version=None):
+    """Load a model version as a ModelHandle (default: the wanted one)."""
+    version = version or wanted_model_version()
+    if model_registry.exists():
+        return model_registry.load(version, COMPILED_MAX_ROWS)
+    estimator, compiled = load_artifacts(MODEL_PATH, COMPILED_MODEL_PATH)
+    schema = load_schema(schema_path_for(MODEL_PATH))
+    return ModelHandle(version, estimator, compiled, COMPILED_MAX_ROWS, schema)
+
+
+def warm_up(handle):
+    """Run a few predictions so the first real request doesn't pay for it."""
+    sample = np.random.default_rng(0).random((64, handle.n_features_in_)) * 100
+    for rows in (1, 8, 64):
+        handle.predict(sample[:rows])
+
+
+# The request path only ever reads this one reference; a reload builds
+# and warms a new handle on the side, then swaps it in with one assignment
+current_model = load_model()
+warm_up(current_model)
+
+# ------------------------------------
+# Inference Executor (keeps model calls off the event loop)
+# ------------------------------------
+# "thread" (default) or "process"; process workers are forked with the
+# model already loaded, so start-up cost and memory are paid once
+inference = InferenceExecutor(
+    mode=os.environ.get("PRICEOPTIMA_INFERENCE_MODE", "thread"),
+    workers=int(os.environ.get("PRICEOPTIMA_INFERENCE_WORKERS", "0")) or None
+)
+inference.set_model(current_model)
+
+# ------------------------------------
+# Segment Models (milestone-5/model.py --segment-by)
+# ------------------------------------
+# Rows of a SKU whose segment has its own model are scored by it; all
+# other rows by the serving model. Segment models load on first use and
+# at most PRICEOPTIMA_SEGMENTS_MAX_LOADED stay in memory (LRU).
+SEGMENTS_DIR = os.environ.get("PRICEOPTIMA_SEGMENTS_DIR", "segments")
+SEGMENTS_MAX_LOADED = int(os.environ.get("PRICEOPTIMA_SEGMENTS_MAX_LOADED", "8"))
+
+segment_router = SegmentRouter.open(SEGMENTS_DIR, SEGMENTS_MAX_LOADED, COMPILED_MAX_ROWS)
+
+
+def segments_available():
+    return bool(SEGMENTS_DIR) and os.path.exists(os.path.join(SEGMENTS_DIR, SEGMENTS_MANIFEST))
+
+
+def routed_version(handle, router):
+    """model_version of a response that segment models (partly) scored."""
+    return f"{handle.version}+{router.version}"
+
+
+def cache_token():
+    """What cached predictions depend on: the serving model and the segment models."""
+    if segment_router is None:
+        return current_model.version
+    return f"{current_model.version}+{segment_router.version}"
+
+# ------------------------------------
+# Prediction Cache (repeated what-if queries skip the model)
+# ------------------------------------
+prediction_cache = PredictionCache(
+    max_size=int(os.environ.get("PRICEOPTIMA_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.environ.get("PRICEOPTIMA_CACHE_TTL_S", "300")),
+    price_step=float(os.environ.get("PRICEOPTIMA_CACHE_PRICE_STEP", "0")),
+    stock_level_step=int(os.environ.get("PRICEOPTIMA_CACHE_STOCK_STEP", "0"))
+)
+prediction_cache.bind(cache_token())
+
+# ------------------------------------
+# Feature Store (per-SKU sales history for lag / rolling features)
+# ------------------------------------
+# Restored from the last snapshot when there is one, otherwise rebuilt
+# from the dataset; saved again on shutdown ("" disables snapshots)
+FEATURE_STORE_PATH = os.environ.get("PRICEOPTIMA_FEATURE_STORE", "feature_store.pkl")
+FEATURE_STORE_SOURCE = os.environ.get("PRICEOPTIMA_FEATURE_STORE_SOURCE", "../milestone-1/combined_dataset.csv")
+
+
+def load_feature_store():
+    if FEATURE_STORE_PATH and os.path.exists(FEATURE_STORE_PATH):
+        return FeatureStore.restore(FEATURE_STORE_PATH)
+    store = FeatureStore()
+    if FEATURE_STORE_SOURCE and os.path.exists(FEATURE_STORE_SOURCE):
+        store.bootstrap(FEATURE_STORE_SOURCE)
+    return store
+
+
+feature_store = load_feature_store()
+
+
+def freeze_id_codes(handle):
+    """Product / Store ID codes in the order ``handle`` was trained with (its schema's labels)."""
+    categories = (handle.schema or {}).get("categories", {})
+    if feature_store.freeze_codes(categories.get("Product_ID"), categories.get("Store_ID")):
+        prediction_cache.clear()
+
+
+freeze_id_codes(current_model)
+
+# ------------------------------------
+# Hot Reload (background load → warm up → atomic swap)
+# ------------------------------------
+_reload_lock = threading.Lock()
+reload_status = {"state": "idle", "version": None, "error": None, "finished_at": None}
+
+
+def swap_model(handle):
+    global current_model
+    # Process workers must be re-forked with the new model before it goes live
+    inference.set_model(handle)
+    freeze_id_codes(handle)
+    current_model = handle
+    prediction_cache.bind(cache_token())
+
+
+def reload_segments():
+    """Re-read segments.json (models are loaded again on demand)."""
+    global segment_router
+    segment_router = SegmentRouter.open(SEGMENTS_DIR, SEGMENTS_MAX_LOADED, COMPILED_MAX_ROWS)
+    prediction_cache.bind(cache_token())
+
+
+def _reload_worker(version):
+    try:
+        handle = load_model(version)
+        warm_up(handle)
+        swap_model(handle)
+        reload_status.update(state="idle", error=None)
+    except Exception as exc:
+        # Keep serving the old model; the error is reported on /admin/models
+        reload_status.update(state="failed", error=f"{type(exc).__name__}: {exc}")
+    finally:
+        reload_status["finished_at"] = time.time()
+        _reload_lock.release()
+
+
+def start_reload(version=None):
+    """Load ``version`` in a background thread. False if a reload is already running."""
+    if not _reload_lock.acquire(blocking=False):
+        return False
+    reload_status.update(state="loading", version=version or wanted_model_version(), error=None)
+    threading.Thread(target=_reload_worker, args=(reload_status["version"],), daemon=True).start()
+    return True
+
+
+def _watch_models(stop_event):
+    """Reload whenever the registry's active version (or the local files) change."""
+    while not stop_event.wait(MODEL_CHECK_INTERVAL):
+        try:
+            wanted = wanted_model_version()
+        except (OSError, ValueError):
+            continue   # manifest mid-rewrite or unreadable: try again next tick
+        failed_same = reload_status["state"] == "failed" and reload_status["version"] == wanted
+        if wanted != current_model.version and not failed_same:
+            start_reload(wanted)
+
+        router = segment_router
+        try:
+            if router.is_stale() if router is not None else segments_available():
+                reload_segments()
+        except (OSError, ValueError, KeyError):
+            continue   # segments being rewritten: try again next tick
+
+
+async def predict_requests_with_version(requests):
+    """
+    Predicted demand per queued single-row request, tagged with the model
+    version that scored it. The rows are assembled here, at flush time,
+    for the model that scores them, so a request queued across a hot
+    reload is never scored against another model's layout.
+    """
+    handle = current_model
+    full_features = np.vstack([
+        build_feature_matrix(*inputs, product_id=product_id, store_id=store_id, handle=handle)
+        for inputs, product_id, store_id in requests
+    ])
+    predictions, version = await inference.predict(full_features, handle)
+    return [(demand, version) for demand in predictions]
+
+# ------------------------------------
+# Micro-Batching (concurrent single-row requests share one model call)
+# ------------------------------------
+MICROBATCH_ENABLED = os.environ.get("PRICEOPTIMA_MICROBATCH", "1") != "0"
+
+micro_batcher = MicroBatcher(
+    predict_requests_with_version,
+    max_batch_size=int(os.environ.get("PRICEOPTIMA_BATCH_MAX_SIZE", "64")),
+    max_wait_ms=float(os.environ.get("PRICEOPTIMA_BATCH_MAX_WAIT_MS", "2")),
+    max_queue_depth=int(os.environ.get("PRICEOPTIMA_BATCH_QUEUE_DEPTH", "1024"))
+)
 
 # ------------------------------------
 # Simple Input Form (Self-Explanatory)
@@ -61,6 +390,249 @@ class PricingInput(BaseModel):
         example=12
     )
 
+    product_id: Optional[str] = Field(
+        None,
+        description="Product ID; with store_id, adds the product's recent sales history",
+        example="P0001"
+    )
+
+    store_id: Optional[str] = Field(
+        None,
+        description="Store ID of the product",
+        example="S001"
+    )
+
+# ------------------------------------
+# Batch Input Form (one list per field)
+# ------------------------------------
+MAX_BATCH_ROWS = 100_000
+
+class PricingBatchInput(BaseModel):
+    price: List[float] = Field(
+        ...,
+        max_length=MAX_BATCH_ROWS,
+        description="Current selling price of each product",
+        example=[49.99, 19.5]
+    )
+
+    stock_level: List[int] = Field(
+        ...,
+        max_length=MAX_BATCH_ROWS,
+        description="Available inventory units for each product",
+        example=[1200, 80]
+    )
+
+    day_of_week: List[int] = Field(
+        ...,
+        max_length=MAX_BATCH_ROWS,
+        description="Day of the week for each product (0 = Monday, 6 = Sunday)",
+        example=[6, 2]
+    )
+
+    is_weekend: List[int] = Field(
+        ...,
+        max_length=MAX_BATCH_ROWS,
+        description="Is it a weekend? (1 = Yes, 0 = No) for each product",
+        example=[1, 0]
+    )
+
+    month: List[int] = Field(
+        ...,
+        max_length=MAX_BATCH_ROWS,
+        description="Month number for each product (1 = January, 12 = December)",
+        example=[12, 3]
+    )
+
+    product_id: Optional[List[str]] = Field(
+        None,
+        max_length=MAX_BATCH_ROWS,
+        description="Product ID of each product (optional, together with store_id)",
+        example=["P0001", "P0002"]
+    )
+
+    store_id: Optional[List[str]] = Field(
+        None,
+        max_length=MAX_BATCH_ROWS,
+        description="Store ID of each product",
+        example=["S001", "S003"]
+    )
+
+    @model_validator(mode="after")
+    def check_same_length(self):
+        lengths = {
+            len(self.price),
+            len(self.stock_level),
+            len(self.day_of_week),
+            len(self.is_weekend),
+            len(self.month)
+        }
+        lengths.update(len(ids) for ids in (self.product_id, self.store_id) if ids is not None)
+        if len(lengths) != 1:
+            raise ValueError("All fields must contain the same number of values")
+        return self
+
+
+class PricingBatchOutput(BaseModel):
+    predicted_demand: List[float]
+    recommended_price: List[float]
+    model_version: str
+
+
+# ------------------------------------
+# Price Optimization Input (candidate grid around the current price)
+# ------------------------------------
+class OptimizeInput(PricingInput):
+    cost: Optional[float] = Field(
+        None,
+        ge=0,
+        description="Unit cost of the product (defaults to the dataset's typical cost-to-price ratio)",
+        example=27.5
+    )
+
+    objective: str = Field(
+        "profit",
+        pattern="^(revenue|profit)$",
+        description="What to maximize: 'revenue' or 'profit'"
+    )
+
+    n_candidates: int = Field(
+        101,
+        ge=2,
+        le=1000,
+        description="Number of candidate prices to evaluate"
+    )
+
+    min_ratio: float = Field(
+        0.90,
+        gt=0,
+        description="Lowest candidate as a multiple of the current price"
+    )
+
+    max_ratio: float = Field(
+        1.40,
+        gt=0,
+        description="Highest candidate as a multiple of the current price"
+    )
+
+    include_curve: bool = Field(
+        True,
+        description="Return the full demand curve as well as the best price"
+    )
+
+    @model_validator(mode="after")
+    def check_ratio_band(self):
+        if self.min_ratio >= self.max_ratio:
+            raise ValueError("min_ratio must be smaller than max_ratio")
+        return self
+
+# ------------------------------------
+# Feature Assembly & Pricing Rule (shared by all endpoints)
+# ------------------------------------
+def build_feature_matrix(price, stock_level, day_of_week, is_weekend, month,
+                         product_id=None, store_id=None, handle=None):
+    """
+    Model input matrix, filled in by feature name for the serving model.
+
+    With product and store IDs the lag / rolling features come from the
+    feature store; without them (or for an unseen SKU) they stay 0.
+    """
+    handle = handle or current_model
+    if np.ndim(price) == 0:
+        return handle.layout.assemble_one(
+            price, stock_level, day_of_week, is_weekend, month,
+            product_id=product_id, store_id=store_id, store=feature_store
+        )
+    return handle.layout.assemble(
+        price, stock_level, day_of_week, is_weekend, month,
+        product_id=product_id, store_id=store_id, store=feature_store
+    )
+
+
+async def predict_demand(endpoint, t, handle, price, stock_level, day_of_week, is_weekend, month,
+                         product_id=None, store_id=None):
+    """
+    Predicted demand for a batch of rows, the model version(s) that scored
+    it and the time the last stage finished.
+
+    Rows covered by a segment model are assembled and predicted per
+    segment (one model call each); the rest go to ``handle`` on the
+    inference executor, as without segments.
+    """
+    router = segment_router
+    n_rows = len(price)
+    names = router.segment_rows(n_rows, product_id, store_id) if router else None
+    if names is None or (names == GLOBAL).all():
+        full_features = build_feature_matrix(
+            price, stock_level, day_of_week, is_weekend, month,
+            product_id=product_id, store_id=store_id, handle=handle
+        )
+        t = stage_done(endpoint, "feature_assembly", t)
+        predicted_demand, model_version = await inference.predict(full_features, handle)
+        return predicted_demand, model_version, stage_done(endpoint, "predict", t)
+
+    columns = [np.broadcast_to(np.asarray(values), (n_rows,))
+               for values in (price, stock_level, day_of_week, is_weekend, month)]
+    ids = [None if values is None else np.broadcast_to(np.asarray(values, dtype=object), (n_rows,))
+           for values in (product_id, store_id)]
+    predicted_demand = np.empty(n_rows)
+    for name, rows in router.group_rows(names):
+        inputs = [values[rows] for values in columns]
+        product_rows, store_rows = [None if values is None else values[rows] for values in ids]
+        if name == GLOBAL:
+            full_features = build_feature_matrix(
+                *inputs, product_id=product_rows, store_id=store_rows, handle=handle
+            )
+            predicted_demand[rows], _ = await inference.predict(full_features, handle)
+            continue
+        segment = router.handle(name) if router.is_loaded(name) else await run_in_threadpool(router.handle, name)
+        full_features = build_feature_matrix(
+            *inputs, product_id=product_rows, store_id=store_rows, handle=segment
+        )
+        predicted_demand[rows] = await run_in_threadpool(segment.predict, full_features)
+    return predicted_demand, routed_version(handle, router), stage_done(endpoint, "routed_predict", t)
+
+
+# Pricing rules (see milestone-4/pricing_rules.py), compiled once at startup.
+# Default: +5% above 200 predicted units, -5% below 50. A JSON rule table in
+# PRICEOPTIMA_PRICING_RULES replaces it; its conditions may use these inputs
+PRICING_RULE_FEATURES = ("price", "predicted_demand", "stock_level", "day_of_week", "is_weekend", "month")
+PRICING_RULES_PATH = os.environ.get("PRICEOPTIMA_PRICING_RULES")
+pricing_rules = compile_rules(load_rules(PRICING_RULES_PATH) if PRICING_RULES_PATH else DEMAND_RULES)
+_unknown_rule_features = sorted(set(pricing_rules.features) - set(PRICING_RULE_FEATURES))
+if _unknown_rule_features:
+    raise ValueError(f"Pricing rules use unknown input(s): {', '.join(_unknown_rule_features)}")
+
+
+def apply_pricing_rule(price, predicted_demand, **features):
+    """Vectorized rule price for one row (scalars) or many (arrays), no per-row Python."""
+    return pricing_rules.apply(price, dict(features, price=price, predicted_demand=predicted_demand))
+
+
+def dataset_cost_ratio(path="../milestone-1/combined_dataset.csv", fallback=0.7):
+    """Median Cost / Price in the training data, used when a request gives no cost."""
+    try:
+        import pandas as pd
+        df = pd.read_csv(path, usecols=["Price", "Cost"])
+        ratio = (df["Cost"] / df["Price"]).replace([np.inf, -np.inf], np.nan).median()
+        return float(ratio) if np.isfinite(ratio) else fallback
+    except (OSError, ValueError, KeyError):
+        return fallback
+
+
+DEFAULT_COST_RATIO = float(os.environ.get("PRICEOPTIMA_COST_RATIO") or dataset_cost_ratio())
+
+
+def score_price_grid(candidate_prices, predicted_demand, stock_level, unit_cost):
+    """
+    Expected units, revenue and profit for each candidate price.
+
+    Sales can never exceed the stock on hand, so demand is capped there.
+    """
+    units = np.clip(predicted_demand, 0.0, max(float(stock_level), 0.0))
+    revenue = candidate_prices * units
+    profit = (candidate_prices - unit_cost) * units
+    return units, revenue, profit
+
 # ------------------------------------
 # Home Page (Plain English)
 # ------------------------------------
@@ -79,38 +651,483 @@ def home():
     summary="Get Recommended Product Price",
     description="Returns predicted demand and an optimized selling price"
 )
-def predict_price(data: PricingInput):
+async def predict_price(data: PricingInput, request: Request):
 
-    # Convert user input to model format
-    base_features = np.array([
+    # Body parsing + Pydantic validation happen before the handler runs
+    t = stage_done("predict-price", "validate", request.state.request_started)
+
+    # Identical (or near-identical, if quantized) queries reuse the last answer
+    cache_key = prediction_cache.make_key(
         data.price,
         data.stock_level,
         data.day_of_week,
         data.is_weekend,
-        data.month
-    ])
+        data.month,
+        data.product_id,
+        data.store_id,
+        # A new observation for the SKU changes its features
+        feature_store.version(data.product_id, data.store_id)
+    )
+    cached = prediction_cache.get(cache_key)
+    t = stage_done("predict-price", "cache_lookup", t)
+
+    if cached is not None:
+        predicted_demand, model_version = cached
+        SINGLE_ROW_HITS.inc()
+    else:
+        handle = current_model
+        model_version = handle.version
 
-    # Match model input size
-    full_features = np.zeros((1, model.n_features_in_))
-    full_features[0, :len(base_features)] = base_features
+        # A SKU with its own segment model is scored by that model
+        router = segment_router
+        segment = router.segment_one(data.product_id, data.store_id) if router else GLOBAL
+        if segment != GLOBAL:
+            model_version = routed_version(handle, router)
+            handle = router.handle(segment) if router.is_loaded(segment) \
+                else await run_in_threadpool(router.handle, segment)
 
-    # Predict demand
-    predicted_demand = model.predict(full_features)[0]
+        # Predict demand (queued with other concurrent requests when enabled;
+        # the queue holds requests for the serving model only, and the batch
+        # assembles their features when it is flushed). Inputs use the
+        # cache's grid values.
+        if MICROBATCH_ENABLED and segment == GLOBAL:
+            try:
+                predicted_demand, model_version = await micro_batcher.submit(
+                    (cache_key[:5], data.product_id, data.store_id)
+                )
+            except QueueFullError as exc:
+                raise HTTPException(status_code=503, detail=str(exc))
+        else:
+            full_features = build_feature_matrix(
+                *cache_key[:5], product_id=data.product_id, store_id=data.store_id, handle=handle
+            )
+            t = stage_done("predict-price", "feature_assembly", t)
+            predicted_demand = handle.predict(full_features)[0]
+        # With micro-batching this includes feature assembly and the time
+        # spent waiting in the queue
+        t = stage_done("predict-price", "predict", t)
+        prediction_cache.put(cache_key, (predicted_demand, model_version))
+        SINGLE_ROW_MISSES.inc()
+        SINGLE_ROW_DEMAND.observe(float(predicted_demand))
 
     # Simple pricing logic
-    recommended_price = data.price
-    if predicted_demand > 200:
-        recommended_price *= 1.05   # High demand → increase price
-    elif predicted_demand < 50:
-        recommended_price *= 0.95   # Low demand → decrease price
-    
+    recommended_price = apply_pricing_rule(
+        data.price, predicted_demand, stock_level=data.stock_level, day_of_week=data.day_of_week,
+        is_weekend=data.is_weekend, month=data.month
+    )
+    stage_done("predict-price", "pricing_rule", t)
+
     return {
         "predicted_demand": round(float(predicted_demand), 2),
-        "recommended_price": round(float(recommended_price), 2)
+        "recommended_price": round(float(recommended_price), 2),
+        "model_version": model_version
+    }
+
+# ------------------------------------
+# Batch Price Recommendation Endpoint
+# ------------------------------------
+@app.post(
+    "/predict-price/batch",
+    summary="Get Recommended Prices for Many Products",
+    description="Accepts one list per field and returns predicted demand and "
+                "recommended prices as lists in the same order",
+    response_model=PricingBatchOutput
+)
+async def predict_price_batch(data: PricingBatchInput, request: Request):
+
+    t = stage_done("predict-price-batch", "validate", request.state.request_started)
+    handle = current_model
+
+    # One feature matrix and model call for the whole batch (one per
+    # segment with segment models), run on the inference executor
+    predicted_demand, model_version, t = await predict_demand(
+        "predict-price-batch", t, handle,
+        data.price,
+        data.stock_level,
+        data.day_of_week,
+        data.is_weekend,
+        data.month,
+        product_id=data.product_id,
+        store_id=data.store_id
+    )
+    ROWS_SCORED.inc(len(predicted_demand), endpoint="predict-price-batch", cache="none")
+    PREDICTED_DEMAND.observe_many(predicted_demand)
+
+    # Same pricing logic, applied to all rows at once
+    recommended_price = apply_pricing_rule(
+        data.price, predicted_demand, stock_level=data.stock_level, day_of_week=data.day_of_week,
+        is_weekend=data.is_weekend, month=data.month
+    )
+    t = stage_done("predict-price-batch", "pricing_rule", t)
+
+    # Skip per-item response validation: the arrays are already the right shape
+    response = JSONResponse({
+        "predicted_demand": np.round(predicted_demand, 2).tolist(),
+        "recommended_price": np.round(recommended_price, 2).tolist(),
+        "model_version": model_version
+    })
+    stage_done("predict-price-batch", "serialize", t)
+    return response
+
+# ------------------------------------
+# Revenue / Profit Maximizing Price Search
+# ------------------------------------
+@app.post(
+    "/optimize-price",
+    summary="Find the Best Price for a Product",
+    description="Tries a grid of candidate prices around the current price (90% to 140% by default), "
+                "predicts demand for all of them in one model call and returns the price with the "
+                "highest expected revenue or profit, plus the demand curve"
+)
+async def optimize_price(data: OptimizeInput, request: Request):
+
+    t = stage_done("optimize-price", "validate", request.state.request_started)
+    handle = current_model
+
+    # Every candidate is one row; only the price column changes
+    candidate_prices = data.price * np.linspace(data.min_ratio, data.max_ratio, data.n_candidates)
+    predicted_demand, model_version, t = await predict_demand(
+        "optimize-price", t, handle,
+        candidate_prices,
+        np.full(data.n_candidates, data.stock_level),
+        np.full(data.n_candidates, data.day_of_week),
+        np.full(data.n_candidates, data.is_weekend),
+        np.full(data.n_candidates, data.month),
+        product_id=data.product_id,
+        store_id=data.store_id
+    )
+    ROWS_SCORED.inc(len(predicted_demand), endpoint="optimize-price", cache="none")
+
+    unit_cost = data.cost if data.cost is not None else data.price * DEFAULT_COST_RATIO
+    units, revenue, profit = score_price_grid(
+        candidate_prices, predicted_demand, data.stock_level, unit_cost
+    )
+    objective = revenue if data.objective == "revenue" else profit
+    best = int(np.argmax(objective))
+
+    # Reference point: keep the current price (the candidate closest to it)
+    current = int(np.argmin(np.abs(candidate_prices - data.price)))
+    t = stage_done("optimize-price", "search", t)
+
+    result = {
+        "objective": data.objective,
+        "unit_cost": round(float(unit_cost), 4),
+        "best_price": round(float(candidate_prices[best]), 2),
+        "predicted_demand": round(float(predicted_demand[best]), 2),
+        "expected_revenue": round(float(revenue[best]), 2),
+        "expected_profit": round(float(profit[best]), 2),
+        "current_price": data.price,
+        "current_expected_value": round(float(objective[current]), 2),
+        "uplift": round(float(objective[best] - objective[current]), 2),
+        "model_version": model_version
+    }
+    if data.include_curve:
+        result["demand_curve"] = {
+            "price": np.round(candidate_prices, 2).tolist(),
+            "predicted_demand": np.round(predicted_demand, 2).tolist(),
+            "expected_revenue": np.round(revenue, 2).tolist(),
+            "expected_profit": np.round(profit, 2).tolist()
+        }
+
+    response = JSONResponse(result)
+    stage_done("optimize-price", "serialize", t)
+    return response
+
+# ------------------------------------
+# Streaming Catalog Repricing (CSV / NDJSON in, NDJSON out)
+# ------------------------------------
+# Local files may only be read from this directory
+REPRICE_DATA_DIR = os.path.realpath(os.environ.get("PRICEOPTIMA_REPRICE_DATA_DIR", "../milestone-1"))
+
+
+async def read_file_blocks(path, block_size=1 << 20):
+    with open(path, "rb") as handle:
+        while True:
+            block = await run_in_threadpool(handle.read, block_size)
+            if not block:
+                return
+            yield block
+
+
+@app.post(
+    "/reprice/stream",
+    summary="Reprice a Whole Catalog",
+    description="Send a CSV or NDJSON file with the columns of combined_dataset.csv as the "
+                "request body (or name a file under the data directory with `path`). Rows are "
+                "priced in chunks and streamed back as NDJSON while the file is still being read; "
+                "the last line is a summary."
+)
+async def reprice_stream(
+    request: Request,
+    path: Optional[str] = Query(None, description="File under the server's data directory"),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Override format detection"),
+    chunk_rows: int = Query(5000, ge=1, le=MAX_BATCH_ROWS, description="Rows per model call")
+):
+    if path is not None:
+        full_path = os.path.realpath(os.path.join(REPRICE_DATA_DIR, path))
+        if os.path.commonpath([full_path, REPRICE_DATA_DIR]) != REPRICE_DATA_DIR:
+            raise HTTPException(status_code=403, detail="Path is outside the data directory")
+        if not os.path.isfile(full_path):
+            raise HTTPException(status_code=404, detail=f"File not found: {path}")
+        source = read_file_blocks(full_path)
+    else:
+        source = request.stream()
+
+    fmt = catalog_stream.detect_format(request.headers.get("content-type"), path, format)
+
+    async def generate():
+        header = None
+        rows_in = rows_out = chunks = 0
+        try:
+            async for lines in catalog_stream.iter_line_chunks(source, chunk_rows):
+                if fmt == "csv" and header is None:
+                    header, lines = lines[0], lines[1:]
+                    if not lines:
+                        continue
+
+                frame = catalog_stream.parse_lines(lines, fmt, header)
+                catalog_stream.check_columns(frame)
+                inputs, valid = catalog_stream.model_inputs(frame)
+                rows_in += len(frame)
+                chunks += 1
+                if not valid.any():
+                    continue
+
+                handle = current_model
+                predicted_demand, model_version, _ = await predict_demand(
+                    "reprice-stream", time.perf_counter(), handle, **inputs
+                )
+                recommended_price = apply_pricing_rule(predicted_demand=predicted_demand, **inputs)
+                rows_out += len(predicted_demand)
+                ROWS_SCORED.inc(len(predicted_demand), endpoint="reprice-stream", cache="none")
+
+                yield catalog_stream.result_lines(
+                    frame, valid, predicted_demand, recommended_price, model_version
+                )
+        except ValueError as exc:
+            # Headers are already sent: report the problem in-band and stop
+            yield json.dumps({"error": str(exc)}) + "\n"
+            return
+
+        yield json.dumps({"summary": {
+            "rows_read": rows_in,
+            "rows_priced": rows_out,
+            "rows_skipped": rows_in - rows_out,
+            "chunks": chunks
+        }}) + "\n"
+
+    return catalog_stream.BodyStreamingResponse(generate(), media_type="application/x-ndjson")
+
+# ------------------------------------
+# Sales Observations (feed the feature store)
+# ------------------------------------
+class Observation(BaseModel):
+    product_id: str = Field(..., description="Product ID", example="P0001")
+    store_id: str = Field(..., description="Store ID", example="S001")
+    units_sold: float = Field(..., ge=0, description="Units sold that day", example=127)
+    price: float = Field(..., gt=0, description="Selling price that day", example=33.5)
+    date: Optional[datetime.date] = Field(None, description="Day of the sales", example="2023-06-02")
+    avg_price: Optional[float] = Field(None, description="Average price of the product", example=54.62)
+    cost: Optional[float] = Field(None, description="Unit cost of the product", example=27.99)
+    restock_date: Optional[str] = Field(None, description="Next restock date (DD-MM-YYYY)", example="31-01-2022")
+
+
+class ObservationBatch(BaseModel):
+    observations: List[Observation] = Field(..., max_length=MAX_BATCH_ROWS)
+
+
+@app.post(
+    "/observations",
+    summary="Record Daily Sales",
+    description="Adds one day of sales per product/store, in date order. Later price requests "
+                "for those products use the updated lags and rolling averages."
+)
+def record_observations(data: ObservationBatch, x_admin_token: Optional[str] = Header(None)):
+    check_admin(x_admin_token)
+    codes_version = feature_store.codes_version
+    for obs in data.observations:
+        feature_store.observe(
+            obs.product_id, obs.store_id, obs.units_sold, obs.price, obs.date,
+            avg_price=obs.avg_price, cost=obs.cost, restock_date=obs.restock_date
+        )
+    # A new product or store got a code; cached rows were priced without it
+    if feature_store.codes_version != codes_version:
+        prediction_cache.clear()
+    return {
+        "recorded": len(data.observations),
+        "skus": len(feature_store),
+        "observations": feature_store.observations
     }
 
+# ------------------------------------
+# Cache Statistics
+# ------------------------------------
+@app.get(
+    "/cache/stats",
+    summary="Prediction Cache Statistics",
+    description="Hit/miss counters, size and settings of the prediction cache"
+)
+def cache_stats():
+    return prediction_cache.stats()
+
+# ------------------------------------
+# Micro-Batch Statistics
+# ------------------------------------
+@app.get(
+    "/batching/stats",
+    summary="Micro-Batching Statistics",
+    description="Batch sizes, queue depth and wait times of the request coalescer"
+)
+def batching_stats():
+    return {"enabled": MICROBATCH_ENABLED, **micro_batcher.stats()}
+
+# ------------------------------------
+# Prometheus Metrics
+# ------------------------------------
+@app.get(
+    "/metrics",
+    summary="Prometheus Metrics",
+    description="Per-stage latency histograms, request/row counters, predicted demand "
+                "distribution, cache and micro-batching statistics and process memory",
+    response_class=PlainTextResponse
+)
+def prometheus_metrics():
+    lines = []
+    for metric in (REQUESTS, REQUEST_LATENCY, STAGE_LATENCY, ROWS_SCORED, PREDICTED_DEMAND):
+        lines.extend(metric.render())
+
+    cache = prediction_cache.stats()
+    lines += metrics.gauge_lines("priceoptima_cache_entries", "Entries in the prediction cache",
+                                 [({}, cache["size"])])
+    for name in ("hits", "misses", "evictions", "expirations", "invalidations"):
+        lines += metrics.counter_lines(f"priceoptima_cache_{name}_total",
+                                       f"Prediction cache {name}", cache[name])
+
+    batching = micro_batcher.stats()
+    lines += metrics.gauge_lines("priceoptima_batch_queue_depth", "Rows waiting for a micro-batch",
+                                 [({}, batching["queue_depth"])])
+    lines += metrics.counter_lines("priceoptima_batch_rejected_total",
+                                   "Requests rejected because the batch queue was full",
+                                   batching["rejected"])
+    lines += [
+        "# HELP priceoptima_batch_size Rows per micro-batch",
+        "# TYPE priceoptima_batch_size histogram"
+    ]
+    cumulative = 0
+    for bound, count in zip(micro_batcher.SIZE_BUCKETS, micro_batcher.size_counts):
+        cumulative += count
+        lines.append(f'priceoptima_batch_size_bucket{{le="{bound}"}} {cumulative}')
+    cumulative += micro_batcher.size_counts[-1]
+    lines.append(f'priceoptima_batch_size_bucket{{le="+Inf"}} {cumulative}')
+    lines.append(f"priceoptima_batch_size_sum {batching['rows']}")
+    lines.append(f"priceoptima_batch_size_count {cumulative}")
+
+    executor = inference.stats()
+    lines += metrics.gauge_lines("priceoptima_inference_workers", "Inference executor workers",
+                                 [({"mode": executor["mode"]}, executor["workers"])])
+    lines += metrics.counter_lines("priceoptima_inference_rows_total",
+                                   "Rows predicted on the inference executor", executor["rows"])
+    lines += metrics.counter_lines("priceoptima_inference_busy_seconds_total",
+                                   "Wall time spent waiting on inference tasks", executor["busy_seconds"])
+
+    lines += metrics.gauge_lines("priceoptima_model_info", "Model version currently serving",
+                                 [({"version": current_model.version}, 1)])
+    if segment_router is not None:
+        segments = segment_router.stats()
+        lines += metrics.gauge_lines("priceoptima_segment_models_loaded", "Segment models in memory",
+                                     [({"version": segments["version"]}, len(segments["loaded"]))])
+        lines += metrics.counter_lines("priceoptima_segment_model_loads_total",
+                                       "Segment models loaded", segments["loads"])
+        lines += metrics.counter_lines("priceoptima_segment_model_evictions_total",
+                                       "Segment models dropped to stay under the limit", segments["evictions"])
+    lines += metrics.gauge_lines("process_resident_memory_bytes", "Resident memory size in bytes",
+                                 [({}, metrics.process_rss_bytes())])
+
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+# ------------------------------------
+# Model Administration (versions, hot reload, rollback)
+# ------------------------------------
+ADMIN_TOKEN = os.environ.get("PRICEOPTIMA_ADMIN_TOKEN")
+
+
+def check_admin(token):
+    if ADMIN_TOKEN and token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.get(
+    "/admin/models",
+    summary="Model Versions",
+    description="Serving version, registry manifest and the state of the last reload"
+)
+def list_models(x_admin_token: Optional[str] = Header(None)):
+    check_admin(x_admin_token)
+    return {
+        "serving": current_model.version,
+        "loaded_at": current_model.loaded_at,
+        "registry": model_registry.read_manifest() if model_registry.exists() else None,
+        "segments": segment_router.stats() if segment_router is not None else None,
+        "reload": reload_status
+    }
+
+
+@app.post(
+    "/admin/models/reload",
+    summary="Load a Model Version",
+    description="Loads a version (default: the registry's active one) in the background, "
+                "warms it up and swaps it in without pausing requests",
+    status_code=202
+)
+def reload_model(version: Optional[str] = None, x_admin_token: Optional[str] = Header(None)):
+    check_admin(x_admin_token)
+    if version is not None:
+        if not model_registry.exists():
+            raise HTTPException(status_code=400, detail="No model registry configured")
+        try:
+            model_registry.activate(version)
+        except KeyError as exc:
+            raise HTTPException(status_code=404, detail=str(exc))
+    if not start_reload(version):
+        raise HTTPException(status_code=409, detail="A model reload is already in progress")
+    return {"reloading": reload_status["version"], "serving": current_model.version}
+
+
+@app.post(
+    "/admin/models/rollback",
+    summary="Roll Back to the Previous Model",
+    description="Re-activates the previously active registry version and loads it in the background",
+    status_code=202
+)
+def rollback_model(x_admin_token: Optional[str] = Header(None)):
+    check_admin(x_admin_token)
+    if not model_registry.exists():
+        raise HTTPException(status_code=400, detail="No model registry configured")
+    try:
+        version = model_registry.rollback()
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    if not start_reload(version):
+        raise HTTPException(status_code=409, detail="A model reload is already in progress")
+    return {"reloading": version, "serving": current_model.version}
+
+
+@app.post(
+    "/admin/feature-store/snapshot",
+    summary="Save the Feature Store",
+    description="Writes the feature store to disk so a restart can restore it instead of rebuilding it"
+)
+def snapshot_feature_store(x_admin_token: Optional[str] = Header(None)):
+    check_admin(x_admin_token)
+    if not FEATURE_STORE_PATH:
+        raise HTTPException(status_code=400, detail="Feature store snapshots are disabled")
+    feature_store.snapshot(FEATURE_STORE_PATH)
+    return {"path": FEATURE_STORE_PATH, "skus": len(feature_store), "observations": feature_store.observations}
+
 from fastapi.middleware.cors import CORSMiddleware
 
+app.add_middleware(RequestMetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -0,0 +1,331 @@
+# ============================================================
+# SERVING BENCHMARK (latency / throughput of the pricing API)
+# ============================================================
+#
+# Drives the API either in-process (httpx ASGITransport, no network) or
+# over HTTP against a local uvicorn server, and reports p50/p95/p99
+# latency, throughput and error rate for every scenario.
+#
+# Load models:
+#   closed – a fixed number of clients, each sending its next request as
+#            soon as the previous one returns (--concurrency)
+#   open   – requests arrive at a fixed rate whether or not earlier ones
+#            have finished (--rate); latency is measured from the scheduled
+#            send time, so queueing delay is not hidden
+#
+# Usage (from milestone-6):
+#   python benchmark.py                                   # in-process, defaults
+#   python benchmark.py --uvicorn --concurrency 1 8 32    # start a local server
+#   python benchmark.py --url http://127.0.0.1:8000 --load open --rate 200 500
+#   python benchmark.py --payloads recorded.jsonl --batch-sizes 0 100
+#   python benchmark.py --compare bench_baseline.json     # flag regressions
+#
+# --payloads takes a JSONL file with one /predict-price body per line.
+# Batch size 0 means single-row /predict-price; N > 0 sends N rows per
+# /predict-price/batch call.
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+import pandas as pd
+
+DATASET_PATH = "../milestone-1/combined_dataset.csv"
+PAYLOAD_FIELDS = ("price", "stock_level", "day_of_week", "is_weekend", "month")
+
+
+# ------------------------------------
+# Payloads
+# ------------------------------------
+def synthetic_payloads(n, seed=0):
+    """Single-row bodies sampled from the dataset (or uniform ranges without it)."""
+    rng = np.random.default_rng(seed)
+    if os.path.exists(DATASET_PATH):
+        df = pd.read_csv(DATASET_PATH, usecols=["Date", "Price", "Stock Level"])
+        df = df.iloc[rng.integers(0, len(df), n)]
+        dates = pd.to_datetime(df["Date"])
+        columns = {
+            "price": df["Price"].to_numpy(dtype=float),
+            "stock_level": df["Stock Level"].to_numpy(dtype=float),
+            "day_of_week": dates.dt.dayofweek.to_numpy(),
+            "month": dates.dt.month.to_numpy()
+        }
+    else:
+        columns = {
+            "price": np.round(rng.uniform(5, 100, n), 2),
+            "stock_level": rng.integers(0, 500, n).astype(float),
+            "day_of_week": rng.integers(0, 7, n),
+            "month": rng.integers(1, 13, n)
+        }
+    columns["is_weekend"] = (columns["day_of_week"] >= 5).astype(int)
+    return [
+        {field: columns[field][i].item() for field in PAYLOAD_FIELDS}
+        for i in range(n)
+    ]
+
+
+def load_payloads(path):
+    with open(path) as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+def request_bodies(payloads, batch_size):
+    """(path, json body) pairs; batches are built round-robin from the payloads."""
+    if batch_size == 0:
+        return [("/predict-price", payload) for payload in payloads]
+    bodies = []
+    for start in range(0, len(payloads), batch_size):
+        rows = payloads[start:start + batch_size]
+        if len(rows) < batch_size:
+            rows = rows + payloads[:batch_size - len(rows)]
+        bodies.append((
+            "/predict-price/batch",
+            {field: [row[field] for row in rows] for field in PAYLOAD_FIELDS}
+        ))
+    return bodies
+
+
+# ------------------------------------
+# Load generators
+# ------------------------------------
+async def send(client, body, latencies, errors, started=None):
+    path, payload = body
+    started = time.perf_counter() if started is None else started
+    try:
+        response = await client.post(path, json=payload)
+        failed = response.status_code >= 400
+    except httpx.HTTPError:
+        failed = True
+    latencies.append(time.perf_counter() - started)
+    if failed:
+        errors.append(1)
+
+
+async def run_closed(client, bodies, concurrency, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            await send(client, bodies[i % len(bodies)], latencies, errors)
+            i += concurrency
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker(i) for i in range(concurrency)])
+    return latencies, len(errors), time.perf_counter() - started
+
+
+async def run_open(client, bodies, rate, duration):
+    latencies, errors = [], []
+    n_requests = max(1, int(rate * duration))
+    started = time.perf_counter()
+    tasks = []
+    for i in range(n_requests):
+        scheduled = started + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(
+            send(client, bodies[i % len(bodies)], latencies, errors, started=scheduled)
+        ))
+    await asyncio.gather(*tasks)
+    return latencies, len(errors), time.perf_counter() - started
+
+
+def summarize(latencies, errors, elapsed, rows_per_request):
+    latencies_ms = np.asarray(latencies) * 1000.0
+    n = len(latencies_ms)
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99]) if n else (0.0, 0.0, 0.0)
+    return {
+        "requests": n,
+        "errors": errors,
+        "error_rate": round(errors / n, 6) if n else 0.0,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(n / elapsed, 2) if elapsed else 0.0,
+        "rows_per_s": round(n * rows_per_request / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(float(latencies_ms.mean()), 3) if n else 0.0,
+            "p50": round(float(p50), 3),
+            "p95": round(float(p95), 3),
+            "p99": round(float(p99), 3),
+            "max": round(float(latencies_ms.max()), 3) if n else 0.0
+        }
+    }
+
+
+# ------------------------------------
+# Targets
+# ------------------------------------
+def in_process_client():
+    from app import app
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://benchmark",
+        timeout=60.0
+    )
+
+
+def http_client(url, max_connections):
+    return httpx.AsyncClient(
+        base_url=url, timeout=60.0,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    )
+
+
+def start_uvicorn(port):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"]
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(600):
+        if server.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            if httpx.get(url + "/", timeout=1.0).status_code == 200:
+                return server, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("uvicorn did not become ready within 60s")
+
+
+async def run_scenarios(args, payloads):
+    levels = args.concurrency if args.load == "closed" else args.rate
+    max_connections = int(max(levels)) if args.load == "closed" else 1000
+
+    if args.url:
+        client = http_client(args.url, max_connections)
+    else:
+        client = in_process_client()
+
+    results = []
+    async with client:
+        for batch_size in args.batch_sizes:
+            bodies = request_bodies(payloads, batch_size)
+            rows_per_request = batch_size or 1
+
+            # Warm-up: connection set-up, model warm-up, lazily started workers
+            warm_latencies, warm_errors = [], []
+            for body in bodies[:args.warmup]:
+                await send(client, body, warm_latencies, warm_errors)
+
+            for level in levels:
+                if args.load == "closed":
+                    latencies, errors, elapsed = await run_closed(client, bodies, int(level), args.duration)
+                else:
+                    latencies, errors, elapsed = await run_open(client, bodies, float(level), args.duration)
+
+                result = {
+                    "endpoint": bodies[0][0],
+                    "batch_size": rows_per_request,
+                    "load": args.load,
+                    ("concurrency" if args.load == "closed" else "rate_rps"): level,
+                    **summarize(latencies, errors, elapsed, rows_per_request)
+                }
+                results.append(result)
+                print(
+                    f"{result['endpoint']:<22} batch={rows_per_request:<5} "
+                    f"{args.load}={level:<6} rps={result['throughput_rps']:<9} "
+                    f"p50={result['latency_ms']['p50']:<8} p95={result['latency_ms']['p95']:<8} "
+                    f"p99={result['latency_ms']['p99']:<8} errors={result['error_rate']:.2%}"
+                )
+    return results
+
+
+# ------------------------------------
+# Regression check
+# ------------------------------------
+def scenario_key(result):
+    return (result["endpoint"], result["batch_size"], result["load"],
+            result.get("concurrency", result.get("rate_rps")))
+
+
+def compare(results, baseline_path, tolerance):
+    """Print per-scenario changes; return the scenarios that regressed."""
+    with open(baseline_path) as handle:
+        baseline = {scenario_key(r): r for r in json.load(handle)["results"]}
+
+    regressions = []
+    for result in results:
+        before = baseline.get(scenario_key(result))
+        if before is None:
+            continue
+        p99_change = result["latency_ms"]["p99"] / max(before["latency_ms"]["p99"], 1e-9) - 1
+        rps_change = result["throughput_rps"] / max(before["throughput_rps"], 1e-9) - 1
+        print(f"{scenario_key(result)}: p99 {p99_change:+.1%}, throughput {rps_change:+.1%}")
+        if p99_change > tolerance or rps_change < -tolerance or result["error_rate"] > before["error_rate"]:
+            regressions.append(scenario_key(result))
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ------------------------------------
+# Main
+# ------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the PriceOptima API")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    target.add_argument("--uvicorn", action="store_true", help="Start a local uvicorn server for the run")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--load", choices=("closed", "open"), default="closed")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--rate", type=float, nargs="+", default=[100.0, 500.0])
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per scenario")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[0, 100])
+    parser.add_argument("--payloads", help="JSONL file of recorded /predict-price bodies")
+    parser.add_argument("--n-payloads", type=int, default=10_000, help="Synthetic payloads to generate")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative p99 / throughput change before failing --compare")
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.payloads) if args.payloads else synthetic_payloads(args.n_payloads)
+
+    server = None
+    if args.uvicorn:
+        server, args.url = start_uvicorn(args.port)
+    try:
+        results = asyncio.run(run_scenarios(args, payloads))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "target": args.url or "in-process",
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "payloads": args.payloads or f"synthetic:{len(payloads)}",
+        "results": results
+    }
+    with open(args.out, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"Regressions: {regressions}")
+            sys.exit(1)
@@ -0,0 +1,126 @@
+# ============================================================
+# CATALOG STREAMING (chunked CSV / NDJSON parsing for repricing)
+# ============================================================
+#
+# Turns an uploaded body (or a local file) with the columns of
+# milestone-1/combined_dataset.csv into fixed-size DataFrame chunks, so a
+# catalog of any size is repriced with bounded memory.
+
+import io
+import json
+
+import numpy as np
+import pandas as pd
+from starlette.responses import StreamingResponse
+
+# Columns needed to build the API's model inputs
+REQUIRED_COLUMNS = ["Date", "Price", "Stock Level"]
+
+# Identifier columns copied to every output row when present
+PASSTHROUGH_COLUMNS = ["Date", "Product ID", "Store ID"]
+
+
+def detect_format(content_type=None, path=None, explicit=None):
+    """'csv' or 'ndjson' from an explicit choice, a file extension or a content type."""
+    if explicit:
+        return explicit
+    if path is not None:
+        return "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+    content_type = (content_type or "").lower()
+    if "ndjson" in content_type or "jsonl" in content_type or "json" in content_type:
+        return "ndjson"
+    return "csv"
+
+
+async def iter_line_chunks(byte_stream, chunk_rows):
+    """
+    Group an async stream of bytes into lists of at most ``chunk_rows`` lines.
+
+    Only one partial line and one chunk of complete lines are buffered, so
+    memory does not grow with the size of the upload.
+    """
+    pending = b""
+    lines = []
+    async for block in byte_stream:
+        pending += block
+        *complete, pending = pending.split(b"\n")
+        for line in complete:
+            if line.strip():
+                lines.append(line.decode("utf-8"))
+                if len(lines) >= chunk_rows:
+                    yield lines
+                    lines = []
+    if pending.strip():
+        lines.append(pending.decode("utf-8"))
+    if lines:
+        yield lines
+
+
+def parse_lines(lines, fmt, header=None):
+    """Parse one chunk of text lines; CSV chunks reuse the header of the first one."""
+    if fmt == "ndjson":
+        return pd.DataFrame.from_records([json.loads(line) for line in lines])
+    return pd.read_csv(io.StringIO("\n".join([header] + lines)))
+
+
+def check_columns(frame):
+    missing = [col for col in REQUIRED_COLUMNS if col not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+
+
+def model_inputs(frame):
+    """
+    Derive the API's model inputs from dataset columns.
+
+    Returns (inputs dict of arrays, boolean mask of usable rows); rows with
+    an unparseable date or a missing price / stock level are masked out.
+    """
+    dates = pd.to_datetime(frame["Date"], errors="coerce")
+    price = pd.to_numeric(frame["Price"], errors="coerce").to_numpy(dtype=np.float64)
+    stock_level = pd.to_numeric(frame["Stock Level"], errors="coerce").to_numpy(dtype=np.float64)
+
+    valid = dates.notna().to_numpy() & ~np.isnan(price) & ~np.isnan(stock_level)
+    day_of_week = dates.dt.dayofweek.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    inputs = {
+        "price": price[valid],
+        "stock_level": stock_level[valid],
+        "day_of_week": day_of_week[valid],
+        "is_weekend": (day_of_week[valid] >= 5).astype(np.float64),
+        "month": dates.dt.month.to_numpy(dtype=np.float64, na_value=np.nan)[valid]
+    }
+    # Lets the feature store fill in each SKU's sales history
+    if "Product ID" in frame.columns and "Store ID" in frame.columns:
+        inputs["product_id"] = frame["Product ID"].to_numpy(dtype=object)[valid]
+        inputs["store_id"] = frame["Store ID"].to_numpy(dtype=object)[valid]
+    return inputs, valid
+
+
+def result_lines(frame, valid, predicted_demand, recommended_price, model_version):
+    """Render one chunk of results as NDJSON text (one object per usable row)."""
+    out = frame.loc[valid, [col for col in PASSTHROUGH_COLUMNS if col in frame.columns]].copy()
+    out["price"] = frame.loc[valid, "Price"].to_numpy(dtype=np.float64)
+    out["predicted_demand"] = np.round(predicted_demand, 2)
+    out["recommended_price"] = np.round(recommended_price, 2)
+    out["model_version"] = model_version
+    if out.empty:
+        return ""
+    return out.to_json(orient="records", lines=True, force_ascii=False).rstrip("\n") + "\n"
+
+
+class BodyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for generators that are still reading the request body.
+
+    On ASGI servers below spec 2.4 (uvicorn included) Starlette watches for
+    client disconnects by calling ``receive()`` in parallel, which would
+    swallow the body chunks the generator is waiting for. Here the
+    generator is the only consumer; a disconnect surfaces through the body
+    stream itself.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,283 @@
+# ============================================================
+# COMPILED TREE EVALUATOR (NumPy-only LightGBM inference)
+# ============================================================
+#
+# Flattens a trained LightGBM booster into contiguous arrays so the
+# pricing API can score rows without going through the
+# LGBMRegressor / sklearn wrapper on every request.
+#
+# Export:   python compiled_forest.py best_pricing_model.pkl best_pricing_model.npz
+
+import sys
+
+import numpy as np
+
+# LightGBM missing-value handling codes (see LightGBM tree.h)
+MISSING_NONE = 0
+MISSING_ZERO = 1
+MISSING_NAN = 2
+
+_MISSING_CODES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+
+# LightGBM treats |x| <= kZeroThreshold as zero
+ZERO_THRESHOLD = 1e-35
+
+# Objectives whose raw score is already the prediction
+IDENTITY_OBJECTIVES = ("regression", "regression_l1", "huber", "fair", "quantile", "mape")
+
+# One uint64 bitmask per node → at most 64 leaves per tree
+MAX_LEAVES = 64
+ALL_LEAVES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+# Rows evaluated together in predict(); bounds the (rows x nodes) work arrays
+ROW_CHUNK = 256
+
+
+class CompiledForest:
+    """
+    A booster stored as flat node arrays, evaluated with leaf bitmasks.
+
+    Each split node carries a mask of the leaves that stay reachable when
+    the split sends a row to the right, i.e. every leaf except those in
+    its left subtree. A row's exit leaf in a tree is the left-most leaf
+    that survives the AND of the masks of all splits it goes right on.
+    That turns tree walking into a handful of array operations over all
+    split nodes at once, with no per-node branching.
+
+    Categorical splits (models trained on integer-coded categoricals) are
+    stored as one row of a boolean table per split: ``cat_table[i, c]``
+    says whether category ``c`` goes left at split ``cat_node[i]``.
+    """
+
+    def __init__(self, feature, threshold, leaf_mask, missing_type,
+                 default_left, tree_start, leaf_value, leaf_offset,
+                 feature_names, average_output=False, cat_node=None, cat_table=None):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.leaf_mask = np.ascontiguousarray(leaf_mask, dtype=np.uint64)
+        self.missing_type = np.ascontiguousarray(missing_type, dtype=np.int8)
+        self.default_left = np.ascontiguousarray(default_left, dtype=bool)
+        self.tree_start = np.ascontiguousarray(tree_start, dtype=np.intp)
+        self.leaf_value = np.ascontiguousarray(leaf_value, dtype=np.float64)
+        self.leaf_offset = np.ascontiguousarray(leaf_offset, dtype=np.intp)
+        self.feature_names = list(feature_names)
+        self.average_output = bool(average_output)
+        self.cat_node = np.ascontiguousarray(
+            cat_node if cat_node is not None else np.empty(0), dtype=np.intp)
+        self.cat_table = np.ascontiguousarray(
+            cat_table if cat_table is not None else np.empty((0, 0)), dtype=bool)
+        self._cat_rows = np.arange(len(self.cat_node))
+
+        # Same attribute the sklearn estimator exposes, so app.py can use either
+        self.n_features_in_ = len(self.feature_names)
+        self.n_trees = len(self.tree_start)
+
+        # Fast path: with only "None" missing handling a NaN simply becomes 0
+        self._plain_splits = not np.any(self.missing_type != MISSING_NONE)
+
+    # ------------------------------------------------------------
+    # Export from LightGBM
+    # ------------------------------------------------------------
+    @classmethod
+    def from_lightgbm(cls, model):
+        """Compile an ``LGBMRegressor`` or a raw ``lightgbm.Booster``."""
+        booster = getattr(model, "booster_", model)
+        dump = booster.dump_model()
+
+        if dump.get("num_tree_per_iteration", 1) != 1:
+            raise ValueError("Only single-output boosters can be compiled")
+        objective = str(dump.get("objective", "regression")).split(" ")[0]
+        if objective not in IDENTITY_OBJECTIVES:
+            raise ValueError(f"Objective '{objective}' needs an output transform and is not supported")
+
+        feature, threshold, leaf_mask = [], [], []
+        missing_type, default_left = [], []
+        tree_start, leaf_value, leaf_offset = [], [], []
+        cat_node, cat_left = [], []
+
+        def add_node(split_feature, split_threshold, mask, missing, left_default):
+            feature.append(split_feature)
+            threshold.append(split_threshold)
+            leaf_mask.append(mask)
+            missing_type.append(missing)
+            default_left.append(left_default)
+
+        def compile_node(node, leaves):
+            """Pre-order over splits; returns the leaf numbers under ``node``."""
+            if "leaf_value" in node:
+                leaves.append(node["leaf_value"])
+                return [len(leaves) - 1]
+
+            idx = len(feature)
+            if node["decision_type"] == "==":
+                # Categories listed in the threshold ("1||3||5") go left;
+                # NaN, negative and unlisted values go right
+                cat_node.append(idx)
+                cat_left.append([int(value) for value in str(node["threshold"]).split("||")])
+                add_node(node["split_feature"], np.inf, 0, MISSING_NONE, False)
+            elif node["decision_type"] == "<=":
+                add_node(node["split_feature"], node["threshold"], 0,
+                         _MISSING_CODES[node["missing_type"]], node["default_left"])
+            else:
+                raise ValueError(f"Unsupported split type '{node['decision_type']}'")
+
+            left_leaves = compile_node(node["left_child"], leaves)
+            right_leaves = compile_node(node["right_child"], leaves)
+
+            mask = int(ALL_LEAVES)
+            for leaf in left_leaves:
+                mask &= ~(1 << leaf)
+            leaf_mask[idx] = mask
+            return left_leaves + right_leaves
+
+        for tree in dump["tree_info"]:
+            if tree["num_leaves"] > MAX_LEAVES:
+                raise ValueError(f"Trees with more than {MAX_LEAVES} leaves are not supported")
+
+            tree_start.append(len(feature))
+            leaf_offset.append(len(leaf_value))
+
+            leaves = []
+            compile_node(tree["tree_structure"], leaves)
+            if len(feature) == tree_start[-1]:
+                # Single-leaf tree: a split that never fires keeps leaf 0
+                add_node(0, np.inf, int(ALL_LEAVES), MISSING_NONE, True)
+            leaf_value.extend(leaves)
+
+        n_categories = max((max(left) for left in cat_left), default=-1) + 1
+        cat_table = np.zeros((len(cat_node), n_categories), dtype=bool)
+        for row, left in enumerate(cat_left):
+            cat_table[row, left] = True
+
+        return cls(
+            feature, threshold, leaf_mask, missing_type, default_left,
+            tree_start, leaf_value, leaf_offset, dump["feature_names"],
+            average_output=dump.get("average_output", False),
+            cat_node=cat_node, cat_table=cat_table
+        )
+
+    # ------------------------------------------------------------
+    # Save / Load (.npz, no LightGBM needed to read it back)
+    # ------------------------------------------------------------
+    def save(self, path):
+        np.savez(
+            path,
+            feature=self.feature,
+            threshold=self.threshold,
+            leaf_mask=self.leaf_mask,
+            missing_type=self.missing_type,
+            default_left=self.default_left,
+            tree_start=self.tree_start,
+            leaf_value=self.leaf_value,
+            leaf_offset=self.leaf_offset,
+            feature_names=np.array(self.feature_names),
+            average_output=np.array(self.average_output),
+            cat_node=self.cat_node,
+            cat_table=self.cat_table
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data["feature"], data["threshold"], data["leaf_mask"],
+                data["missing_type"], data["default_left"], data["tree_start"],
+                data["leaf_value"], data["leaf_offset"],
+                data["feature_names"].tolist(),
+                average_output=bool(data["average_output"]),
+                # Files exported before categorical support have neither
+                cat_node=data["cat_node"] if "cat_node" in data else None,
+                cat_table=data["cat_table"] if "cat_table" in data else None
+            )
+
+    # ------------------------------------------------------------
+    # Prediction
+    # ------------------------------------------------------------
+    def predict(self, X):
+        """Predict a (rows x features) matrix, or a single 1-D feature row."""
+        X = np.asarray(X, dtype=np.float64)
+        # On every path, the single row included: a row of another width was
+        # assembled for a different model and must never be scored
+        self._check_features(X)
+        if X.ndim == 1 or X.shape[0] == 1:
+            return np.array([self._score_row(X.ravel())])
+
+        out = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], ROW_CHUNK):
+            chunk = X[start:start + ROW_CHUNK]
+            go_right = self._go_right(chunk.take(self.feature, axis=1))
+            out[start:start + ROW_CHUNK] = self._leaf_sum(go_right, axis=1)
+        return out
+
+    def predict_row(self, x):
+        """Score one feature row."""
+        x = np.asarray(x, dtype=np.float64)
+        self._check_features(x)
+        return self._score_row(x)
+
+    def _check_features(self, X):
+        if X.ndim not in (1, 2) or X.shape[-1] != self.n_features_in_:
+            raise ValueError(f"Expected {self.n_features_in_} features, got shape {X.shape}")
+
+    def _score_row(self, x):
+        return self._leaf_sum(self._go_right(x.take(self.feature)), axis=0)
+
+    def _go_right(self, xv):
+        """Split decisions for feature values gathered per split node."""
+        go_right = self._numerical_go_right(xv)
+        if len(self.cat_node):
+            go_right[..., self.cat_node] = ~self._categorical_go_left(xv[..., self.cat_node])
+        return go_right
+
+    def _numerical_go_right(self, xv):
+        is_nan = np.isnan(xv)
+        if self._plain_splits:
+            if is_nan.any():
+                xv = np.where(is_nan, 0.0, xv)
+            return xv > self.threshold
+
+        # Full LightGBM NumericalDecision: NaN → 0 unless the split tracks NaN,
+        # and "missing" values follow the node's default direction
+        xv = np.where(is_nan & (self.missing_type != MISSING_NAN), 0.0, xv)
+        missing = (
+            ((self.missing_type == MISSING_ZERO) & (np.abs(xv) <= ZERO_THRESHOLD))
+            | ((self.missing_type == MISSING_NAN) & is_nan)
+        )
+        return np.where(missing, ~self.default_left, xv > self.threshold)
+
+    def _categorical_go_left(self, xc):
+        """LightGBM CategoricalDecision: the value is truncated to an int category."""
+        with np.errstate(invalid="ignore"):
+            category = np.trunc(xc)
+            known = (category >= 0) & (category < self.cat_table.shape[1])
+        category = np.where(known, category, 0).astype(np.intp)
+        return known & self.cat_table[self._cat_rows, category]
+
+    def _leaf_sum(self, go_right, axis):
+        masks = np.where(go_right, self.leaf_mask, ALL_LEAVES)
+        reachable = np.bitwise_and.reduceat(masks, self.tree_start, axis=axis)
+
+        # Index of the lowest set bit = left-most reachable leaf
+        lowest = reachable & (~reachable + np.uint64(1))
+        leaf = np.bitwise_count(lowest - np.uint64(1)).astype(np.intp)
+
+        raw = self.leaf_value.take(self.leaf_offset + leaf).sum(axis=axis)
+        if self.average_output:
+            return raw / self.n_trees
+        return raw
+
+
+# ------------------------------------------------------------
+# Command-line export
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    import joblib
+
+    source = sys.argv[1] if len(sys.argv) > 1 else "best_pricing_model.pkl"
+    target = sys.argv[2] if len(sys.argv) > 2 else source.rsplit(".", 1)[0] + ".npz"
+
+    forest = CompiledForest.from_lightgbm(joblib.load(source))
+    forest.save(target)
+
+    print(f"Compiled {forest.n_trees} trees ({len(forest.feature)} split nodes, "
+          f"{len(forest.leaf_value)} leaves) → {target}")
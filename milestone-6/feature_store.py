@@ -0,0 +1,503 @@
+# ============================================================
+# ONLINE FEATURE STORE (per-SKU lags and rolling statistics)
+# ============================================================
+#
+# milestone-3/feauture.py derives sales / price lags, rolling means and
+# demand volatility with whole-frame shift() / rolling() calls. Serving
+# needs the same numbers for one product at request time, so every
+# (Product ID, Store ID) keeps small ring buffers plus running sums:
+# adding an observation and reading the features are both O(1).
+#
+# Request-time differences from the offline pipeline:
+#   - history is kept per (product, store); feauture.py shifts the whole
+#     date-sorted frame
+#   - the row being priced has no Units Sold yet, so rolling windows,
+#     Revenue and the inventory ratios use the latest observed days
+#
+# Usage:
+#   python feature_store.py build ../milestone-1/combined_dataset.csv feature_store.pkl
+#   python feature_store.py show feature_store.pkl P0001 S001
+
+import argparse
+import datetime
+import os
+import pickle
+import threading
+
+import numpy as np
+
+SHORT_WINDOW = 7
+LONG_WINDOW = 30
+
+# Same constants as milestone-3/feauture.py
+COST_FACTOR = 0.7
+LOW_STOCK_LEVEL = 10
+OVERSTOCK_LEVEL = 4000
+FESTIVAL_MONTHS = (10, 11, 12)
+
+# pandas category codes of the season labels (alphabetical order)
+SEASON_CODE_BY_MONTH = np.array([
+    0,                  # unused (months are 1-12)
+    3, 3,               # Jan, Feb: Winter
+    2, 2, 2,            # Mar–May: Summer
+    0, 0, 0,            # Jun–Aug: Monsoon
+    1, 1, 1,            # Sep–Nov: Post-Monsoon
+    3                   # Dec: Winter
+])
+
+# Values read from the store for every requested row (0 for unknown SKUs)
+HISTORY_FIELDS = (
+    "product_code", "store_code", "avg_price", "cost", "next_day", "next_year",
+    "price_lag_1", "price_lag_7", "sales_lag_1", "sales_lag_7", "sales_lag_30",
+    "rolling_sales_7", "rolling_sales_30", "demand_volatility", "demand_pct_change"
+)
+
+
+class SkuHistory:
+    """Ring buffers and running sums for one (product, store) pair."""
+
+    __slots__ = (
+        "units", "prices", "count", "sum_short", "sumsq_short", "sum_long",
+        "last_date", "avg_price", "cost", "restock_date", "demand_pct_change"
+    )
+
+    def __init__(self):
+        self.units = [0.0] * LONG_WINDOW          # units[count % LONG_WINDOW] is the next slot
+        self.prices = [0.0] * (SHORT_WINDOW + 1)
+        self.count = 0
+        self.sum_short = 0.0
+        self.sumsq_short = 0.0
+        self.sum_long = 0.0
+        self.last_date = None
+        self.avg_price = 0.0
+        self.cost = 0.0
+        self.restock_date = None
+        self.demand_pct_change = 0.0
+
+    def units_ago(self, k):
+        """Units sold k observations back (1 = latest); 0 before the history starts."""
+        return self.units[(self.count - k) % LONG_WINDOW] if self.count >= k else 0.0
+
+    def price_ago(self, k):
+        return self.prices[(self.count - k) % (SHORT_WINDOW + 1)] if self.count >= k else 0.0
+
+    def add(self, units, price):
+        previous_units = self.units_ago(1)
+
+        # Drop the values leaving each window, then add the new one
+        if self.count >= SHORT_WINDOW:
+            leaving = self.units_ago(SHORT_WINDOW)
+            self.sum_short -= leaving
+            self.sumsq_short -= leaving * leaving
+        if self.count >= LONG_WINDOW:
+            self.sum_long -= self.units_ago(LONG_WINDOW)
+
+        self.units[self.count % LONG_WINDOW] = units
+        self.prices[self.count % (SHORT_WINDOW + 1)] = price
+        self.sum_short += units
+        self.sumsq_short += units * units
+        self.sum_long += units
+        self.count += 1
+
+        if self.count > 1 and previous_units != 0:
+            self.demand_pct_change = (units - previous_units) / previous_units
+        else:
+            self.demand_pct_change = 0.0
+
+    def values(self):
+        """Tuple in HISTORY_FIELDS order (without the category codes and static fields)."""
+        n_short = min(self.count, SHORT_WINDOW)
+        n_long = min(self.count, LONG_WINDOW)
+        if n_short > 1:
+            variance = (self.sumsq_short - self.sum_short * self.sum_short / n_short) / (n_short - 1)
+            volatility = float(np.sqrt(max(variance, 0.0)))
+        else:
+            volatility = 0.0
+        return (
+            self.price_ago(1), self.price_ago(SHORT_WINDOW),
+            self.units_ago(1), self.units_ago(SHORT_WINDOW), self.units_ago(LONG_WINDOW),
+            self.sum_short / n_short if n_short else 0.0,
+            self.sum_long / n_long if n_long else 0.0,
+            volatility, self.demand_pct_change
+        )
+
+
+class FeatureStore:
+    """In-memory feature history for every (Product ID, Store ID) seen."""
+
+    def __init__(self):
+        self._skus = {}
+        self._lock = threading.Lock()
+        # Category codes of the IDs: the model's training label order (see
+        # freeze_codes), else sorted unique IDs as milestone-3 assigns them.
+        # Existing codes never move; an ID seen later gets the next code.
+        self.product_codes = {}
+        self.store_codes = {}
+        # Bumped whenever a code map changes, so cached predictions can be dropped
+        self.codes_version = 0
+        self.observations = 0
+
+    def __len__(self):
+        return len(self._skus)
+
+    # ------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------
+    def observe(self, product_id, store_id, units_sold, price, date=None,
+                avg_price=None, cost=None, restock_date=None):
+        """Record one day of sales for a SKU (observations must arrive in date order)."""
+        with self._lock:
+            history = self._skus.get((product_id, store_id))
+            if history is None:
+                history = self._skus[(product_id, store_id)] = SkuHistory()
+                self._add_code(self.product_codes, product_id)
+                self._add_code(self.store_codes, store_id)
+
+            history.add(float(units_sold), float(price))
+            if date is not None:
+                history.last_date = date
+            if avg_price is not None:
+                history.avg_price = float(avg_price)
+            if cost is not None:
+                history.cost = float(cost)
+            if restock_date is not None:
+                history.restock_date = restock_date
+            self.observations += 1
+
+    def _add_code(self, codes, key):
+        if key not in codes:
+            codes[key] = len(codes)
+            self.codes_version += 1
+
+    def freeze_codes(self, product_labels=None, store_labels=None):
+        """
+        Code the IDs as a model was trained: label i of its schema gets code
+        i, IDs the model never saw follow in their current order. Returns
+        True when a code changed.
+        """
+        with self._lock:
+            changed = False
+            for codes, labels in ((self.product_codes, product_labels), (self.store_codes, store_labels)):
+                if labels is None:
+                    continue
+                frozen = {label: code for code, label in enumerate(labels)}
+                for key in sorted(codes, key=codes.get):
+                    frozen.setdefault(key, len(frozen))
+                if frozen != codes:
+                    codes.clear()
+                    codes.update(frozen)
+                    changed = True
+            if changed:
+                self.codes_version += 1
+            return changed
+
+    def bootstrap(self, csv_path):
+        """Replay a dataset with the columns of combined_dataset.csv in date order."""
+        import pandas as pd
+
+        df = pd.read_csv(csv_path)
+        df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+        df = df.dropna(subset=["Date"]).sort_values("Date", kind="mergesort")
+        optional = {
+            col: df[col].tolist() if col in df.columns else [None] * len(df)
+            for col in ("AvgPrice", "Cost", "Restock_Date")
+        }
+        # Codes in sorted ID order, as milestone-3 assigns them
+        with self._lock:
+            for product_id in sorted(df["Product ID"].unique().tolist()):
+                self._add_code(self.product_codes, product_id)
+            for store_id in sorted(df["Store ID"].unique().tolist()):
+                self._add_code(self.store_codes, store_id)
+        rows = zip(
+            df["Product ID"].tolist(), df["Store ID"].tolist(), df["Units Sold"].tolist(),
+            df["Price"].tolist(), df["Date"].dt.date.tolist(),
+            optional["AvgPrice"], optional["Cost"], optional["Restock_Date"]
+        )
+        for product_id, store_id, units, price, date, avg_price, cost, restock_date in rows:
+            self.observe(product_id, store_id, units, price, date, avg_price, cost, restock_date)
+
+    # ------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------
+    def version(self, product_id, store_id):
+        """Observation count of a SKU; changes whenever its features do."""
+        history = self._skus.get((product_id, store_id))
+        return history.count if history is not None else 0
+
+    def lookup(self, product_id, store_id):
+        """HISTORY_FIELDS values plus the restock date of one SKU (zeros if unknown)."""
+        with self._lock:
+            history = self._skus.get((product_id, store_id))
+            product_code = self.product_codes.get(product_id, -1)
+            store_code = self.store_codes.get(store_id, -1)
+            if history is None:
+                return (product_code, store_code) + (0.0,) * (len(HISTORY_FIELDS) - 2), None
+            if history.last_date is not None:
+                next_date = history.last_date + datetime.timedelta(days=1)
+                day, year = next_date.day, next_date.year
+            else:
+                day = year = 0
+            return (
+                (product_code, store_code, history.avg_price, history.cost, day, year)
+                + history.values(),
+                history.restock_date
+            )
+
+    # ------------------------------------------------------------
+    # Snapshot / restore
+    # ------------------------------------------------------------
+    def snapshot(self, path):
+        """Write the whole store to ``path`` (write-then-rename)."""
+        with self._lock:
+            state = {
+                "skus": self._skus,
+                "product_codes": self.product_codes,
+                "store_codes": self.store_codes,
+                "observations": self.observations
+            }
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as handle:
+                pickle.dump(state, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def restore(cls, path):
+        with open(path, "rb") as handle:
+            state = pickle.load(handle)
+        store = cls()
+        store._skus = state["skus"]
+        store.product_codes = state["product_codes"]
+        store.store_codes = state["store_codes"]
+        store.observations = state["observations"]
+        return store
+
+
+# ------------------------------------------------------------
+# Feature assembly by name
+# ------------------------------------------------------------
+class FeatureLayout:
+    """
+    Builds model input matrices by feature name.
+
+    Created once per model from its feature names (as LightGBM stores them,
+    spaces replaced by underscores); features the model does not use are
+    skipped and features nobody can supply stay 0.
+
+    ``categories`` (from the model's schema file) gives the labels of text
+    features a native-categorical model reads as integer codes.
+    """
+
+    def __init__(self, feature_names, categories=None):
+        self.feature_names = list(feature_names)
+        self.index = {name: i for i, name in enumerate(self.feature_names)}
+        self.n_features = len(self.feature_names)
+        labels = (categories or {}).get("elasticity_class", [])
+        # Code of each class label; an unknown label is missing (NaN)
+        self.elasticity_codes = {label: float(code) for code, label in enumerate(labels)}
+
+    def assemble(self, price, stock_level, day_of_week, is_weekend, month,
+                 product_id=None, store_id=None, store=None):
+        price = np.asarray(price, dtype=np.float64).reshape(-1)
+        n_rows = price.shape[0]
+        stock_level = np.broadcast_to(np.asarray(stock_level, dtype=np.float64), (n_rows,))
+        day_of_week = np.broadcast_to(np.asarray(day_of_week, dtype=np.float64), (n_rows,))
+        is_weekend = np.broadcast_to(np.asarray(is_weekend, dtype=np.float64), (n_rows,))
+        month = np.broadcast_to(np.asarray(month, dtype=np.float64), (n_rows,))
+
+        history, restock_dates, store_ids = self._history(n_rows, product_id, store_id, store)
+
+        columns = {
+            "Price": price,
+            "Stock_Level": stock_level,
+            "day_of_week": day_of_week,
+            "is_weekend": is_weekend,
+            "month": month,
+            "Product_ID": history["product_code"],
+            "Store_ID": history["store_code"],
+            "AvgPrice": history["avg_price"],
+            "Cost": history["cost"],
+            "day": history["next_day"],
+            "year": history["next_year"],
+        }
+        for name in ("price_lag_1", "price_lag_7", "sales_lag_1", "sales_lag_7", "sales_lag_30",
+                     "rolling_sales_7", "rolling_sales_30", "demand_volatility", "demand_pct_change"):
+            columns[name] = history[name]
+
+        month_index = np.clip(month, 0, 12).astype(np.intp)
+        columns["season"] = SEASON_CODE_BY_MONTH[month_index].astype(np.float64)
+        columns["is_festival"] = np.isin(month_index, FESTIVAL_MONTHS).astype(np.float64)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            price_change = np.where(
+                history["price_lag_1"] != 0, (price - history["price_lag_1"]) / history["price_lag_1"], 0.0
+            )
+            elasticity = np.where(price_change != 0, history["demand_pct_change"] / price_change, 0.0)
+            profit_margin = np.where(price != 0, (price - price * COST_FACTOR) / price, 0.0)
+        columns["price_change_pct"] = price_change
+        columns["price_pct_change"] = price_change
+        columns["discount_pct"] = np.clip(price_change, -1, 1)
+        columns["price_elasticity"] = elasticity
+        columns["elasticity_class_Medium_Elastic"] = ((elasticity > -1) & (elasticity <= -0.3)).astype(np.float64)
+        columns["elasticity_class_Low_Elastic"] = (elasticity > -0.3).astype(np.float64)
+        if self.elasticity_codes:
+            columns["elasticity_class"] = np.select(
+                [elasticity <= -1, elasticity <= -0.3],
+                [self._elasticity_code("High Elastic"), self._elasticity_code("Medium Elastic")],
+                self._elasticity_code("Low Elastic")
+            )
+
+        # Today's units are what we predict, so use the latest observed demand
+        columns["Revenue"] = price * history["rolling_sales_7"]
+        columns["inventory_ratio"] = stock_level / (history["sales_lag_1"] + 1)
+        columns["days_to_stockout"] = stock_level / (history["rolling_sales_7"] + 1)
+        columns["low_stock_flag"] = (stock_level <= LOW_STOCK_LEVEL).astype(np.float64)
+        columns["overstock_flag"] = (stock_level > OVERSTOCK_LEVEL).astype(np.float64)
+
+        columns["cost_price"] = price * COST_FACTOR
+        columns["profit_per_unit"] = price - columns["cost_price"]
+        columns["profit_margin"] = profit_margin
+        columns["weekend_price_interaction"] = is_weekend * price
+        columns["season_discount_interaction"] = columns["is_festival"] * columns["discount_pct"]
+        columns["inventory_price_interaction"] = columns["inventory_ratio"] * price
+
+        full_features = np.zeros((n_rows, self.n_features))
+        for name, values in columns.items():
+            position = self.index.get(name)
+            if position is not None:
+                full_features[:, position] = values
+
+        # One-hot columns from pd.get_dummies(drop_first=True)
+        for prefix, keys in (("Warehouse/Store_ID_", store_ids), ("Restock_Date_", restock_dates)):
+            if keys is None:
+                continue
+            for row, key in enumerate(keys):
+                position = self.index.get(f"{prefix}{key}") if key is not None else None
+                if position is not None:
+                    full_features[row, position] = 1.0
+        return full_features
+
+    def assemble_one(self, price, stock_level, day_of_week, is_weekend, month,
+                     product_id=None, store_id=None, store=None):
+        """
+        Same features as assemble() for a single request, in plain Python.
+
+        Thirty-odd NumPy calls on length-1 arrays cost more than the compiled
+        model itself, so the single-row endpoint takes this path.
+        """
+        if store is not None and product_id is not None and store_id is not None:
+            values, restock_date = store.lookup(product_id, store_id)
+        else:
+            values, restock_date, store_id = (0.0,) * len(HISTORY_FIELDS), None, None
+        history = dict(zip(HISTORY_FIELDS, values))
+        price, stock_level = float(price), float(stock_level)
+        month_index = min(max(int(month), 0), 12)
+
+        price_lag_1 = history["price_lag_1"]
+        price_change = (price - price_lag_1) / price_lag_1 if price_lag_1 != 0 else 0.0
+        elasticity = history["demand_pct_change"] / price_change if price_change != 0 else 0.0
+        discount = min(max(price_change, -1.0), 1.0)
+        is_festival = float(month_index in FESTIVAL_MONTHS)
+        inventory_ratio = stock_level / (history["sales_lag_1"] + 1)
+        cost_price = price * COST_FACTOR
+
+        columns = {
+            "Price": price,
+            "Stock_Level": stock_level,
+            "day_of_week": day_of_week,
+            "is_weekend": is_weekend,
+            "month": month,
+            "Product_ID": history["product_code"],
+            "Store_ID": history["store_code"],
+            "AvgPrice": history["avg_price"],
+            "Cost": history["cost"],
+            "day": history["next_day"],
+            "year": history["next_year"],
+            "season": float(SEASON_CODE_BY_MONTH[month_index]),
+            "is_festival": is_festival,
+            "price_change_pct": price_change,
+            "price_pct_change": price_change,
+            "discount_pct": discount,
+            "price_elasticity": elasticity,
+            "elasticity_class_Medium_Elastic": float(-1 < elasticity <= -0.3),
+            "elasticity_class_Low_Elastic": float(elasticity > -0.3),
+            "elasticity_class": self._elasticity_code(
+                "High Elastic" if elasticity <= -1 else "Medium Elastic" if elasticity <= -0.3 else "Low Elastic"
+            ),
+            "Revenue": price * history["rolling_sales_7"],
+            "inventory_ratio": inventory_ratio,
+            "days_to_stockout": stock_level / (history["rolling_sales_7"] + 1),
+            "low_stock_flag": float(stock_level <= LOW_STOCK_LEVEL),
+            "overstock_flag": float(stock_level > OVERSTOCK_LEVEL),
+            "cost_price": cost_price,
+            "profit_per_unit": price - cost_price,
+            "profit_margin": (price - cost_price) / price if price != 0 else 0.0,
+            "weekend_price_interaction": is_weekend * price,
+            "season_discount_interaction": is_festival * discount,
+            "inventory_price_interaction": inventory_ratio * price,
+            f"Warehouse/Store_ID_{store_id}": 1.0,
+            f"Restock_Date_{restock_date}": 1.0,
+        }
+        for name in ("price_lag_1", "price_lag_7", "sales_lag_1", "sales_lag_7", "sales_lag_30",
+                     "rolling_sales_7", "rolling_sales_30", "demand_volatility", "demand_pct_change"):
+            columns[name] = history[name]
+
+        row = [0.0] * self.n_features
+        index = self.index
+        for name, value in columns.items():
+            position = index.get(name)
+            if position is not None:
+                row[position] = value
+        return np.array([row])
+
+    def _elasticity_code(self, label):
+        return self.elasticity_codes.get(label, np.nan)
+
+    @staticmethod
+    def _history(n_rows, product_id, store_id, store):
+        """Per-row store values; each distinct SKU is looked up once."""
+        if store is None or product_id is None or store_id is None:
+            zeros = np.zeros(n_rows)
+            return {field: zeros for field in HISTORY_FIELDS}, None, None
+
+        product_id = np.broadcast_to(np.asarray(product_id, dtype=object), (n_rows,))
+        store_id = np.broadcast_to(np.asarray(store_id, dtype=object), (n_rows,))
+        skus = {}
+        inverse = np.empty(n_rows, dtype=np.intp)
+        for row, key in enumerate(zip(product_id.tolist(), store_id.tolist())):
+            inverse[row] = skus.setdefault(key, len(skus))
+
+        looked_up = [store.lookup(*key) for key in skus]
+        table = np.array([values for values, _ in looked_up], dtype=np.float64)[inverse]
+        restock = [looked_up[i][1] for i in inverse]
+        history = {field: table[:, i] for i, field in enumerate(HISTORY_FIELDS)}
+        return history, restock, store_id.tolist()
+
+
+# ------------------------------------------------------------
+# Command line
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or inspect a PriceOptima feature store snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_cmd = commands.add_parser("build", help="Replay a dataset into a new snapshot")
+    build_cmd.add_argument("csv_path")
+    build_cmd.add_argument("snapshot_path")
+
+    show_cmd = commands.add_parser("show", help="Print the features of one SKU")
+    show_cmd.add_argument("snapshot_path")
+    show_cmd.add_argument("product_id")
+    show_cmd.add_argument("store_id")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        feature_store = FeatureStore()
+        feature_store.bootstrap(args.csv_path)
+        feature_store.snapshot(args.snapshot_path)
+        print(f"{feature_store.observations} observations, {len(feature_store)} SKUs -> {args.snapshot_path}")
+    else:
+        feature_store = FeatureStore.restore(args.snapshot_path)
+        values, restock_date = feature_store.lookup(args.product_id, args.store_id)
+        for field, value in zip(HISTORY_FIELDS, values):
+            print(f"{field:<20} {value}")
+        print(f"{'restock_date':<20} {restock_date}")
@@ -0,0 +1,150 @@
+# ============================================================
+# INFERENCE EXECUTOR (thread pool or preloaded process pool)
+# ============================================================
+#
+# "thread"  – predictions run in a thread pool inside the server process
+#             (LightGBM releases the GIL while it walks the trees).
+# "process" – a pool of worker processes, each holding the model. On
+#             Linux the workers are forked after the model is loaded, so
+#             its arrays are shared copy-on-write instead of being loaded
+#             once per worker. Large batches are split across workers.
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+# Model held by a worker process (set before fork, or by the initializer)
+_worker_handle = None
+
+
+def _init_worker(handle):
+    global _worker_handle
+    if handle is not None:
+        _worker_handle = handle
+    # Every worker is one core's worth of compute; LightGBM must not fan out again
+    _worker_handle.num_threads = 1
+
+
+def _predict_in_worker(rows):
+    return _worker_handle.predict(rows), _worker_handle.version
+
+
+class InferenceExecutor:
+    """Runs model predictions off the event loop."""
+
+    MODES = ("thread", "process")
+
+    def __init__(self, mode="thread", workers=None, min_rows_per_task=2048):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown inference mode '{mode}', expected one of {self.MODES}")
+        self.mode = mode
+        self.workers = int(workers or os.cpu_count() or 1)
+        self.min_rows_per_task = int(min_rows_per_task)
+
+        self.handle = None
+        self._pool = None
+        self.pool_generation = 0
+
+        self.tasks = 0
+        self.rows = 0
+        self.busy_seconds = 0.0
+
+    # ------------------------------------------------------------
+    # Model / pool lifecycle
+    # ------------------------------------------------------------
+    def set_model(self, handle):
+        """Serve ``handle``; in process mode this starts a fresh, warmed-up pool."""
+        if self.mode == "thread":
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="inference")
+            self.handle = handle
+            return
+
+        global _worker_handle
+        if "fork" in multiprocessing.get_all_start_methods():
+            # Workers inherit the loaded model: nothing to pickle or reload
+            _worker_handle = handle
+            pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_worker, initargs=(None,)
+            )
+        else:
+            pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(handle,)
+            )
+
+        # Start every worker now (and warm it) instead of on the first request
+        sample = np.zeros((2, handle.n_features_in_))
+        for future in [pool.submit(_predict_in_worker, sample) for _ in range(self.workers)]:
+            future.result()
+
+        old_pool, self._pool, self.handle = self._pool, pool, handle
+        self.pool_generation += 1
+        if old_pool is not None:
+            # Requests already queued on the old pool still finish on the old model
+            old_pool.shutdown(wait=False)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # ------------------------------------------------------------
+    # Prediction
+    # ------------------------------------------------------------
+    async def predict(self, rows, handle=None):
+        """
+        Predicted demand for a feature matrix, plus the model version used.
+
+        ``handle`` is the model the rows were assembled for (default: the
+        one being served). Rows are only ever scored by that model: if a
+        swap has replaced it, they are scored in a thread instead of by the
+        new model's workers.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        handle = handle or self.handle
+
+        if self.mode == "thread":
+            predictions = await loop.run_in_executor(self._pool, handle.predict, rows)
+        else:
+            predictions = None
+            if handle is self.handle:
+                n_tasks = min(self.workers, max(1, len(rows) // self.min_rows_per_task))
+                chunks = np.array_split(rows, n_tasks)
+                try:
+                    parts = await self._gather(loop, self._pool, chunks)
+                except RuntimeError:
+                    # The pool was retired by a model swap between lookup and submit
+                    parts = []
+                if parts and all(version == handle.version for _, version in parts):
+                    predictions = np.concatenate([part for part, _ in parts])
+            if predictions is None:
+                predictions = await loop.run_in_executor(None, handle.predict, rows)
+        version = handle.version
+
+        self.tasks += 1
+        self.rows += len(rows)
+        self.busy_seconds += time.perf_counter() - started
+        return predictions, version
+
+    @staticmethod
+    def _gather(loop, pool, chunks):
+        return asyncio.gather(*[
+            loop.run_in_executor(pool, _predict_in_worker, chunk) for chunk in chunks
+        ])
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "pool_generation": self.pool_generation,
+            "tasks": self.tasks,
+            "rows": self.rows,
+            "busy_seconds": round(self.busy_seconds, 6)
+        }
@@ -0,0 +1,146 @@
+# ============================================================
+# LIGHTWEIGHT METRICS (Prometheus text exposition format)
+# ============================================================
+#
+# Counters and histograms are plain Python lists guarded by a lock.
+# Call sites keep the labelled child from .labels(...) so recording one
+# observation is a bisect plus two additions (well under a microsecond),
+# and the instrumentation can stay on in production.
+
+import os
+import threading
+from bisect import bisect_left
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+# Latency buckets in seconds: 50us … 5s
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+# Predicted demand buckets (units sold); 50 and 200 are the pricing-rule thresholds
+DEMAND_BUCKETS = (0, 10, 25, 50, 100, 150, 200, 300, 500, 1000)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class _Child:
+    """One labelled series; hold on to it to skip the label lookup per call."""
+
+    def __init__(self, metric, series):
+        self._metric = metric
+        self._series = series
+
+    def inc(self, amount=1):
+        with self._metric._lock:
+            self._series[0] += amount
+
+    def observe(self, value):
+        index = bisect_left(self._metric.buckets, value)
+        with self._metric._lock:
+            self._series[index] += 1
+            self._series[-1] += value
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._series = {}   # labels -> [value]
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [0])
+        return _Child(self, series)
+
+    def inc(self, amount=1, **labels):
+        self.labels(**labels).inc(amount)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, series in sorted(self._series.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {series[0]}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}   # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+        return _Child(self, series)
+
+    def observe(self, value, **labels):
+        self.labels(**labels).observe(value)
+
+    def observe_many(self, values, **labels):
+        """Record a whole array at once (vectorized bucket counting)."""
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        counts = np.bincount(
+            np.searchsorted(self.buckets, values, side="left"),
+            minlength=len(self.buckets) + 1
+        )
+        series = self.labels(**labels)._series
+        with self._lock:
+            for index, count in enumerate(counts.tolist()):
+                series[index] += count
+            series[-1] += float(values.sum())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', repr(float(bound))),))} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+def gauge_lines(name, help_text, samples):
+    """Render a gauge from (labels dict, value) pairs collected at scrape time."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {value}")
+    return lines
+
+
+def counter_lines(name, help_text, value):
+    """Render a single-value counter whose total is kept elsewhere (e.g. the cache)."""
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {value}"]
+
+
+def process_rss_bytes():
+    """Current resident set size (Linux), or peak RSS where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        if resource is None:
+            return 0
+        # ru_maxrss is in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
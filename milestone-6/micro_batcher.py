@@ -0,0 +1,156 @@
+# ============================================================
+# MICRO-BATCHING SCHEDULER (coalesce concurrent single-row requests)
+# ============================================================
+
+import asyncio
+import time
+
+import numpy as np
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the micro-batch queue is at its configured depth."""
+
+
+class MicroBatcher:
+    """
+    Queues single requests and scores them together.
+
+    A batch is flushed when it reaches ``max_batch_size`` requests or when
+    the oldest one has waited ``max_wait_ms``, whichever comes first.
+    ``predict_fn`` is a coroutine function taking the list of queued
+    requests and returning one result per request; it builds the model
+    inputs at flush time, for the model that will score them, and should
+    hand the model call to an executor so the event loop keeps accepting
+    requests while a batch is being predicted. Requests arriving in the
+    meantime simply make the next batch larger.
+    """
+
+    # Upper bounds of the batch-size histogram buckets
+    SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=2.0, max_queue_depth=1024):
+        self.predict_fn = predict_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = float(max_wait_ms) / 1000.0
+        self.max_queue_depth = int(max_queue_depth)
+
+        self._loop = None
+        self._queue = None
+        self._worker = None
+
+        self.batches = 0
+        self.rows = 0
+        self.rejected = 0
+        self.errors = 0
+        self.max_depth_seen = 0
+        self.queue_wait_seconds = 0.0
+        self.predict_seconds = 0.0
+        self.size_counts = [0] * (len(self.SIZE_BUCKETS) + 1)
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue_depth)
+            self._worker = loop.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    # ------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------
+    async def submit(self, request):
+        """Queue one request (whatever ``predict_fn`` expects) and wait for its prediction."""
+        self._ensure_started()
+
+        future = self._loop.create_future()
+        try:
+            self._queue.put_nowait((request, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFullError("Prediction queue is full, try again shortly") from None
+
+        self.max_depth_seen = max(self.max_depth_seen, self._queue.qsize())
+        return await future
+
+    async def _run(self):
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            deadline = self._loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                # Take whatever is already queued before waiting for more
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        started = time.perf_counter()
+        try:
+            predictions = await self.predict_fn([request for request, _, _ in batch])
+            if len(predictions) != len(batch):
+                raise ValueError(f"{len(predictions)} predictions for {len(batch)} requests")
+        except Exception as exc:
+            # Every waiting request gets the error; the worker keeps running
+            self.errors += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finished = time.perf_counter()
+
+        self.batches += 1
+        self.rows += len(batch)
+        self.predict_seconds += finished - started
+        self.size_counts[np.searchsorted(self.SIZE_BUCKETS, len(batch))] += 1
+
+        for (_, future, queued_at), prediction in zip(batch, predictions):
+            self.queue_wait_seconds += started - queued_at
+            # A caller that disconnected leaves a cancelled future behind
+            if not future.done():
+                future.set_result(prediction)
+
+    # ------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------
+    def stats(self):
+        size_histogram = {
+            f"<={bound}": count for bound, count in zip(self.SIZE_BUCKETS, self.size_counts)
+        }
+        size_histogram[f">{self.SIZE_BUCKETS[-1]}"] = self.size_counts[-1]
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_queue_depth": self.max_queue_depth,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth_seen": self.max_depth_seen,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "mean_queue_wait_ms": round(self.queue_wait_seconds / self.rows * 1000.0, 3) if self.rows else 0.0,
+            "mean_predict_ms": round(self.predict_seconds / self.batches * 1000.0, 3) if self.batches else 0.0,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "batch_size_histogram": size_histogram
+        }
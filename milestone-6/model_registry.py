@@ -0,0 +1,257 @@
+# ============================================================
+# MODEL REGISTRY (versioned artifacts + manifest)
+# ============================================================
+#
+# Layout:
+#   models/
+#     manifest.json          active version, rollback history, version list
+#     v1/model.pkl           trained LGBMRegressor (joblib)
+#     v1/model.npz           compiled trees (see compiled_forest.py)
+#     v1/schema.json         input schema written by model.py (when present)
+#
+# Usage:
+#   python model_registry.py publish ../milestone-5/best_pricing_model.pkl --activate
+#   python model_registry.py list
+#   python model_registry.py activate v1
+#   python model_registry.py rollback
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import shutil
+
+import joblib
+
+from compiled_forest import CompiledForest
+from feature_store import FeatureLayout
+
+MANIFEST_NAME = "manifest.json"
+
+
+# ------------------------------------------------------------
+# Loaded model (what the API actually serves)
+# ------------------------------------------------------------
+class ModelHandle:
+    """
+    One loaded model version.
+
+    Single rows (up to ``compiled_max_rows``) are scored by the compiled
+    NumPy trees; larger batches call the LightGBM booster directly, which
+    skips the sklearn input checks.
+    """
+
+    def __init__(self, version, estimator, compiled, compiled_max_rows=1, schema=None):
+        self.version = version
+        self.estimator = estimator
+        self.compiled = compiled
+        self.compiled_max_rows = compiled_max_rows
+        self.n_features_in_ = compiled.n_features_in_
+        self.schema = schema
+        self.layout = FeatureLayout(compiled.feature_names, (schema or {}).get("categories"))
+        self.num_threads = 0   # LightGBM threads per predict call (0 = library default)
+        self.loaded_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    def predict(self, full_features):
+        """Predicted demand for every row of a feature matrix."""
+        if self.estimator is None or full_features.shape[0] <= self.compiled_max_rows:
+            return self.compiled.predict(full_features)
+        if self.num_threads:
+            return self.estimator.booster_.predict(full_features, num_threads=self.num_threads)
+        return self.estimator.booster_.predict(full_features)
+
+
+def load_artifacts(model_path, compiled_path):
+    """Return (estimator or None, compiled forest) for a pair of artifact paths."""
+    estimator = joblib.load(model_path) if os.path.exists(model_path) else None
+
+    # Prefer an exported .npz unless the pickle was retrained after it
+    if os.path.exists(compiled_path) and (
+        estimator is None
+        or os.path.getmtime(compiled_path) >= os.path.getmtime(model_path)
+    ):
+        return estimator, CompiledForest.load(compiled_path)
+
+    if estimator is None:
+        raise FileNotFoundError(f"No model found at {model_path} or {compiled_path}")
+    return estimator, CompiledForest.from_lightgbm(estimator)
+
+
+def schema_path_for(model_path):
+    """Schema file model.py writes next to a trained model."""
+    return os.path.splitext(model_path)[0] + ".schema.json"
+
+
+def load_schema(path):
+    """The input schema at ``path``, or None (models trained before schemas existed)."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ------------------------------------------------------------
+# Registry
+# ------------------------------------------------------------
+class ModelRegistry:
+    """Versioned model artifacts under one directory, described by manifest.json."""
+
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def manifest_mtime(self):
+        return os.stat(self.manifest_path).st_mtime_ns if self.exists() else None
+
+    def read_manifest(self):
+        if not self.exists():
+            return {"active": None, "history": [], "versions": {}}
+        with open(self.manifest_path) as handle:
+            return json.load(handle)
+
+    def _write_manifest(self, manifest):
+        # Write-then-rename so readers never see a half-written manifest
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as handle:
+            json.dump(manifest, handle, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def active_version(self):
+        return self.read_manifest()["active"]
+
+    def artifact_paths(self, version):
+        entry = self.read_manifest()["versions"].get(version)
+        if entry is None:
+            raise KeyError(f"Unknown model version '{version}'")
+        return (
+            os.path.join(self.root, entry["model"]),
+            os.path.join(self.root, entry["compiled"])
+        )
+
+    def schema_path(self, version):
+        entry = self.read_manifest()["versions"].get(version)
+        if entry is None:
+            raise KeyError(f"Unknown model version '{version}'")
+        return os.path.join(self.root, entry["schema"]) if entry.get("schema") else None
+
+    # ------------------------------------------------------------
+    # Publishing & activation
+    # ------------------------------------------------------------
+    def publish(self, source_path, version=None, activate=False, note=""):
+        """Copy a trained model into the registry as a new version."""
+        manifest = self.read_manifest()
+        if version is None:
+            version = f"v{len(manifest['versions']) + 1}"
+            while version in manifest["versions"]:
+                version = f"v{int(version[1:]) + 1}"
+        if version in manifest["versions"]:
+            raise ValueError(f"Model version '{version}' already exists")
+
+        version_dir = os.path.join(self.root, version)
+        os.makedirs(version_dir)
+        model_file = os.path.join(version, "model.pkl")
+        compiled_file = os.path.join(version, "model.npz")
+
+        shutil.copy2(source_path, os.path.join(self.root, model_file))
+        CompiledForest.from_lightgbm(joblib.load(source_path)).save(
+            os.path.join(self.root, compiled_file)
+        )
+
+        schema_file = None
+        if os.path.exists(schema_path_for(source_path)):
+            schema_file = os.path.join(version, "schema.json")
+            shutil.copy2(schema_path_for(source_path), os.path.join(self.root, schema_file))
+
+        manifest["versions"][version] = {
+            "model": model_file,
+            "compiled": compiled_file,
+            "schema": schema_file,
+            "sha256": file_sha256(source_path),
+            "source": os.path.abspath(source_path),
+            "published_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "note": note
+        }
+        self._write_manifest(manifest)
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        manifest = self.read_manifest()
+        if version not in manifest["versions"]:
+            raise KeyError(f"Unknown model version '{version}'")
+        if manifest["active"] not in (None, version):
+            manifest["history"].append(manifest["active"])
+        manifest["active"] = version
+        self._write_manifest(manifest)
+
+    def rollback(self):
+        """Re-activate the previously active version."""
+        manifest = self.read_manifest()
+        if not manifest["history"]:
+            raise ValueError("No previous model version to roll back to")
+        manifest["active"] = manifest["history"].pop()
+        self._write_manifest(manifest)
+        return manifest["active"]
+
+    def load(self, version=None, compiled_max_rows=1):
+        """Load a version (default: the active one) as a ModelHandle."""
+        version = version or self.active_version()
+        if version is None:
+            raise ValueError("The model registry has no active version")
+        estimator, compiled = load_artifacts(*self.artifact_paths(version))
+        schema = load_schema(self.schema_path(version))
+        return ModelHandle(version, estimator, compiled, compiled_max_rows, schema)
+
+
+# ------------------------------------------------------------
+# Command line
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage PriceOptima model versions")
+    parser.add_argument("--root", default=os.environ.get("PRICEOPTIMA_MODEL_REGISTRY", "models"))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    publish_cmd = commands.add_parser("publish", help="Add a trained .pkl as a new version")
+    publish_cmd.add_argument("model_path")
+    publish_cmd.add_argument("--version")
+    publish_cmd.add_argument("--note", default="")
+    publish_cmd.add_argument("--activate", action="store_true")
+
+    commands.add_parser("list", help="Show versions and the active one")
+
+    activate_cmd = commands.add_parser("activate", help="Make a version active")
+    activate_cmd.add_argument("version")
+
+    commands.add_parser("rollback", help="Re-activate the previous version")
+
+    args = parser.parse_args()
+    registry = ModelRegistry(args.root)
+
+    if args.command == "publish":
+        version = registry.publish(args.model_path, args.version, args.activate, args.note)
+        print(f"Published {version}" + (" (active)" if args.activate else ""))
+    elif args.command == "list":
+        manifest = registry.read_manifest()
+        for version, entry in manifest["versions"].items():
+            marker = "*" if version == manifest["active"] else " "
+            print(f"{marker} {version}  {entry['published_at']}  {entry['sha256'][:12]}  {entry['note']}")
+    elif args.command == "activate":
+        registry.activate(args.version)
+        print(f"Active version: {args.version}")
+    elif args.command == "rollback":
+        print(f"Rolled back to {registry.rollback()}")
@@ -0,0 +1,125 @@
+# ============================================================
+# PREDICTION CACHE (bounded LRU + TTL for repeated pricing queries)
+# ============================================================
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    In-process cache of predicted demand, keyed by (quantized) pricing input.
+
+    * ``max_size`` bounds the number of entries; the least recently used
+      entry is evicted first. ``max_size=0`` disables caching.
+    * ``ttl_seconds`` expires entries even if they are still being hit.
+    * ``price_step`` / ``stock_level_step`` snap inputs to a grid so that
+      near-identical queries share an entry (0 = exact values only).
+    * ``bind(model_token)`` drops every entry when the serving model changes.
+    """
+
+    def __init__(self, max_size=10_000, ttl_seconds=300.0,
+                 price_step=0.0, stock_level_step=0):
+        self.max_size = int(max_size)
+        self.ttl_seconds = float(ttl_seconds)
+        self.price_step = float(price_step)
+        self.stock_level_step = int(stock_level_step)
+
+        self._entries = OrderedDict()   # key -> (predicted_demand, expires_at)
+        self._lock = threading.Lock()   # sync endpoints run in a threadpool
+        self.model_token = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    # ------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------
+    def quantize(self, price, stock_level):
+        """Snap price / stock level to the configured grid."""
+        if self.price_step > 0:
+            price = round(round(price / self.price_step) * self.price_step, 10)
+        if self.stock_level_step > 0:
+            stock_level = int(round(stock_level / self.stock_level_step) * self.stock_level_step)
+        return price, stock_level
+
+    def make_key(self, price, stock_level, day_of_week, is_weekend, month, *context):
+        """Cache key; ``context`` holds anything else the prediction depends on."""
+        price, stock_level = self.quantize(price, stock_level)
+        return (price, stock_level, day_of_week, is_weekend, month) + context
+
+    # ------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------
+    def get(self, key):
+        """Cached predicted demand for ``key``, or None."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # ------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def bind(self, model_token):
+        """Tie the cache to a model; entries from any other model are dropped."""
+        if model_token != self.model_token:
+            if self.model_token is not None:
+                self.clear()
+            self.model_token = model_token
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "price_step": self.price_step,
+            "stock_level_step": self.stock_level_step,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "model_token": self.model_token
+        }
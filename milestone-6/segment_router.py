@@ -0,0 +1,141 @@
+# ============================================================
+# SEGMENT ROUTER (per-store / per-product / size-bucket models)
+# ============================================================
+#
+# milestone-5/model.py --segment-by writes a family of segment models
+# plus segments.json, which maps each row's key (its Product ID and / or
+# Store ID as sent in the request) to a segment. The router sends every
+# row to its segment's model and every other row (no IDs, unseen SKU,
+# segment without a model) to the global model.
+#
+# Segment models are loaded on first use. At most ``max_loaded`` stay in
+# memory; the least recently used one is dropped when another is needed.
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from model_registry import ModelHandle, load_artifacts, load_schema
+
+MANIFEST_NAME = "segments.json"
+
+# Rows that no segment model covers
+GLOBAL = ""
+
+
+class SegmentRouter:
+    """Routes rows to lazily loaded segment models, with LRU eviction."""
+
+    def __init__(self, segments_dir, max_loaded=8, compiled_max_rows=1):
+        self.segments_dir = segments_dir
+        self.manifest_path = os.path.join(segments_dir, MANIFEST_NAME)
+        with open(self.manifest_path, "rb") as handle:
+            raw = handle.read()
+        manifest = json.loads(raw)
+        self.manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+        self.version = "segments-" + hashlib.sha1(raw).hexdigest()[:10]
+
+        self.segment_by = manifest["segment_by"]
+        self.key_columns = manifest["key_columns"]
+        self.assignment = manifest["assignment"]
+        self.segments = manifest["segments"]
+        self.max_loaded = max(int(max_loaded), 1)
+        self.compiled_max_rows = compiled_max_rows
+
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    @classmethod
+    def open(cls, segments_dir, max_loaded=8, compiled_max_rows=1):
+        """A router for ``segments_dir``, or None when no segment models were trained there."""
+        if not segments_dir or not os.path.exists(os.path.join(segments_dir, MANIFEST_NAME)):
+            return None
+        return cls(segments_dir, max_loaded, compiled_max_rows)
+
+    def is_stale(self):
+        """True once segments.json was rewritten (or removed) since this router read it."""
+        try:
+            return os.stat(self.manifest_path).st_mtime_ns != self.manifest_mtime
+        except OSError:
+            return True
+
+    # ------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------
+    def _key(self, product_id, store_id):
+        ids = {"Product ID": product_id, "Store ID": store_id}
+        return "|".join(str(ids[col]) for col in self.key_columns)
+
+    def segment_one(self, product_id, store_id):
+        """Segment of one request (GLOBAL without IDs or for an unrouted SKU)."""
+        if product_id is None or store_id is None:
+            return GLOBAL
+        return self.assignment.get(self._key(product_id, store_id), GLOBAL)
+
+    def segment_rows(self, n_rows, product_id, store_id):
+        """Segment name of every row; each distinct SKU is looked up once."""
+        if product_id is None or store_id is None:
+            return np.full(n_rows, GLOBAL, dtype=object)
+        product_id = np.broadcast_to(np.asarray(product_id, dtype=object), (n_rows,))
+        store_id = np.broadcast_to(np.asarray(store_id, dtype=object), (n_rows,))
+        names = np.empty(n_rows, dtype=object)
+        seen = {}
+        for row, sku in enumerate(zip(product_id.tolist(), store_id.tolist())):
+            name = seen.get(sku)
+            if name is None:
+                name = seen[sku] = self.segment_one(sku[0], sku[1])
+            names[row] = name
+        return names
+
+    @staticmethod
+    def group_rows(names):
+        """(segment, row positions) pairs, one per segment present in ``names``."""
+        labels, inverse = np.unique(names.astype(str), return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(labels) + 1))
+        return [(label, order[bounds[i]:bounds[i + 1]]) for i, label in enumerate(labels.tolist())]
+
+    # ------------------------------------------------------------
+    # Models
+    # ------------------------------------------------------------
+    def is_loaded(self, name):
+        return name in self._loaded
+
+    def handle(self, name):
+        """The ModelHandle of a segment, loading it (and evicting the LRU one) if needed."""
+        with self._lock:
+            handle = self._loaded.get(name)
+            if handle is not None:
+                self._loaded.move_to_end(name)
+                return handle
+
+            entry = self.segments[name]
+            model_path = os.path.join(self.segments_dir, entry["model"])
+            estimator, compiled = load_artifacts(model_path, os.path.splitext(model_path)[0] + ".npz")
+            schema = load_schema(os.path.join(self.segments_dir, entry["schema"]))
+            handle = ModelHandle(f"{self.version}/{name}", estimator, compiled,
+                                 self.compiled_max_rows, schema)
+
+            self._loaded[name] = handle
+            self.loads += 1
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+                self.evictions += 1
+            return handle
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "segment_by": self.segment_by,
+            "segments": len(self.segments),
+            "loaded": list(self._loaded),
+            "max_loaded": self.max_loaded,
+            "loads": self.loads,
+            "evictions": self.evictions
+        }